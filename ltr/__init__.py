@@ -1,3 +1,3 @@
 from .admin.loading import load_network
 from .admin.model_constructor import model_constructor
-from .admin.multigpu import MultiGPU
\ No newline at end of file
+from .admin.multigpu import MultiGPU, DistributedModel
\ No newline at end of file
@@ -4,6 +4,11 @@ from pytracking import TensorDict
 class BaseActor:
     """ Base class for actor. The actor class handles the passing of the data through the network
     and calculation the loss"""
+
+    # Whether the actor passes the data through the forward of the network. Actors which only call submodules of the
+    # network set it to False, such that the gradients are synchronized by the trainer in distributed training.
+    calls_net_forward = True
+
     def __init__(self, net, objective):
         """
         args:
@@ -89,6 +89,8 @@ class LWLActor(BaseActor):
 
 class LWLBoxActor(BaseActor):
     """Actor for training bounding box encoder """
+    calls_net_forward = False
+
     def __init__(self, net, objective, loss_weight=None):
         super().__init__(net, objective)
         if loss_weight is None:
@@ -196,6 +196,8 @@ class KLDiMPActor(BaseActor):
 
 class KYSActor(BaseActor):
     """ Actor for training KYS model """
+    calls_net_forward = False
+
     def __init__(self, net, objective, loss_weight=None, dimp_jitter_fn=None):
         super().__init__(net, objective)
         self.loss_weight = loss_weight
@@ -0,0 +1,123 @@
+import os
+import random
+import numpy as np
+import torch
+import torch.distributed as dist
+
+
+def is_distributed():
+    """Returns True if the process is part of an initialized process group with more than one process."""
+    return dist.is_available() and dist.is_initialized() and dist.get_world_size() > 1
+
+
+def get_rank():
+    return dist.get_rank() if is_distributed() else 0
+
+
+def get_world_size():
+    return dist.get_world_size() if is_distributed() else 1
+
+
+def is_main_process():
+    """Only the main process (rank 0) saves checkpoints, writes tensorboard logs and prints the statistics."""
+    return get_rank() == 0
+
+
+def default_backend(use_gpu=True):
+    return 'nccl' if use_gpu and torch.cuda.is_available() and dist.is_nccl_available() else 'gloo'
+
+
+def init_distributed(rank=None, world_size=None, backend=None, master_addr='127.0.0.1', master_port=29500):
+    """Initializes the default process group.
+    args:
+        rank - Rank of this process. If None, the rank and world size are read from the environment variables RANK and
+               WORLD_SIZE, as set by e.g. torchrun.
+        world_size - Total number of processes.
+        backend - 'gloo' or 'nccl'. Defaults to nccl if a GPU is available, otherwise gloo, which also runs on the cpu.
+        master_addr, master_port - Address of the rank 0 process. Only used if not set in the environment.
+    returns:
+        int - the local rank, i.e. the rank among the processes on this machine
+    """
+    if rank is None:
+        rank = int(os.environ['RANK'])
+        world_size = int(os.environ['WORLD_SIZE'])
+    local_rank = int(os.environ.get('LOCAL_RANK', rank))
+
+    os.environ.setdefault('MASTER_ADDR', master_addr)
+    os.environ.setdefault('MASTER_PORT', str(master_port))
+
+    if backend is None:
+        backend = default_backend()
+
+    if backend == 'nccl':
+        torch.cuda.set_device(local_rank % torch.cuda.device_count())
+
+    dist.init_process_group(backend, init_method='env://', rank=rank, world_size=world_size)
+    return local_rank
+
+
+def seed_process(base_seed=None):
+    """Seeds random, numpy and torch with base_seed + rank. The seeds of the DataLoader workers are drawn from the torch
+    generator of their process, so without this, the workers of all processes would draw the same random samples.
+    Seeded samplers (see ltr.data.sampler.SeedableSampler) are instead split over the processes by the LTRLoader.
+    args:
+        base_seed - Seed of rank 0. Defaults to the initial torch seed, which is the same in all spawned processes.
+    """
+    if base_seed is None:
+        base_seed = torch.initial_seed()
+    seed = (base_seed + get_rank()) % 2**32
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+
+
+def cleanup_distributed():
+    if dist.is_available() and dist.is_initialized():
+        dist.destroy_process_group()
+
+
+def barrier():
+    if is_distributed():
+        dist.barrier()
+
+
+def average_gradients(parameters):
+    """Averages the gradients of the given parameters over all processes, in place. Used for the networks whose
+    gradients are not synchronized by DistributedModel, see BaseActor.calls_net_forward. Missing gradients are set to
+    zero, such that all processes reduce the same tensors."""
+    if not is_distributed():
+        return
+
+    params = [p for p in parameters if p.requires_grad]
+    for p in params:
+        if p.grad is None:
+            p.grad = torch.zeros_like(p)
+
+    # Reduce one flattened buffer per device and dtype, instead of one call per parameter
+    groups = {}
+    for p in params:
+        groups.setdefault((p.grad.device, p.grad.dtype), []).append(p.grad)
+
+    world_size = get_world_size()
+    for grads in groups.values():
+        flat = torch.cat([g.reshape(-1) for g in grads])
+        dist.all_reduce(flat, op=dist.ReduceOp.SUM)
+        flat /= world_size
+        offset = 0
+        for g in grads:
+            g.copy_(flat[offset:offset + g.numel()].view_as(g))
+            offset += g.numel()
+
+
+def all_reduce_sum(values, device=None):
+    """Sums a list of numbers over all processes. Returns the summed list."""
+    if not is_distributed():
+        return list(values)
+
+    # nccl only reduces gpu tensors
+    if device is None:
+        device = torch.device('cuda', torch.cuda.current_device()) if dist.get_backend() == 'nccl' else 'cpu'
+
+    t = torch.tensor([float(v) for v in values], dtype=torch.float64, device=device)
+    dist.all_reduce(t, op=dist.ReduceOp.SUM)
+    return t.tolist()
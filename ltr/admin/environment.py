@@ -25,10 +25,12 @@ def create_default_local_file():
         'msra10k_dir': empty_str,
         'davis_dir': empty_str,
         'youtubevos_dir': empty_str,
-        'lasot_candidate_matching_dataset_path': empty_str})
+        'lasot_candidate_matching_dataset_path': empty_str,
+        'anno_index_dir': empty_str})
 
     comment = {'workspace_dir': 'Base directory for saving network checkpoints.',
-               'tensorboard_dir': 'Directory for tensorboard files.'}
+               'tensorboard_dir': 'Directory for tensorboard files.',
+               'anno_index_dir': 'Directory for the memory-mapped annotation indices. Not used if empty.'}
 
     with open(path, 'w') as f:
         f.write('class EnvironmentSettings:\n')
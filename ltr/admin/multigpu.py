@@ -2,7 +2,7 @@ import torch.nn as nn
 
 
 def is_multi_gpu(net):
-    return isinstance(net, (MultiGPU, nn.DataParallel))
+    return isinstance(net, (MultiGPU, nn.DataParallel, nn.parallel.DistributedDataParallel))
 
 
 class MultiGPU(nn.DataParallel):
@@ -12,4 +12,18 @@ class MultiGPU(nn.DataParallel):
             return super().__getattr__(item)
         except:
             pass
-        return getattr(self.module, item)
\ No newline at end of file
+        return getattr(self.module, item)
+
+
+class DistributedModel(nn.parallel.DistributedDataParallel):
+    """Wraps a network for distributed training with one process per device, see ltr.admin.distributed. The gradients
+    are averaged over all processes in the backward pass, if the actor calls the wrapped network itself. The forward
+    pass of submodules accessed as attributes is not tracked for the gradient synchronization. Actors doing so set
+    calls_net_forward = False, and the trainer averages their gradients before each optimizer step instead, see
+    ltr.admin.distributed.average_gradients."""
+    def __getattr__(self, item):
+        try:
+            return super().__getattr__(item)
+        except:
+            pass
+        return getattr(self.module, item)
@@ -10,4 +10,61 @@ class Settings:
         self.env = env_settings()
         self.use_gpu = True
 
+        # Seed of the training and validation samplers, see ltr.data.sampler.SeedableSampler. If None, the samples are
+        # drawn from the global random number generators. If set in the train settings, each sample is drawn
+        # deterministically from the seed, the loader name, the epoch and the index, such that an epoch can be resumed
+        # mid-way with the same data.
+        self.sampler_seed = None
 
+
+
+
+class StopSettings(Exception):
+    """ Raised by a class replaced by run_partial_settings to stop the execution of a train settings module.
+    args:
+        result - Returned by run_partial_settings.
+    """
+    def __init__(self, result=None):
+        super().__init__()
+        self.result = result
+
+
+def run_partial_settings(settings_name, base_class, capture, settings=None):
+    """ Runs a train settings module, with every class in it deriving from base_class replaced by capture(cls). The
+    captures can record the created objects and raise StopSettings, e.g. to build the loaders without constructing the
+    network, or the network without starting the training. Used by the data and memory benchmarks.
+    args:
+        settings_name - Name of the train settings, e.g. 'dimp.dimp50'
+        base_class - Base class of the replaced classes, e.g. torch.utils.data.DataLoader
+        capture - Function taking a replaced class and returning the callable used instead.
+        settings - Settings instance. A default one is created if None.
+    returns:
+        result of the StopSettings, or None if the settings finished without raising it
+        Settings - the settings
+    """
+    import importlib
+
+    train_module, train_name = settings_name.split('.')
+    if settings is None:
+        settings = Settings()
+    settings.module_name = train_module
+    settings.script_name = train_name
+    settings.project_path = 'ltr/{}/{}'.format(train_module, train_name)
+
+    expr_module = importlib.import_module('ltr.train_settings.{}.{}'.format(train_module, train_name))
+
+    patched = {}
+    for name, val in list(vars(expr_module).items()):
+        if isinstance(val, type) and issubclass(val, base_class):
+            patched[name] = val
+            setattr(expr_module, name, capture(val))
+
+    result = None
+    try:
+        expr_module.run(settings)
+    except StopSettings as e:
+        result = e.result
+    finally:
+        for name, val in patched.items():
+            setattr(expr_module, name, val)
+    return result, settings
@@ -0,0 +1,377 @@
+import math
+import torch
+import torch.nn.functional as F
+
+
+class BatchTransform:
+    """Data augmentation applied on the collated batch, typically on the GPU in the training process, instead of per
+    image in the DataLoader workers. The workers then only decode and crop the images, using e.g.
+    tfm.Transform(tfm.ToByteTensor()) as processing transform, and the augmentation is performed by a few batched
+    tensor operations. The transform is passed to the loader, LTRLoader(..., batch_transform=BatchTransform(...)), and
+    applied by the trainer after moving the data to the device.
+
+    Args of constructor:
+        transforms: An arbitrary number of transformations, derived from the BatchTransformBase class. They are applied
+                    in the order they are given.
+        prefixes: The data is transformed for each prefix, e.g. 'train', using the fields
+                  prefix + '_images'  -  Images, (*, C, H, W), uint8 or float
+                  prefix + '_anno'  -  Boxes [x, y, w, h], (*, 4). Optional.
+                  prefix + '_masks'  -  Segmentation masks, (*, H, W). Optional.
+                  where * are the stacked frame and batch dimensions. Boxes with additional dimensions, e.g. proposals
+                  (*, num_proposals, 4), can be added to the transformed boxes using bbox_keys.
+        bbox_keys: Dict mapping a prefix to a list of additional box fields.
+
+    Note that the geometric transforms only update the images, boxes and masks. Labels or proposal IoUs computed in the
+    processing are not updated, and should thus be generated after the batch transform when geometric transforms are
+    used.
+    """
+
+    def __init__(self, *transforms, prefixes=('train', 'test'), bbox_keys=None):
+        if len(transforms) == 1 and isinstance(transforms[0], (list, tuple)):
+            transforms = transforms[0]
+        self.transforms = transforms
+        self.prefixes = prefixes
+        self.bbox_keys = bbox_keys if bbox_keys is not None else {}
+
+    def __call__(self, data, stack_dim=1):
+        """
+        args:
+            data - The collated TensorDict.
+            stack_dim - Dimension along which the samples were stacked to form the batch, see LTRLoader.
+        returns:
+            TensorDict - the transformed data
+        """
+        groups = []
+        batch_sz = None
+        for prefix in self.prefixes:
+            image_key = prefix + '_images'
+            if image_key not in data:
+                continue
+
+            images = data[image_key]
+            lead_shape = images.shape[:-3]
+            batch_sz = lead_shape[stack_dim] if len(lead_shape) > stack_dim else lead_shape[0]
+
+            # Index of the sample in the batch, for each image
+            sample_ids = torch.arange(batch_sz, device=images.device)
+            view_shape = [1] * len(lead_shape)
+            view_shape[min(stack_dim, len(lead_shape) - 1)] = batch_sz
+            sample_ids = sample_ids.view(view_shape).expand(lead_shape).reshape(-1)
+
+            group = {'images': images.reshape(-1, *images.shape[-3:]), 'lead_shape': lead_shape,
+                     'sample_ids': sample_ids, 'bboxes': {}, 'masks': {}}
+
+            for key in [prefix + '_anno'] + list(self.bbox_keys.get(prefix, [])):
+                if key in data and torch.is_tensor(data[key]):
+                    group['bboxes'][key] = data[key].reshape(sample_ids.shape[0], -1, 4)
+            if torch.is_tensor(data.get(prefix + '_masks', None)):
+                masks = data[prefix + '_masks']
+                group['masks'][prefix + '_masks'] = masks.reshape(-1, *masks.shape[-2:])
+            groups.append((prefix, group))
+
+        if len(groups) == 0:
+            return data
+
+        for t in self.transforms:
+            joint_params = t.roll(batch_sz, groups[0][1]['images'].device) if t.joint else None
+
+            for _, group in groups:
+                num_images = group['images'].shape[0]
+                if t.joint:
+                    params = {k: v[group['sample_ids']] for k, v in joint_params.items()}
+                else:
+                    params = t.roll(num_images, group['images'].device)
+
+                image_shape = group['images'].shape[-2:]
+                group['images'] = t.transform_image(group['images'], params)
+                group['bboxes'] = {k: t.transform_bbox(v, image_shape, params) for k, v in group['bboxes'].items()}
+                group['masks'] = {k: t.transform_mask(v, params) for k, v in group['masks'].items()}
+
+        for prefix, group in groups:
+            lead_shape = group['lead_shape']
+            data[prefix + '_images'] = group['images'].reshape(*lead_shape, *group['images'].shape[-3:])
+            for key, bboxes in group['bboxes'].items():
+                data[key] = bboxes.reshape(data[key].shape)
+            for key, masks in group['masks'].items():
+                data[key] = masks.reshape(*lead_shape, *masks.shape[-2:])
+
+        return data
+
+    def __repr__(self):
+        format_string = self.__class__.__name__ + '('
+        for t in self.transforms:
+            format_string += '\n'
+            format_string += '    {0}'.format(t)
+        format_string += '\n)'
+        return format_string
+
+
+class BatchTransformBase:
+    """Base class for the batched transformations. See the BatchTransform class for details. The random parameters
+    are drawn for each image, or for each sample in the batch if joint is True, such that all frames of a sample are
+    transformed in the same way."""
+
+    def __init__(self, joint=False):
+        self.joint = joint
+
+    def roll(self, num, device):
+        """Returns a dict of random parameters, each a tensor with num elements."""
+        return {}
+
+    def transform_image(self, image, params):
+        """image - (N, C, H, W)"""
+        return image
+
+    def transform_bbox(self, bbox, image_shape, params):
+        """bbox - (N, K, 4) boxes [x, y, w, h]"""
+        return bbox
+
+    def transform_mask(self, mask, params):
+        """mask - (N, H, W)"""
+        return mask
+
+    def __repr__(self):
+        return self.__class__.__name__ + '(joint={})'.format(self.joint)
+
+
+def _select(do_transform, transformed, original):
+    """Picks the transformed image where do_transform (N,) is True."""
+    return torch.where(do_transform.view(-1, *([1] * (original.dim() - 1))), transformed, original)
+
+
+class ToFloatAndJitter(BatchTransformBase):
+    """Convert uint8 images to float and jitter brightness. Batched version of ToTensorAndJitter."""
+
+    def __init__(self, brightness_jitter=0.0, normalize=True, joint=False):
+        super().__init__(joint)
+        self.brightness_jitter = brightness_jitter
+        self.normalize = normalize
+
+    def roll(self, num, device):
+        low = max(0, 1 - self.brightness_jitter)
+        high = 1 + self.brightness_jitter
+        return {'brightness_factor': torch.rand(num, device=device) * (high - low) + low}
+
+    def transform_image(self, image, params):
+        factor = params['brightness_factor'].view(-1, 1, 1, 1)
+        if self.normalize:
+            return image.float().mul(factor / 255.0).clamp(0.0, 1.0)
+        return image.float().mul(factor).clamp(0.0, 255.0)
+
+
+class Normalize(BatchTransformBase):
+    """Normalize images"""
+
+    def __init__(self, mean, std):
+        super().__init__()
+        self.mean = mean
+        self.std = std
+
+    def transform_image(self, image, params):
+        mean = torch.tensor(self.mean, dtype=image.dtype, device=image.device).view(1, -1, 1, 1)
+        std = torch.tensor(self.std, dtype=image.dtype, device=image.device).view(1, -1, 1, 1)
+        return (image - mean) / std
+
+
+class ToGrayscale(BatchTransformBase):
+    """Converts images to grayscale with probability"""
+
+    def __init__(self, probability=0.5, joint=True):
+        super().__init__(joint)
+        self.probability = probability
+        self.color_weights = (0.299, 0.587, 0.114)
+
+    def roll(self, num, device):
+        return {'do_grayscale': torch.rand(num, device=device) < self.probability}
+
+    def transform_image(self, image, params):
+        weights = torch.tensor(self.color_weights, device=image.device).view(1, 3, 1, 1)
+        img_gray = (image.float() * weights).sum(dim=1, keepdim=True).to(image.dtype).expand_as(image)
+        return _select(params['do_grayscale'], img_gray, image)
+
+
+class RandomHorizontalFlip(BatchTransformBase):
+    """Horizontally flip images randomly with a probability p."""
+
+    def __init__(self, probability=0.5, joint=False):
+        super().__init__(joint)
+        self.probability = probability
+
+    def roll(self, num, device):
+        return {'do_flip': torch.rand(num, device=device) < self.probability}
+
+    def transform_image(self, image, params):
+        return _select(params['do_flip'], image.flip((-1,)), image)
+
+    def transform_bbox(self, bbox, image_shape, params):
+        bbox_flip = bbox.clone()
+        bbox_flip[..., 0] = (image_shape[1] - 1) - (bbox[..., 0] + bbox[..., 2])
+        return _select(params['do_flip'], bbox_flip, bbox)
+
+    def transform_mask(self, mask, params):
+        return _select(params['do_flip'], mask.flip((-1,)), mask)
+
+
+class RandomBlur(BatchTransformBase):
+    """ Blur the images, with a given probability, by applying a gaussian kernel with given sigma"""
+
+    def __init__(self, sigma, probability=0.1, joint=False):
+        super().__init__(joint)
+        self.probability = probability
+
+        if isinstance(sigma, (float, int)):
+            sigma = (sigma, sigma)
+        self.sigma = sigma
+        self.filter_size = [math.ceil(2 * s) for s in self.sigma]
+        x_coord = [torch.arange(-sz, sz + 1, dtype=torch.float32) for sz in self.filter_size]
+        self.filter = [torch.exp(-(x ** 2) / (2 * s ** 2)) for x, s in zip(x_coord, self.sigma)]
+        self.filter[0] = self.filter[0].view(1, 1, -1, 1) / self.filter[0].sum()
+        self.filter[1] = self.filter[1].view(1, 1, 1, -1) / self.filter[1].sum()
+
+    def roll(self, num, device):
+        return {'do_blur': torch.rand(num, device=device) < self.probability}
+
+    def transform_image(self, image, params):
+        do_blur = params['do_blur']
+        if not do_blur.any():
+            return image
+
+        # Only blur the selected images
+        ids = do_blur.nonzero(as_tuple=True)[0]
+        im = image[ids].float()
+        sz = im.shape[-2:]
+        filt = [f.to(im.device) for f in self.filter]
+        im1 = F.conv2d(im.reshape(-1, 1, sz[0], sz[1]), filt[0], padding=(self.filter_size[0], 0))
+        im_blur = F.conv2d(im1, filt[1], padding=(0, self.filter_size[1])).view_as(im)
+
+        image = image.clone()
+        image[ids] = im_blur.to(image.dtype)
+        return image
+
+
+class RandomAffine(BatchTransformBase):
+    """Apply random affine transformation. Batched version of ltr.data.transforms.RandomAffine, using the same
+    parametrization. The images are warped with a single grid_sample call."""
+
+    def __init__(self, p_flip=0.0, max_rotation=0.0, max_shear=0.0, max_scale=0.0, max_ar_factor=0.0,
+                 border_mode='constant', pad_amount=0, scale_center=0.0, joint=False):
+        super().__init__(joint)
+        self.p_flip = p_flip
+        self.max_rotation = max_rotation
+        self.max_shear = max_shear
+        self.max_scale = max_scale
+        self.max_ar_factor = max_ar_factor
+        self.scale_center = scale_center
+
+        if border_mode == 'constant':
+            self.padding_mode = 'zeros'
+        elif border_mode == 'replicate':
+            self.padding_mode = 'border'
+        else:
+            raise Exception
+
+        self.pad_amount = pad_amount
+
+    def roll(self, num, device):
+        def uniform(a):
+            return (torch.rand(num, device=device) * 2 - 1) * a
+
+        scale_factor = torch.exp(uniform(self.max_scale))
+        return {'do_flip': torch.rand(num, device=device) < self.p_flip,
+                'theta': uniform(self.max_rotation),
+                'shear_x': uniform(self.max_shear),
+                'shear_y': uniform(self.max_shear),
+                'scale_x': scale_factor,
+                'scale_y': scale_factor * torch.exp(uniform(self.max_ar_factor)),
+                'scale_center': uniform(self.scale_center)}
+
+    def _construct_t_mat(self, image_shape, params):
+        """Returns the (N, 3, 3) transformation matrices in pixel coordinates."""
+        im_h, im_w = image_shape
+        num = params['theta'].shape[0]
+        device = params['theta'].device
+
+        def eye():
+            return torch.eye(3, device=device).repeat(num, 1, 1)
+
+        t_flip = eye()
+        t_flip[:, 0, 0] = torch.where(params['do_flip'], -torch.ones(num, device=device), t_flip[:, 0, 0])
+        t_flip[:, 0, 2] = params['do_flip'].float() * im_w
+
+        # Same as cv.getRotationMatrix2D, with the angle in degrees
+        alpha = torch.cos(params['theta'] * math.pi / 180)
+        beta = torch.sin(params['theta'] * math.pi / 180)
+        cx, cy = im_w * 0.5, im_h * 0.5
+        t_rot = eye()
+        t_rot[:, 0, 0] = alpha
+        t_rot[:, 0, 1] = beta
+        t_rot[:, 0, 2] = (1 - alpha) * cx - beta * cy
+        t_rot[:, 1, 0] = -beta
+        t_rot[:, 1, 1] = alpha
+        t_rot[:, 1, 2] = beta * cx + (1 - alpha) * cy
+
+        t_shear = eye()
+        t_shear[:, 0, 1] = params['shear_x']
+        t_shear[:, 0, 2] = -params['shear_x'] * 0.5 * im_w
+        t_shear[:, 1, 0] = params['shear_y']
+        t_shear[:, 1, 2] = -params['shear_y'] * 0.5 * im_h
+
+        t_scale = eye()
+        t_scale[:, 0, 0] = params['scale_x']
+        t_scale[:, 0, 2] = (1.0 - params['scale_x']) * 0.5 * im_w
+        t_scale[:, 1, 1] = params['scale_y']
+        t_scale[:, 1, 2] = (1.0 - params['scale_y']) * 0.5 * im_h
+
+        t_trans = eye()
+        t_trans[:, 0, 2] = -0.2 * im_w * params['scale_center']
+        t_trans[:, 1, 2] = -0.2 * im_w * params['scale_center']
+
+        t_mat = t_scale @ t_rot @ t_shear @ t_flip @ t_trans
+
+        t_mat[:, 0, 2] += self.pad_amount
+        t_mat[:, 1, 2] += self.pad_amount
+
+        return t_mat
+
+    def _warp(self, image, params, mode):
+        in_h, in_w = image.shape[-2:]
+        out_h, out_w = in_h + 2 * self.pad_amount, in_w + 2 * self.pad_amount
+
+        t_mat = self._construct_t_mat((in_h, in_w), params)
+
+        # Map the output pixel coordinates to the normalized input coordinates of grid_sample
+        def norm_mat(h, w):
+            return torch.tensor([[2.0 / max(w - 1, 1), 0.0, -1.0],
+                                 [0.0, 2.0 / max(h - 1, 1), -1.0],
+                                 [0.0, 0.0, 1.0]], device=image.device)
+
+        theta = norm_mat(in_h, in_w) @ torch.inverse(t_mat) @ torch.inverse(norm_mat(out_h, out_w))
+        grid = F.affine_grid(theta[:, :2, :], (image.shape[0], 1, out_h, out_w), align_corners=True)
+
+        return F.grid_sample(image, grid, mode=mode, padding_mode=self.padding_mode, align_corners=True)
+
+    def transform_image(self, image, params):
+        return self._warp(image.float(), params, 'bilinear').to(image.dtype)
+
+    def transform_bbox(self, bbox, image_shape, params):
+        t_mat = self._construct_t_mat(image_shape, params)
+
+        x1, y1 = bbox[..., 0], bbox[..., 1]
+        x2, y2 = x1 + bbox[..., 2], y1 + bbox[..., 3]
+        corners_x = torch.stack((x1, x2, x2, x1), dim=-1)
+        corners_y = torch.stack((y1, y1, y2, y2), dim=-1)
+
+        # Transform the corners, (N, K, 4)
+        t = t_mat.view(-1, 1, 3, 3)
+        corners_x_t = t[..., 0, 0:1] * corners_x + t[..., 0, 1:2] * corners_y + t[..., 0, 2:3]
+        corners_y_t = t[..., 1, 0:1] * corners_x + t[..., 1, 1:2] * corners_y + t[..., 1, 2:3]
+
+        corners_x_t = corners_x_t.clamp(min=0, max=image_shape[1])
+        corners_y_t = corners_y_t.clamp(min=0, max=image_shape[0])
+
+        tl = torch.stack((corners_x_t.min(dim=-1)[0], corners_y_t.min(dim=-1)[0]), dim=-1)
+        br = torch.stack((corners_x_t.max(dim=-1)[0], corners_y_t.max(dim=-1)[0]), dim=-1)
+        return torch.cat((tl, br - tl), dim=-1)
+
+    def transform_mask(self, mask, params):
+        return self._warp(mask.unsqueeze(1).float(), params, 'nearest').squeeze(1).to(mask.dtype)
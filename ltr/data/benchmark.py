@@ -0,0 +1,291 @@
+import os
+import time
+import functools
+from collections import OrderedDict
+import torch
+import torch.utils.data
+import ltr.data.processing_utils as prutils
+from ltr.data.loader import LTRLoader
+from ltr.admin.settings import StopSettings, run_partial_settings
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+# Functions of processing_utils which crop the search regions
+CROP_FUNCTIONS = ('sample_target', 'jittered_center_crop', 'sample_target_adaptive', 'sample_target_from_crop_region',
+                  'crop_and_resize', 'target_image_crop')
+
+
+class _LoaderCapture:
+    """ Replaces a loader class in a train settings module. Records the created loaders and stops the execution of the
+    settings once the training loader is created, such that the network and trainer are not built."""
+
+    def __init__(self, loader_class, loaders):
+        self.loader_class = loader_class
+        self.loaders = loaders
+
+    def __call__(self, *args, **kwargs):
+        loader = self.loader_class(*args, **kwargs)
+        self.loaders.append(loader)
+        if loader.training:
+            raise StopSettings
+        return loader
+
+
+def build_train_loader(settings_name, settings=None):
+    """ Builds the datasets, samplers, processing and training loader of a train settings module, without constructing
+    the network, actor and trainer.
+    args:
+        settings_name - Name of the train settings, e.g. 'dimp.dimp50'
+        settings - ltr.admin.settings.Settings instance. A default one is created if None.
+    returns:
+        LTRLoader - the training loader
+    """
+    loaders = []
+    run_partial_settings(settings_name, torch.utils.data.DataLoader, lambda cls: _LoaderCapture(cls, loaders), settings)
+
+    train_loaders = [l for l in loaders if l.training]
+    if len(train_loaders) == 0:
+        raise RuntimeError('The train settings {} did not create a training loader.'.format(settings_name))
+    return train_loaders[0]
+
+
+class StageTimer:
+    """ Accumulates the time spent in the stages of the data pipeline. Nested calls of the same stage, e.g. a crop
+    function calling another one, are only counted once."""
+
+    def __init__(self):
+        self.times = OrderedDict()
+        self._active = set()
+
+    def reset(self):
+        self.times = OrderedDict()
+
+    def add(self, stage, t):
+        self.times[stage] = self.times.get(stage, 0.0) + t
+
+    def wrap(self, fn, stage):
+        @functools.wraps(fn)
+        def timed_fn(*args, **kwargs):
+            if stage in self._active:
+                return fn(*args, **kwargs)
+            self._active.add(stage)
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.add(stage, time.perf_counter() - t0)
+                self._active.discard(stage)
+        return timed_fn
+
+
+class _TimedCallable:
+    """ Times the calls of a callable object, while keeping its other attributes accessible. """
+
+    def __init__(self, obj, timer, stage):
+        self.obj = obj
+        self._call = timer.wrap(obj, stage)
+
+    def __call__(self, *args, **kwargs):
+        return self._call(*args, **kwargs)
+
+    def __getattr__(self, item):
+        return getattr(self.obj, item)
+
+
+def instrument_sampler(sampler, timer):
+    """ Wraps the frame loading of the datasets, the crop functions, the transforms and the label and proposal
+    generation of the processing of a sampler with timers. Only affects the current process. Returns a function which
+    removes the instrumentation."""
+    restore = []
+
+    for dataset in getattr(sampler, 'datasets', []):
+        if 'get_frames' not in vars(dataset):
+            dataset.get_frames = timer.wrap(dataset.get_frames, 'load')
+            restore.append(lambda d=dataset: delattr(d, 'get_frames'))
+
+    for name in CROP_FUNCTIONS:
+        fn = getattr(prutils, name, None)
+        if fn is not None:
+            setattr(prutils, name, timer.wrap(fn, 'crop'))
+            restore.append(lambda n=name, f=fn: setattr(prutils, n, f))
+
+    processing = getattr(sampler, 'processing', None)
+    if isinstance(getattr(processing, 'transform', None), dict):
+        orig_transform = processing.transform
+        processing.transform = {key: _TimedCallable(t, timer, 'transforms') if t is not None else None
+                                for key, t in orig_transform.items()}
+        restore.append(lambda p=processing, t=orig_transform: setattr(p, 'transform', t))
+
+    if processing is not None:
+        for name in dir(type(processing)):
+            if name.startswith('_generate') and callable(getattr(processing, name)):
+                setattr(processing, name, timer.wrap(getattr(processing, name), 'labels'))
+                restore.append(lambda p=processing, n=name: delattr(p, n))
+
+    def remove():
+        for fn in reversed(restore):
+            fn()
+    return remove
+
+
+def profile_stages(loader, num_samples=200):
+    """ Draws num_samples samples from the dataset of the loader in the current process and measures the time spent in
+    each stage of the pipeline, per dataset.
+    returns:
+        OrderedDict - Maps the dataset name to a dict with the number of samples, samples/s and the average time per
+                      sample (in seconds) of the stages sample (sequence and frame selection), load (frame loading and
+                      decoding), crop, transforms, labels (label and proposal generation) and other (remaining
+                      processing). The entry 'collate' contains the average time to collate a batch.
+    """
+    sampler = loader.dataset
+    timer = StageTimer()
+    processing = getattr(sampler, 'processing', None)
+
+    remove = instrument_sampler(sampler, timer)
+    if processing is not None:
+        sampler.processing = _TimedCallable(processing, timer, 'processing')
+
+    results = OrderedDict()
+    collate_time = 0.0
+    num_batches = 0
+    batch = []
+    try:
+        for i in range(num_samples):
+            timer.reset()
+            t0 = time.perf_counter()
+            data = sampler[i % len(sampler)]
+            total = time.perf_counter() - t0
+
+            name = data.get('dataset', 'all') if isinstance(data, dict) else 'all'
+            name = name if isinstance(name, str) else 'all'
+            stats = results.setdefault(name, OrderedDict([('samples', 0), ('total', 0.0)]))
+            stats['samples'] += 1
+            stats['total'] += total
+
+            times = timer.times
+            processing_time = times.get('processing', 0.0)
+            stage_times = OrderedDict([('sample', total - processing_time - times.get('load', 0.0)),
+                                       ('load', times.get('load', 0.0)),
+                                       ('crop', times.get('crop', 0.0)),
+                                       ('transforms', times.get('transforms', 0.0)),
+                                       ('labels', times.get('labels', 0.0))])
+            stage_times['other'] = max(processing_time - stage_times['crop'] - stage_times['transforms'] -
+                                       stage_times['labels'], 0.0)
+            for stage, t in stage_times.items():
+                stats[stage] = stats.get(stage, 0.0) + t
+
+            batch.append(data)
+            if len(batch) == loader.batch_size:
+                t0 = time.perf_counter()
+                loader.collate_fn(batch)
+                collate_time += time.perf_counter() - t0
+                num_batches += 1
+                batch = []
+    finally:
+        if processing is not None:
+            sampler.processing = processing
+        remove()
+
+    for stats in results.values():
+        n = stats['samples']
+        stats['samples_per_sec'] = n / max(stats.pop('total'), 1e-9)
+        for stage in ('sample', 'load', 'crop', 'transforms', 'labels', 'other'):
+            stats[stage] /= n
+
+    results['collate'] = collate_time / max(num_batches, 1)
+    return results
+
+
+def _memory_usage():
+    """ Resident memory of the current process and its children, in bytes. None if psutil is not installed. """
+    if psutil is None:
+        return None
+    proc = psutil.Process(os.getpid())
+    total = proc.memory_info().rss
+    for child in proc.children(recursive=True):
+        try:
+            total += child.memory_info().rss
+        except psutil.Error:
+            pass
+    return total
+
+
+def measure_throughput(loader, num_batches=50, num_warmup=5):
+    """ Iterates over the loader and measures the throughput after num_warmup batches.
+    returns:
+        dict - samples_per_sec, batches_per_sec, startup time until the first batch (s) and the peak memory of the
+               main and worker processes (bytes, None if psutil is not installed)
+    """
+    peak_memory = None
+    t_start = time.perf_counter()
+    t0 = None
+    startup = None
+    num_samples = 0
+    n = 0
+
+    for n, data in enumerate(loader, 1):
+        if n == 1:
+            startup = time.perf_counter() - t_start
+        if n == num_warmup:
+            t0 = time.perf_counter()
+        elif n > num_warmup:
+            num_samples += loader.batch_size
+
+        mem = _memory_usage()
+        if mem is not None:
+            peak_memory = max(peak_memory or 0, mem)
+
+        if n >= num_warmup + num_batches:
+            break
+
+    if t0 is None or num_samples == 0:
+        raise RuntimeError('The loader has too few batches for the benchmark.')
+
+    elapsed = time.perf_counter() - t0
+    return {'samples_per_sec': num_samples / elapsed,
+            'batches_per_sec': (n - num_warmup) / elapsed,
+            'startup': startup,
+            'peak_memory': peak_memory}
+
+
+def make_loader(loader, num_workers, prefetch_factor=None):
+    """ Creates a loader with the same dataset, batch size and collation as loader, using the given worker settings."""
+    return LTRLoader(loader.name, loader.dataset, training=loader.training, batch_size=loader.batch_size,
+                     num_workers=num_workers, collate_fn=loader.collate_fn, stack_dim=loader.stack_dim,
+                     pin_memory=loader.pin_memory, drop_last=True, prefetch_factor=prefetch_factor)
+
+
+def autotune(loader, workers=None, prefetch_factors=(2, 4), num_batches=50, num_warmup=5, tolerance=0.05,
+             verbose=True):
+    """ Measures the throughput of the loader for all combinations of the given number of workers and prefetch factors.
+    args:
+        loader - The loader to tune.
+        workers - List of the number of workers to try. Defaults to powers of two up to the number of cpus.
+        prefetch_factors - List of prefetch factors (batches loaded in advance per worker) to try.
+        num_batches, num_warmup - See measure_throughput.
+        tolerance - The recommended configuration is the one with the fewest workers and smallest prefetch factor,
+                    whose throughput is within this fraction of the best one.
+    returns:
+        list - (num_workers, prefetch_factor, results) for each configuration, see measure_throughput
+        tuple - recommended (num_workers, prefetch_factor)
+    """
+    if workers is None:
+        num_cpus = os.cpu_count() or 1
+        workers = [w for w in (1, 2, 4, 8, 16, 32, 64) if w <= num_cpus]
+
+    results = []
+    for num_workers in workers:
+        for prefetch_factor in prefetch_factors:
+            res = measure_throughput(make_loader(loader, num_workers, prefetch_factor), num_batches, num_warmup)
+            results.append((num_workers, prefetch_factor, res))
+            if verbose:
+                print('num_workers {:3d}  prefetch_factor {:2d}:  {:8.1f} samples/s'.format(
+                    num_workers, prefetch_factor, res['samples_per_sec']))
+
+    best = max(res['samples_per_sec'] for _, _, res in results)
+    candidates = [(w, p) for w, p, res in results if res['samples_per_sec'] >= (1 - tolerance) * best]
+    return results, min(candidates)
@@ -0,0 +1,232 @@
+import hashlib
+import multiprocessing
+import numpy as np
+from multiprocessing import shared_memory
+
+
+def _frame_key(namespace, path):
+    """ Non-zero 64 bit key of a frame. """
+    digest = hashlib.blake2b('{}\n{}'.format(namespace, path).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little', signed=True) or 1
+
+
+class SharedFrameCache:
+    """ Cache of decoded frames in a POSIX shared memory arena, shared by all DataLoader workers. Frames decoded by one
+    worker are thus re-used by the others, and across epochs.
+
+    The arena is written as a ring buffer, with a monotonically increasing write position. A frame stored at position
+    pos is valid as long as pos >= write_pos - capacity, such that writing a new frame implicitly evicts the oldest
+    ones. Frames which are read while they are about to be evicted, i.e. are within the oldest promote_fraction of
+    the arena, are written again at the head. Frequently used frames thus stay in the cache, approximating LRU
+    eviction. Reads and writes are serialized by a lock, which is held while a frame is copied from or to the arena.
+    The lock orders the accesses to the shared memory also on CPUs with weakly ordered memory, e.g. aarch64, where a
+    lock-free reader could observe an updated entry before the frame data written with it.
+
+    The cache must be created in the main process, before the workers are started. Only uint8 images are cached.
+    """
+
+    # Entry fields of the hash table
+    _KEY, _POS, _NBYTES, _NDIM, _SHAPE = 0, 1, 2, 3, 4
+    _ENTRY_SIZE = 8
+    _MAX_PROBES = 8
+
+    def __init__(self, capacity, num_entries=None, promote_fraction=0.25):
+        """
+        args:
+            capacity - Size of the arena in bytes.
+            num_entries - Size of the hash table. Defaults to one entry per 64 kB of arena, which is sufficient for
+                          frames larger than about 100x100 pixels.
+            promote_fraction - Fraction of the arena, counted from the oldest frame, in which a frame is re-written
+                               when read.
+        """
+        if num_entries is None:
+            num_entries = max(capacity // 2**16, 1024)
+
+        self.capacity = int(capacity)
+        self.num_entries = int(num_entries)
+        self.promote_fraction = promote_fraction
+
+        header_size = 8 * (2 + self.num_entries * self._ENTRY_SIZE)
+        self._shm = shared_memory.SharedMemory(create=True, size=header_size + self.capacity)
+        self._owner = True
+        self._lock = multiprocessing.Lock()
+
+        self._init_views()
+        self._header[:] = 0
+        self._table[:] = 0
+
+    def _init_views(self):
+        buf = self._shm.buf
+        self._header = np.ndarray((2,), dtype=np.int64, buffer=buf)
+        self._table = np.ndarray((self.num_entries, self._ENTRY_SIZE), dtype=np.int64, buffer=buf, offset=16)
+        self._arena = np.ndarray((self.capacity,), dtype=np.uint8, buffer=buf,
+                                 offset=16 + self._table.nbytes)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for key in ('_shm', '_header', '_table', '_arena'):
+            del state[key]
+        state['_shm_name'] = self._shm.name
+        state['_owner'] = False
+        return state
+
+    def __setstate__(self, state):
+        shm_name = state.pop('_shm_name')
+        self.__dict__.update(state)
+        # The workers share the resource tracker of the main process, which owns the segment and removes it
+        self._shm = shared_memory.SharedMemory(name=shm_name)
+        self._init_views()
+
+    def close(self):
+        """ Releases the arena. The process which created the cache also removes the shared memory segment. """
+        if getattr(self, '_shm', None) is None:
+            return
+        del self._header, self._table, self._arena
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+        self._shm = None
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def _write_pos(self):
+        return int(self._header[0])
+
+    def _probe(self, key):
+        start = key % self.num_entries
+        return [(start + i) % self.num_entries for i in range(self._MAX_PROBES)]
+
+    def get(self, namespace, path):
+        """ Returns a copy of the cached frame, or None. """
+        key = _frame_key(namespace, path)
+        with self._lock:
+            idx = next((i for i in self._probe(key) if int(self._table[i, self._KEY]) == key), None)
+            if idx is None:
+                return None
+
+            entry = self._table[idx]
+            pos, nbytes, ndim = int(entry[self._POS]), int(entry[self._NBYTES]), int(entry[self._NDIM])
+            shape = tuple(int(s) for s in entry[self._SHAPE:self._SHAPE + ndim])
+
+            write_pos = self._write_pos()
+            if pos < write_pos - self.capacity:
+                return None
+
+            offset = pos % self.capacity
+            frame = self._arena[offset:offset + nbytes].copy().reshape(shape)
+            promote = pos < write_pos - (1 - self.promote_fraction) * self.capacity
+
+        if promote:
+            self.put(namespace, path, frame, block=False)
+        return frame
+
+    def put(self, namespace, path, frame, block=True):
+        """ Stores a frame. Frames which are not uint8 arrays of at most 3 dimensions, or larger than a quarter of the
+        arena, are not cached. If block is False, the frame is skipped if another process is accessing the cache. """
+        if not isinstance(frame, np.ndarray) or frame.dtype != np.uint8 or frame.ndim > 3:
+            return
+        nbytes = frame.nbytes
+        if nbytes == 0 or nbytes > self.capacity // 4:
+            return
+
+        if not self._lock.acquire(block):
+            return
+        try:
+            key = _frame_key(namespace, path)
+
+            # Frames are stored contiguously, skip the remainder at the end of the arena
+            pos = self._write_pos()
+            if pos % self.capacity + nbytes > self.capacity:
+                pos += self.capacity - pos % self.capacity
+
+            self._header[0] = pos + nbytes
+
+            offset = pos % self.capacity
+            self._arena[offset:offset + nbytes] = np.ascontiguousarray(frame).reshape(-1)
+
+            # Use the entry of the same key, a free or evicted one, or else the oldest one
+            valid_from = pos + nbytes - self.capacity
+            candidates = self._probe(key)
+            idx = next((i for i in candidates if int(self._table[i, self._KEY]) == key), None)
+            if idx is None:
+                idx = next((i for i in candidates if int(self._table[i, self._KEY]) == 0 or
+                            int(self._table[i, self._POS]) < valid_from), None)
+            if idx is None:
+                idx = min(candidates, key=lambda i: int(self._table[i, self._POS]))
+
+            entry = self._table[idx]
+            entry[self._KEY] = key
+            entry[self._POS] = pos
+            entry[self._NBYTES] = nbytes
+            entry[self._NDIM] = frame.ndim
+            entry[self._SHAPE:self._SHAPE + frame.ndim] = frame.shape
+        finally:
+            self._lock.release()
+
+    def stats(self):
+        """ Number of valid entries and bytes currently used. """
+        write_pos = self._write_pos()
+        valid = (self._table[:, self._KEY] != 0) & (self._table[:, self._POS] >= write_pos - self.capacity)
+        return {'entries': int(valid.sum()), 'bytes': int(self._table[valid, self._NBYTES].sum()),
+                'capacity': self.capacity}
+
+
+class CachedImageLoader:
+    """ Image loader which looks the frames up in a SharedFrameCache before decoding them with image_loader. Created by
+    BaseVideoDataset.use_frame_cache and BaseImageDataset.use_frame_cache. """
+
+    def __init__(self, image_loader, cache, namespace=''):
+        """
+        args:
+            image_loader - Loader used for the frames which are not cached.
+            cache - SharedFrameCache
+            namespace - Name of the dataset. The frames are keyed by the namespace and their path.
+        """
+        self.image_loader = image_loader
+        self.cache = cache
+        self.namespace = namespace
+
+    def __call__(self, path):
+        frame = self.cache.get(self.namespace, path)
+        if frame is None:
+            frame = self.image_loader(path)
+            if frame is not None:
+                self.cache.put(self.namespace, path, frame)
+        return frame
+
+    def load_reduced(self, path, downscale):
+        """ Returns the frame downscaled by the factor downscale, see ltr.data.image_loader.load_reduced. Cached frames
+        are resized, the others are loaded at reduced resolution by image_loader and not added to the cache, which only
+        holds full resolution frames. """
+        from ltr.data.image_loader import load_reduced, resize_reduced
+
+        frame = self.cache.get(self.namespace, path)
+        if frame is not None:
+            return resize_reduced(frame, downscale)
+        return load_reduced(self.image_loader, path, downscale)
+
+
+def cache_image_loader(image_loader, cache, namespace=''):
+    """ Wraps an image loader with a CachedImageLoader. For a ScaledImageLoader, the wrapped full resolution loader is
+    cached instead, since the reduced resolution frames depend on the sampled boxes. """
+    from ltr.data.image_loader import ScaledImageLoader
+
+    if isinstance(image_loader, CachedImageLoader):
+        image_loader = image_loader.image_loader
+    if isinstance(image_loader, ScaledImageLoader):
+        image_loader.image_loader = cache_image_loader(image_loader.image_loader, cache, namespace)
+        return image_loader
+    return CachedImageLoader(image_loader, cache, namespace)
+
+
+def use_frame_cache(datasets, capacity):
+    """ Creates a SharedFrameCache of capacity bytes and uses it for all the given datasets. E.g. for the datasets of a
+    sampler, use_frame_cache(dataset_train.datasets, 8 * 2**30). Returns the cache. """
+    cache = SharedFrameCache(capacity)
+    for d in datasets:
+        d.use_frame_cache(cache)
+    return cache
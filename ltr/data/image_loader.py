@@ -1,7 +1,26 @@
-import jpeg4py
+import os
+import json
+import time
 import cv2 as cv
 from PIL import Image
 import numpy as np
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    import jpeg4py
+except ImportError:
+    jpeg4py = None
+
+try:
+    from turbojpeg import TurboJPEG, TJPF_RGB
+except ImportError:
+    TurboJPEG = None
+
+try:
+    import imageio
+except ImportError:
+    imageio = None
 
 davis_palette = np.repeat(np.expand_dims(np.arange(0,256), 1), 3, 1).astype(np.uint8)
 davis_palette[:22, :] = [[0, 0, 0], [128, 0, 0], [0, 128, 0], [128, 128, 0],
@@ -12,27 +31,266 @@ davis_palette[:22, :] = [[0, 0, 0], [128, 0, 0], [0, 128, 0], [128, 128, 0],
                          [0, 64, 128], [128, 64, 128]]
 
 
+# Registry of the image decoder backends. Maps the name to a (decode_fn, is_available) tuple. The decode_fn takes a path
+# and returns the image as rgb uint8 array (H x W x 3), and raises an exception if the image can not be decoded.
+_decoders = OrderedDict()
+
+
+def register_decoder(name, decode_fn, is_available=None):
+    """ Registers an image decoder backend, which can then be selected by default_image_loader.
+    args:
+        name - Name of the backend.
+        decode_fn - Function taking an image path and returning the image as rgb uint8 numpy array (H x W x 3). Should
+                    raise an exception if the image can not be decoded.
+        is_available - Optional function returning whether the backend can be used, e.g. if its package is installed.
+    """
+    _decoders[name] = (decode_fn, is_available if is_available is not None else lambda: True)
+
+
+def available_decoders():
+    """ Names of the registered decoder backends which are available. """
+    available = []
+    for name, (_, is_available) in _decoders.items():
+        try:
+            if is_available():
+                available.append(name)
+        except Exception:
+            pass
+    return available
+
+
+def get_decoder(name):
+    """ Returns the decode function of the backend with the given name. """
+    if name not in _decoders:
+        raise ValueError('Unknown image decoder {}. Registered decoders: {}'.format(name, list(_decoders.keys())))
+    return _decoders[name][0]
+
+
+def _to_rgb(im):
+    if im.ndim == 2:
+        return np.repeat(im[:, :, None], 3, axis=2)
+    if im.shape[2] == 4:
+        return np.ascontiguousarray(im[:, :, :3])
+    return im
+
+
+def _decode_jpeg4py(path):
+    return _to_rgb(jpeg4py.JPEG(path).decode())
+
+
+def _decode_opencv(path):
+    im = cv.imread(path, cv.IMREAD_COLOR)
+    if im is None:
+        raise ValueError('Could not decode image.')
+
+    # Convert to rgb in place, to avoid an extra copy
+    return cv.cvtColor(im, cv.COLOR_BGR2RGB, dst=im)
+
+
+def _decode_pil(path):
+    with Image.open(path) as im:
+        return _to_rgb(np.array(im.convert('RGB') if im.mode != 'RGB' else im))
+
+
+def _turbojpeg():
+    if _turbojpeg.instance is None:
+        _turbojpeg.instance = TurboJPEG()
+    return _turbojpeg.instance
+
+_turbojpeg.instance = None
+
+
+def _turbojpeg_available():
+    if TurboJPEG is None:
+        return False
+    try:
+        _turbojpeg()
+        return True
+    except Exception:
+        # The libjpeg-turbo library is not found
+        return False
+
+
+def _decode_turbojpeg(path):
+    with open(path, 'rb') as f:
+        return _turbojpeg().decode(f.read(), pixel_format=TJPF_RGB)
+
+
+def _decode_imageio(path):
+    if hasattr(imageio, 'v3'):
+        return _to_rgb(np.asarray(imageio.v3.imread(path)))
+    return _to_rgb(np.asarray(imageio.imread(path)))
+
+
+register_decoder('turbojpeg', _decode_turbojpeg, _turbojpeg_available)
+register_decoder('jpeg4py', _decode_jpeg4py, lambda: jpeg4py is not None)
+register_decoder('opencv', _decode_opencv)
+register_decoder('pil', _decode_pil)
+register_decoder('imageio', _decode_imageio, lambda: imageio is not None)
+
+
+def benchmark_decoders(paths, num_repeats=3, decoders=None):
+    """ Measures the decoding throughput of the image decoder backends.
+    args:
+        paths - List of image paths used for the benchmark.
+        num_repeats - Number of times each image is decoded.
+        decoders - Names of the backends to benchmark. All available backends are used if None.
+    returns:
+        OrderedDict - Maps the backend name to the time per image in seconds, or None if the backend failed to decode
+                      the images or returned a different image size than opencv.
+    """
+    if isinstance(paths, str):
+        paths = [paths]
+    if decoders is None:
+        decoders = available_decoders()
+
+    ref_shapes = [_decode_opencv(p).shape for p in paths]
+
+    results = OrderedDict()
+    for name in decoders:
+        decode_fn = get_decoder(name)
+        try:
+            # Warm up, and check the output
+            for p, ref_shape in zip(paths, ref_shapes):
+                im = decode_fn(p)
+                if im.shape != ref_shape or im.dtype != np.uint8:
+                    raise ValueError('Unexpected output {} {}.'.format(im.shape, im.dtype))
+
+            times = []
+            for _ in range(num_repeats):
+                t0 = time.perf_counter()
+                for p in paths:
+                    decode_fn(p)
+                times.append((time.perf_counter() - t0) / len(paths))
+            results[name] = min(times)
+        except Exception:
+            results[name] = None
+    return results
+
+
+def _decoder_cache_path():
+    return os.path.join(os.path.expanduser('~'), '.cache', 'ltr', 'image_decoder.json')
+
+
+def select_decoder(sample_path=None, use_cache=True, refresh=False, verbose=True):
+    """ Selects the decoder backend used by default_image_loader. The backend can be set explicitly using the
+    environment variable LTR_IMAGE_DECODER. Otherwise, the fastest available backend on sample_path is selected. The
+    result is cached in ~/.cache/ltr/image_decoder.json, and is re-used as long as the same backends are available.
+    args:
+        sample_path - Image used for the benchmark. If None, the cached choice or opencv is used.
+        use_cache - Read and write the cached choice.
+        refresh - Ignore the cached choice, but update it with the new result.
+        verbose - Print the selected backend.
+    returns:
+        str - name of the backend
+    """
+    name = os.environ.get('LTR_IMAGE_DECODER')
+    if name:
+        get_decoder(name)
+        return name
+
+    available = available_decoders()
+    cache_path = _decoder_cache_path()
+
+    if use_cache and not refresh:
+        try:
+            with open(cache_path, 'r') as f:
+                cached = json.load(f)
+            if cached['available'] == available and cached['decoder'] in available:
+                return cached['decoder']
+        except (OSError, ValueError, KeyError):
+            pass
+
+    if sample_path is None:
+        return 'opencv'
+
+    timings = benchmark_decoders(sample_path)
+    timings = {n: t for n, t in timings.items() if t is not None}
+    name = min(timings, key=timings.get) if len(timings) > 0 else 'opencv'
+
+    if verbose:
+        print('Using the {} image decoder. Decode time per image: {}'.format(
+            name, ', '.join('{} {:.2f} ms'.format(n, 1000 * t) for n, t in timings.items())))
+
+    if use_cache:
+        # Written to a temporary file first, since several processes may select a decoder at the same time
+        tmp_path = '{}.{}.tmp'.format(cache_path, os.getpid())
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            with open(tmp_path, 'w') as f:
+                json.dump({'decoder': name, 'available': available, 'timings': timings}, f)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            pass
+
+    return name
+
+
+def _find_image(root, max_dirs=100):
+    """ Returns the path of an image below root, searching at most max_dirs directories, or None. """
+    image_extensions = ('.jpg', '.jpeg', '.png', '.bmp')
+    for i, (dir_path, dir_names, file_names) in enumerate(os.walk(root)):
+        if i >= max_dirs:
+            break
+        dir_names.sort()
+        for f in sorted(file_names):
+            if f.lower().endswith(image_extensions):
+                return os.path.join(dir_path, f)
+    return None
+
+
+def init_default_decoder(root):
+    """ Selects the decoder backend of default_image_loader using an image below root, if it is not selected yet.
+    Called by the datasets using it when they are constructed, i.e. in the main process before the DataLoader workers
+    are started, such that the decoders are benchmarked only once and all workers use the same backend. The choice is
+    passed to spawned workers through the LTR_IMAGE_DECODER environment variable. If no image is found, the backend is
+    selected when the first image is loaded.
+    returns:
+        str - name of the backend, or None if it is not selected
+    """
+    if default_image_loader.decoder is None and isinstance(root, str) and os.path.isdir(root):
+        sample_path = _find_image(root)
+        if sample_path is not None:
+            default_image_loader.decoder = select_decoder(sample_path)
+            os.environ['LTR_IMAGE_DECODER'] = default_image_loader.decoder
+    return default_image_loader.decoder
+
+
+def uses_default_image_loader(image_loader):
+    """ Whether image_loader reads the images using default_image_loader, either directly or through the loaders it
+    wraps, e.g. a ScaledImageLoader or a ShardImageLoader with the default_image_loader as fallback. """
+    while image_loader is not None:
+        if image_loader is default_image_loader:
+            return True
+        image_loader = getattr(image_loader, 'image_loader', getattr(image_loader, 'fallback_loader', None))
+    return False
+
+
 def default_image_loader(path):
-    """The default image loader, reads the image from the given path. It first tries to use the jpeg4py_loader,
-    but reverts to the opencv_loader if the former is not available."""
-    if default_image_loader.use_jpeg4py is None:
-        # Try using jpeg4py
-        im = jpeg4py_loader(path)
-        if im is None:
-            default_image_loader.use_jpeg4py = False
-            print('Using opencv_loader instead.')
-        else:
-            default_image_loader.use_jpeg4py = True
-            return im
-    if default_image_loader.use_jpeg4py:
-        return jpeg4py_loader(path)
-    return opencv_loader(path)
-
-default_image_loader.use_jpeg4py = None
+    """The default image loader, reads the image from the given path. The decoder backend is selected when the
+    datasets are constructed or the first time an image is loaded, see init_default_decoder and select_decoder. Images
+    which can not be read by the selected backend, e.g. png images with a jpeg only decoder, are read using the
+    opencv_loader. The first such fallback of each process is reported."""
+    if default_image_loader.decoder is None:
+        default_image_loader.decoder = select_decoder(path)
+    try:
+        return get_decoder(default_image_loader.decoder)(path)
+    except Exception as e:
+        if not default_image_loader.fallback_reported:
+            default_image_loader.fallback_reported = True
+            print('WARNING: The {} image decoder could not read "{}" ({}). Using opencv for the images it can not '
+                  'read, further fallbacks are not reported.'.format(default_image_loader.decoder, path, e))
+        return opencv_loader(path)
+
+default_image_loader.decoder = None
+default_image_loader.fallback_reported = False
 
 
 def jpeg4py_loader(path):
-    """ Image reading using jpeg4py https://github.com/ajkxyz/jpeg4py"""
+    """ Image reading using jpeg4py https://github.com/ajkxyz/jpeg4py. Uses the opencv_loader if jpeg4py is not
+    installed."""
+    if jpeg4py is None:
+        return opencv_loader(path)
     try:
         return jpeg4py.JPEG(path).decode()
     except Exception as e:
@@ -44,21 +302,96 @@ def jpeg4py_loader(path):
 def opencv_loader(path):
     """ Read image using opencv's imread function and returns it in rgb format"""
     try:
-        im = cv.imread(path, cv.IMREAD_COLOR)
+        return _decode_opencv(path)
+    except Exception as e:
+        print('ERROR: Could not read image "{}"'.format(path))
+        print(e)
+        return None
+
+
+def opencv_reduced_loader(path, downscale):
+    """ Read image using opencv's imread function, downscaled by the factor downscale (1, 2, 4 or 8), and return it in
+    rgb format. For jpeg images, the downscaling is performed by libjpeg in the DCT domain, which is several times
+    faster than decoding the full resolution image."""
+    if downscale == 1:
+        return opencv_loader(path)
 
-        # convert to rgb and return
-        return cv.cvtColor(im, cv.COLOR_BGR2RGB)
+    try:
+        im = cv.imread(path, ScaledImageLoader.reduced_flags[downscale])
+
+        # convert to rgb in place and return
+        return cv.cvtColor(im, cv.COLOR_BGR2RGB, dst=im)
     except Exception as e:
         print('ERROR: Could not read image "{}"'.format(path))
         print(e)
         return None
 
 
+def resize_reduced(im, downscale):
+    """ Downscales a full resolution image by the factor downscale to the size of the reduced resolution decoding, i.e.
+    the size is rounded up as done by libjpeg."""
+    if downscale == 1:
+        return im
+    h, w = im.shape[:2]
+    return cv.resize(im, (-(-w // downscale), -(-h // downscale)), interpolation=cv.INTER_AREA)
+
+
+def load_reduced(image_loader, path, downscale):
+    """ Loads an image downscaled by the factor downscale (1, 2, 4 or 8) using image_loader. Loaders supporting reduced
+    resolution decoding implement load_reduced(path, downscale), e.g. ShardImageLoader and CachedImageLoader. The images
+    of the file based loaders of this module are read using opencv_reduced_loader. For other loaders, the full
+    resolution image is loaded and resized."""
+    if downscale == 1:
+        return image_loader(path)
+    if hasattr(image_loader, 'load_reduced'):
+        return image_loader.load_reduced(path, downscale)
+    if image_loader in (default_image_loader, opencv_loader, jpeg4py_loader, jpeg4py_loader_w_failsafe):
+        return opencv_reduced_loader(path, downscale)
+
+    im = image_loader(path)
+    return None if im is None else resize_reduced(im, downscale)
+
+
+class ScaledImageLoader:
+    """ Image loader supporting reduced resolution decoding. The samplers set the downscale factor using downscaled()
+    when the frames are anyway downsampled by at least that factor when cropping the search regions, see
+    BaseProcessing.max_input_downscale. The boxes and masks are rescaled accordingly by the sampler. The reduced
+    resolution images are loaded by the wrapped image_loader, see load_reduced. Use as e.g.
+    Got10k(image_loader=ScaledImageLoader())."""
+
+    reduced_flags = {2: cv.IMREAD_REDUCED_COLOR_2, 4: cv.IMREAD_REDUCED_COLOR_4, 8: cv.IMREAD_REDUCED_COLOR_8}
+
+    def __init__(self, image_loader=None):
+        """
+        args:
+            image_loader - Loader used for full resolution images. Uses the default_image_loader if None.
+        """
+        self.image_loader = default_image_loader if image_loader is None else image_loader
+        self.downscale = 1
+
+    @contextmanager
+    def downscaled(self, downscale):
+        """ Context in which the images are loaded downscaled by the factor downscale (1, 2, 4 or 8). """
+        if downscale not in (1, 2, 4, 8):
+            raise ValueError('Unsupported downscale factor {}.'.format(downscale))
+
+        prev_downscale = self.downscale
+        self.downscale = downscale
+        try:
+            yield self
+        finally:
+            self.downscale = prev_downscale
+
+    def __call__(self, path):
+        return load_reduced(self.image_loader, path, self.downscale)
+
+
 def jpeg4py_loader_w_failsafe(path):
     """ Image reading using jpeg4py https://github.com/ajkxyz/jpeg4py"""
     try:
         return jpeg4py.JPEG(path).decode()
     except:
+        # Also reached if jpeg4py is not installed
         try:
             im = cv.imread(path, cv.IMREAD_COLOR)
 
@@ -1,9 +1,11 @@
+import re
 import torch
 import torch.utils.data.dataloader
 import importlib
-import collections
+import collections.abc
 
 from pytracking import TensorDict, TensorList
+from ltr.admin import distributed
 
 string_classes = (str, bytes)
 
@@ -38,13 +40,13 @@ def ltr_collate(batch):
         elem = batch[0]
         if elem_type.__name__ == 'ndarray':
             # array of string classes and object
-            if torch.utils.data.dataloader.re.search('[SaUO]', elem.dtype.str) is not None:
+            if re.search('[SaUO]', elem.dtype.str) is not None:
                 raise TypeError(error_msg.format(elem.dtype))
 
             return torch.stack([torch.from_numpy(b) for b in batch], 0)
         if elem.shape == ():  # scalars
             py_type = float if elem.dtype.name.startswith('float') else int
-            return torch.utils.data.dataloader.numpy_type_map[elem.dtype.name](list(map(py_type, batch)))
+            return torch.as_tensor(list(map(py_type, batch)))
     elif isinstance(batch[0], int):
         return torch.LongTensor(batch)
     elif isinstance(batch[0], float):
@@ -53,12 +55,12 @@ def ltr_collate(batch):
         return batch
     elif isinstance(batch[0], TensorDict):
         return TensorDict({key: ltr_collate([d[key] for d in batch]) for key in batch[0]})
-    elif isinstance(batch[0], collections.Mapping):
+    elif isinstance(batch[0], collections.abc.Mapping):
         return {key: ltr_collate([d[key] for d in batch]) for key in batch[0]}
     elif isinstance(batch[0], TensorList):
         transposed = zip(*batch)
         return TensorList([ltr_collate(samples) for samples in transposed])
-    elif isinstance(batch[0], collections.Sequence):
+    elif isinstance(batch[0], collections.abc.Sequence):
         transposed = zip(*batch)
         return [ltr_collate(samples) for samples in transposed]
     elif batch[0] is None:
@@ -89,13 +91,13 @@ def ltr_collate_stack1(batch):
         elem = batch[0]
         if elem_type.__name__ == 'ndarray':
             # array of string classes and object
-            if torch.utils.data.dataloader.re.search('[SaUO]', elem.dtype.str) is not None:
+            if re.search('[SaUO]', elem.dtype.str) is not None:
                 raise TypeError(error_msg.format(elem.dtype))
 
             return torch.stack([torch.from_numpy(b) for b in batch], 1)
         if elem.shape == ():  # scalars
             py_type = float if elem.dtype.name.startswith('float') else int
-            return torch.utils.data.dataloader.numpy_type_map[elem.dtype.name](list(map(py_type, batch)))
+            return torch.as_tensor(list(map(py_type, batch)))
     elif isinstance(batch[0], int):
         return torch.LongTensor(batch)
     elif isinstance(batch[0], float):
@@ -104,12 +106,12 @@ def ltr_collate_stack1(batch):
         return batch
     elif isinstance(batch[0], TensorDict):
         return TensorDict({key: ltr_collate_stack1([d[key] for d in batch]) for key in batch[0]})
-    elif isinstance(batch[0], collections.Mapping):
+    elif isinstance(batch[0], collections.abc.Mapping):
         return {key: ltr_collate_stack1([d[key] for d in batch]) for key in batch[0]}
     elif isinstance(batch[0], TensorList):
         transposed = zip(*batch)
         return TensorList([ltr_collate_stack1(samples) for samples in transposed])
-    elif isinstance(batch[0], collections.Sequence):
+    elif isinstance(batch[0], collections.abc.Sequence):
         transposed = zip(*batch)
         return [ltr_collate_stack1(samples) for samples in transposed]
     elif batch[0] is None:
@@ -118,6 +120,91 @@ def ltr_collate_stack1(batch):
     raise TypeError((error_msg.format(type(batch[0]))))
 
 
+class LTRSlotCollate:
+    """Collate function which writes the batches into a ring of preallocated shared memory batch slots, instead of
+    allocating new shared memory tensors for every batch. Each worker allocates its slots on first use, with the shapes
+    of the first collated batch. The slots are then re-used in a round-robin fashion, such that the main process
+    receives the batches in already mapped shared memory, without any allocation or extra stacking copy. Fields whose
+    shape changes between batches are allocated as usual.
+
+    Note: A slot is overwritten num_slots batches later by the same worker. The number of slots must thus exceed the
+    number of batches a worker can have in flight (prefetch_factor) plus the batches held by the training loop. Batches
+    which need to be kept for longer must be cloned. In the main process (num_workers=0), the regular collation is used.
+    """
+
+    def __init__(self, stack_dim=0, num_slots=5):
+        self.stack_dim = stack_dim
+        self.num_slots = num_slots
+        self._base_collate = ltr_collate if stack_dim == 0 else ltr_collate_stack1
+        self._slots = None
+        self._next_slot = 0
+
+    def __getstate__(self):
+        # The slots are allocated by each worker
+        state = self.__dict__.copy()
+        state['_slots'] = None
+        state['_next_slot'] = 0
+        return state
+
+    def __call__(self, batch):
+        if torch.utils.data.get_worker_info() is None:
+            return self._base_collate(batch)
+
+        if self._slots is None:
+            self._slots = [dict() for _ in range(self.num_slots)]
+
+        slot = self._slots[self._next_slot]
+        self._next_slot = (self._next_slot + 1) % self.num_slots
+        return self._collate(batch, slot, ())
+
+    def _collate(self, batch, slot, path):
+        elem = batch[0]
+        if isinstance(elem, torch.Tensor):
+            shape = list(elem.shape)
+            shape.insert(self.stack_dim, len(batch))
+
+            out = slot.get(path)
+            if out is None or list(out.shape) != shape or out.dtype != elem.dtype:
+                out = elem.new_empty(shape).share_memory_()
+                slot[path] = out
+            return torch.stack(batch, self.stack_dim, out=out)
+        elif isinstance(elem, TensorDict):
+            return TensorDict({key: self._collate([d[key] for d in batch], slot, path + (key,)) for key in elem})
+        elif isinstance(elem, collections.abc.Mapping):
+            return {key: self._collate([d[key] for d in batch], slot, path + (key,)) for key in elem}
+        elif isinstance(elem, TensorList):
+            transposed = zip(*batch)
+            return TensorList([self._collate(samples, slot, path + (i,)) for i, samples in enumerate(transposed)])
+        elif isinstance(elem, collections.abc.Sequence) and not isinstance(elem, string_classes):
+            transposed = zip(*batch)
+            return [self._collate(samples, slot, path + (i,)) for i, samples in enumerate(transposed)]
+
+        return self._base_collate(batch)
+
+
+class ResumableSampler(torch.utils.data.Sampler):
+    """Yields the dataset indices in order, starting from start_index. Used for the seeded samplers, see
+    ltr.data.sampler.SeedableSampler, which draw a random sample for each index. The order of the indices is then not
+    important, and an epoch can be resumed at any iteration by skipping the indices which were already used.
+
+    In distributed training, process rank uses the indices rank, rank + num_replicas, ... Thus, the processes draw
+    non-overlapping samples, which together are the same as the samples drawn by a single process."""
+
+    def __init__(self, data_source, num_replicas=1, rank=0):
+        self.num_replicas = num_replicas
+        self.rank = rank
+        # All processes must run the same number of iterations
+        self.num_samples = len(data_source) // num_replicas
+        self.start_index = 0
+
+    def __iter__(self):
+        return iter(range(self.rank + self.start_index * self.num_replicas, self.num_samples * self.num_replicas,
+                          self.num_replicas))
+
+    def __len__(self):
+        return self.num_samples - self.start_index
+
+
 class LTRLoader(torch.utils.data.dataloader.DataLoader):
     """
     Data loader. Combines a dataset and a sampler, and provides
@@ -142,6 +229,14 @@ class LTRLoader(torch.utils.data.dataloader.DataLoader):
             (default: 0)
         collate_fn (callable, optional): merges a list of samples to form a mini-batch.
         stack_dim (int): Dimension along which to stack to form the batch. (default: 0)
+        batch_transform (callable, optional): Augmentation applied by the trainer on each collated batch, after
+            moving it to the device. See ltr.data.batch_transforms. (default: None)
+        use_batch_slots (bool, optional): Collate the batches into a ring of preallocated shared memory slots in each
+            worker, see LTRSlotCollate. Only used with the default collate_fn. Pinning the memory (pin_memory) is
+            optional in this mode, it copies each slot once more. (default: False)
+        num_batch_slots (int, optional): Number of slots per worker. (default: 5)
+        prefetch_factor (int, optional): Number of batches loaded in advance by each worker. Uses the pytorch default
+            if None. (default: None)
         pin_memory (bool, optional): If ``True``, the data loader will copy tensors
             into CUDA pinned memory before returning them.
         drop_last (bool, optional): set to ``True`` to drop the last incomplete batch,
@@ -154,6 +249,13 @@ class LTRLoader(torch.utils.data.dataloader.DataLoader):
             worker subprocess with the worker id (an int in ``[0, num_workers - 1]``) as
             input, after seeding and before data loading. (default: None)
 
+    If the dataset is a seeded sampler (see ltr.data.sampler.SeedableSampler) and no sampler is given, the indices are
+    iterated in order using a ResumableSampler, such that an epoch can be resumed at a given iteration, see set_epoch.
+
+    In distributed training (see ltr.admin.distributed), each process loads its own shard of the dataset, unless a
+    sampler is given. Seeded samplers are split using a ResumableSampler, other datasets using a DistributedSampler.
+    Thus, an epoch is divided over the processes and batch_size is the batch size per process.
+
     .. note:: By default, each worker will have its PyTorch seed set to
               ``base_seed + worker_id``, where ``base_seed`` is a long generated
               by main process using its RNG. However, seeds for other libraries
@@ -172,8 +274,13 @@ class LTRLoader(torch.utils.data.dataloader.DataLoader):
 
     def __init__(self, name, dataset, training=True, batch_size=1, shuffle=False, sampler=None, batch_sampler=None,
                  num_workers=0, epoch_interval=1, collate_fn=None, stack_dim=0, pin_memory=False, drop_last=False,
-                 timeout=0, worker_init_fn=None):
-        if collate_fn is None:
+                 timeout=0, worker_init_fn=None, batch_transform=None, use_batch_slots=False, num_batch_slots=5,
+                 prefetch_factor=None):
+        if collate_fn is None and use_batch_slots:
+            if stack_dim not in (0, 1):
+                raise ValueError('Stack dim no supported. Must be 0 or 1.')
+            collate_fn = LTRSlotCollate(stack_dim, num_batch_slots)
+        elif collate_fn is None:
             if stack_dim == 0:
                 collate_fn = ltr_collate
             elif stack_dim == 1:
@@ -181,14 +288,45 @@ class LTRLoader(torch.utils.data.dataloader.DataLoader):
             else:
                 raise ValueError('Stack dim no supported. Must be 0 or 1.')
 
+        if getattr(dataset, 'seed', None) is not None and hasattr(dataset, 'set_seed_stream'):
+            # Loaders sharing the seed, e.g. the training and validation loaders, draw different samples
+            dataset.set_seed_stream(name)
+
+        if getattr(dataset, 'seed', None) is not None and sampler is None and batch_sampler is None:
+            # The samples are random given the index, shuffling is not needed
+            sampler = ResumableSampler(dataset, distributed.get_world_size(), distributed.get_rank())
+            shuffle = False
+        elif distributed.is_distributed() and sampler is None and batch_sampler is None:
+            sampler = torch.utils.data.distributed.DistributedSampler(dataset, shuffle=shuffle, drop_last=True)
+            shuffle = False
+
+        # Only passed if set, since the prefetch factor must not be given when loading in the main process
+        kwargs = {'prefetch_factor': prefetch_factor} if prefetch_factor is not None and num_workers > 0 else {}
+
         super(LTRLoader, self).__init__(dataset, batch_size, shuffle, sampler, batch_sampler,
                  num_workers, collate_fn, pin_memory, drop_last,
-                 timeout, worker_init_fn)
+                 timeout, worker_init_fn, **kwargs)
 
         self.name = name
         self.training = training
         self.epoch_interval = epoch_interval
         self.stack_dim = stack_dim
+        self.batch_transform = batch_transform
+
+    def set_epoch(self, epoch, start_iteration=0):
+        """Sets the epoch of the dataset, if supported, and the iteration at which the epoch is started.
+        returns:
+            bool - True if the loader skips directly to start_iteration. Otherwise, the epoch starts from the beginning.
+        """
+        if hasattr(self.dataset, 'set_epoch'):
+            self.dataset.set_epoch(epoch)
+
+        if isinstance(self.sampler, ResumableSampler):
+            self.sampler.start_index = min(start_iteration * self.batch_size, self.sampler.num_samples)
+            return True
+        if isinstance(self.sampler, torch.utils.data.distributed.DistributedSampler):
+            self.sampler.set_epoch(epoch)
+        return start_iteration == 0
 
 
 class MultiEpochLTRLoader(LTRLoader):
@@ -203,6 +341,10 @@ class MultiEpochLTRLoader(LTRLoader):
     def __len__(self):
         return len(self.batch_sampler.sampler)
 
+    def set_epoch(self, epoch, start_iteration=0):
+        # The workers and the index iterator are persistent, such that the epoch can not be changed
+        return start_iteration == 0
+
     def __iter__(self):
         for i in range(len(self)):
             yield next(self.iterator)
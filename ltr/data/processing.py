@@ -36,6 +36,54 @@ class BaseProcessing:
     def __call__(self, data: TensorDict):
         raise NotImplementedError
 
+    def max_input_downscale(self, data: TensorDict):
+        """ Largest factor (1, 2, 4 or 8) by which the input images can be downscaled before processing, without the
+        search regions being upsampled when they are cropped and resized to output_sz. Used by the samplers for reduced
+        resolution decoding, see ltr.data.image_loader.ScaledImageLoader. Supported for processing classes which crop
+        square search regions using the attributes search_area_factor, output_sz and scale_jitter_factor. Returns 1
+        otherwise.
+
+        args:
+            data - Should contain the full resolution boxes 'train_anno' and 'test_anno', before processing
+        returns:
+            int - the downscale factor
+        """
+        search_area_factor = getattr(self, 'search_area_factor', None)
+        output_sz = getattr(self, 'output_sz', None)
+        scale_jitter_factor = getattr(self, 'scale_jitter_factor', None)
+
+        if not isinstance(search_area_factor, (int, float)) or output_sz is None or \
+                not isinstance(scale_jitter_factor, dict):
+            return 1
+
+        output_sz = max(output_sz) if isinstance(output_sz, (list, tuple)) else output_sz
+        crop_type = getattr(self, 'crop_type', 'replicate')
+        max_scale_change = getattr(self, 'max_scale_change', None)
+        if crop_type != 'replicate' and max_scale_change is None:
+            return 1
+
+        min_ratio = float('inf')
+        for s in ['train', 'test']:
+            boxes = data[s + '_anno']
+            if len(boxes) == 0:
+                continue
+            boxes = torch.stack(boxes) if isinstance(boxes, (list, tuple)) else boxes
+
+            # Smallest crop size within 3 std of the scale jittering. The jitter of the crop size has std
+            # scale_jitter_factor / sqrt(2)
+            min_jitter = math.exp(-3 * scale_jitter_factor[s] / math.sqrt(2))
+            crop_sz = boxes[:, 2:4].prod(dim=1).clamp(min=0).sqrt().min().item() * search_area_factor * min_jitter
+
+            if crop_type != 'replicate':
+                crop_sz = crop_sz / max_scale_change
+
+            min_ratio = min(min_ratio, crop_sz / output_sz)
+
+        for downscale in (8, 4, 2):
+            if downscale <= min_ratio:
+                return downscale
+        return 1
+
 
 class ATOMProcessing(BaseProcessing):
     """ The processing class used for training ATOM. The images are processed in the following way.
@@ -85,34 +133,34 @@ class ATOMProcessing(BaseProcessing):
 
         return torch.cat((jittered_center - 0.5 * jittered_size, jittered_size), dim=0)
 
-    def _generate_proposals(self, box):
-        """ Generates proposals by adding noise to the input box
+    def _generate_proposals(self, boxes):
+        """ Generates proposals for all frames by adding noise to the input boxes
         args:
-            box - input box
+            boxes - list of input boxes, one per frame
 
         returns:
-            torch.Tensor - Array of shape (num_proposals, 4) containing proposals
-            torch.Tensor - Array of shape (num_proposals,) containing IoU overlap of each proposal with the input box. The
+            list - Arrays of shape (num_proposals, 4) containing the proposals for each frame
+            list - Arrays of shape (num_proposals,) containing IoU overlap of each proposal with the input box. The
                         IoU is mapped to [-1, 1]
         """
         # Generate proposals
         num_proposals = self.proposal_params['boxes_per_frame']
         proposal_method = self.proposal_params.get('proposal_method', 'default')
+        boxes = torch.stack(list(boxes)).view(-1, 4)
 
         if proposal_method == 'default':
-            proposals = torch.zeros((num_proposals, 4))
-            gt_iou = torch.zeros(num_proposals)
-            for i in range(num_proposals):
-                proposals[i, :], gt_iou[i] = prutils.perturb_box(box, min_iou=self.proposal_params['min_iou'],
-                                                                 sigma_factor=self.proposal_params['sigma_factor'])
+            proposals, gt_iou = prutils.perturb_boxes(boxes, num_proposals, min_iou=self.proposal_params['min_iou'],
+                                                      sigma_factor=self.proposal_params['sigma_factor'])
         elif proposal_method == 'gmm':
-            proposals, _, _ = prutils.sample_box_gmm(box, self.proposal_params['proposal_sigma'],
-                                                                             num_samples=num_proposals)
-            gt_iou = prutils.iou(box.view(1,4), proposals.view(-1,4))
+            proposals, _, _ = prutils.sample_boxes_gmm(boxes, self.proposal_params['proposal_sigma'],
+                                                       num_samples=num_proposals)
+            gt_iou = prutils.iou_gen(boxes.view(-1, 1, 4), proposals)
+        else:
+            raise ValueError('Unknown proposal method.')
 
         # Map to [-1, 1]
         gt_iou = gt_iou * 2 - 1
-        return proposals, gt_iou
+        return list(proposals.unbind(0)), list(gt_iou.unbind(0))
 
     def __call__(self, data: TensorDict):
         """
@@ -143,10 +191,7 @@ class ATOMProcessing(BaseProcessing):
             data[s + '_images'], data[s + '_anno'] = self.transform[s](image=crops, bbox=boxes, joint=False)
 
         # Generate proposals
-        frame2_proposals, gt_iou = zip(*[self._generate_proposals(a) for a in data['test_anno']])
-
-        data['test_proposals'] = list(frame2_proposals)
-        data['proposal_iou'] = list(gt_iou)
+        data['test_proposals'], data['proposal_iou'] = self._generate_proposals(data['test_anno'])
 
         # Prepare output
         if self.mode == 'sequence':
@@ -200,18 +245,24 @@ class KLBBregProcessing(BaseProcessing):
 
         return torch.cat((jittered_center - 0.5 * jittered_size, jittered_size), dim=0)
 
-    def _generate_proposals(self, box):
-        """
+    def _generate_proposals(self, boxes):
+        """ Generate proposal sample boxes for all frames from a GMM proposal distribution and compute their
+        ground-truth density.
+        args:
+            boxes - list of input bounding boxes, one per frame
+        returns:
+            list, list, list - proposals, proposal density and ground truth density for each frame
         """
         # Generate proposals
-        proposals, proposal_density, gt_density = prutils.sample_box_gmm(box, self.proposal_params['proposal_sigma'],
-                                                                         gt_sigma=self.proposal_params['gt_sigma'],
-                                                                         num_samples=self.proposal_params[
-                                                                             'boxes_per_frame'],
-                                                                         add_mean_box=self.proposal_params.get(
-                                                                             'add_mean_box', False))
+        boxes = torch.stack(list(boxes)).view(-1, 4)
+        proposals, proposal_density, gt_density = prutils.sample_boxes_gmm(boxes, self.proposal_params['proposal_sigma'],
+                                                                           gt_sigma=self.proposal_params['gt_sigma'],
+                                                                           num_samples=self.proposal_params[
+                                                                               'boxes_per_frame'],
+                                                                           add_mean_box=self.proposal_params.get(
+                                                                               'add_mean_box', False))
 
-        return proposals, proposal_density, gt_density
+        return list(proposals.unbind(0)), list(proposal_density.unbind(0)), list(gt_density.unbind(0))
 
     def __call__(self, data: TensorDict):
         """
@@ -242,7 +293,7 @@ class KLBBregProcessing(BaseProcessing):
             data[s + '_images'], data[s + '_anno'] = self.transform[s](image=crops, bbox=boxes, joint=False)
 
         # Generate proposals
-        proposals, proposal_density, gt_density = zip(*[self._generate_proposals(a) for a in data['test_anno']])
+        proposals, proposal_density, gt_density = self._generate_proposals(data['test_anno'])
 
         data['test_proposals'] = proposals
         data['proposal_density'] = proposal_density
@@ -285,16 +336,23 @@ class ATOMwKLProcessing(BaseProcessing):
 
         return torch.cat((jittered_center - 0.5 * jittered_size, jittered_size), dim=0)
 
-    def _generate_proposals(self, box):
-        """
+    def _generate_proposals(self, boxes):
+        """ Generate proposal sample boxes for all frames from a GMM proposal distribution, and compute their
+        ground-truth density and IoU with the input box.
+        args:
+            boxes - list of input bounding boxes, one per frame
+        returns:
+            list, list, list, list - proposals, proposal density, ground truth density and IoU for each frame
         """
         # Generate proposals
-        proposals, proposal_density, gt_density = prutils.sample_box_gmm(box, self.proposal_params['proposal_sigma'],
-                                                                         self.proposal_params['gt_sigma'],
-                                                                         self.proposal_params['boxes_per_frame'])
+        boxes = torch.stack(list(boxes)).view(-1, 4)
+        proposals, proposal_density, gt_density = prutils.sample_boxes_gmm(boxes, self.proposal_params['proposal_sigma'],
+                                                                           self.proposal_params['gt_sigma'],
+                                                                           self.proposal_params['boxes_per_frame'])
 
-        iou = prutils.iou_gen(proposals, box.view(1, 4))
-        return proposals, proposal_density, gt_density, iou
+        iou = prutils.iou_gen(proposals, boxes.view(-1, 1, 4))
+        return list(proposals.unbind(0)), list(proposal_density.unbind(0)), list(gt_density.unbind(0)), \
+               list(iou.unbind(0))
 
     def __call__(self, data: TensorDict):
         # Apply joint transforms
@@ -317,8 +375,7 @@ class ATOMwKLProcessing(BaseProcessing):
             data[s + '_images'], data[s + '_anno'] = self.transform[s](image=crops, bbox=boxes, joint=False)
 
         # Generate proposals
-        proposals, proposal_density, gt_density, proposal_iou = zip(
-            *[self._generate_proposals(a) for a in data['test_anno']])
+        proposals, proposal_density, gt_density, proposal_iou = self._generate_proposals(data['test_anno'])
 
         data['test_proposals'] = proposals
         data['proposal_density'] = proposal_density
@@ -394,37 +451,34 @@ class DiMPProcessing(BaseProcessing):
 
         return torch.cat((jittered_center - 0.5 * jittered_size, jittered_size), dim=0)
 
-    def _generate_proposals(self, box):
-        """ Generates proposals by adding noise to the input box
+    def _generate_proposals(self, boxes):
+        """ Generates proposals for all frames by adding noise to the input boxes
         args:
-            box - input box
+            boxes - list of input boxes, one per frame
 
         returns:
-            torch.Tensor - Array of shape (num_proposals, 4) containing proposals
-            torch.Tensor - Array of shape (num_proposals,) containing IoU overlap of each proposal with the input box. The
+            list - Arrays of shape (num_proposals, 4) containing the proposals for each frame
+            list - Arrays of shape (num_proposals,) containing IoU overlap of each proposal with the input box. The
                         IoU is mapped to [-1, 1]
         """
         # Generate proposals
         num_proposals = self.proposal_params['boxes_per_frame']
         proposal_method = self.proposal_params.get('proposal_method', 'default')
+        boxes = torch.stack(list(boxes)).view(-1, 4)
 
         if proposal_method == 'default':
-            proposals = torch.zeros((num_proposals, 4))
-            gt_iou = torch.zeros(num_proposals)
-
-            for i in range(num_proposals):
-                proposals[i, :], gt_iou[i] = prutils.perturb_box(box, min_iou=self.proposal_params['min_iou'],
-                                                                 sigma_factor=self.proposal_params['sigma_factor'])
+            proposals, gt_iou = prutils.perturb_boxes(boxes, num_proposals, min_iou=self.proposal_params['min_iou'],
+                                                      sigma_factor=self.proposal_params['sigma_factor'])
         elif proposal_method == 'gmm':
-            proposals, _, _ = prutils.sample_box_gmm(box, self.proposal_params['proposal_sigma'],
-                                                     num_samples=num_proposals)
-            gt_iou = prutils.iou(box.view(1, 4), proposals.view(-1, 4))
+            proposals, _, _ = prutils.sample_boxes_gmm(boxes, self.proposal_params['proposal_sigma'],
+                                                       num_samples=num_proposals)
+            gt_iou = prutils.iou_gen(boxes.view(-1, 1, 4), proposals)
         else:
             raise ValueError('Unknown proposal method.')
 
         # Map to [-1, 1]
         gt_iou = gt_iou * 2 - 1
-        return proposals, gt_iou
+        return list(proposals.unbind(0)), list(gt_iou.unbind(0))
 
     def _generate_label_function(self, target_bb):
         """ Generates the gaussian label function centered at target_bb
@@ -472,10 +526,7 @@ class DiMPProcessing(BaseProcessing):
 
         # Generate proposals
         if self.proposal_params:
-            frame2_proposals, gt_iou = zip(*[self._generate_proposals(a) for a in data['test_anno']])
-
-            data['test_proposals'] = list(frame2_proposals)
-            data['proposal_iou'] = list(gt_iou)
+            data['test_proposals'], data['proposal_iou'] = self._generate_proposals(data['test_anno'])
 
         # Prepare output
         if self.mode == 'sequence':
@@ -546,19 +597,22 @@ class KLDiMPProcessing(BaseProcessing):
 
         return torch.cat((jittered_center - 0.5 * jittered_size, jittered_size), dim=0)
 
-    def _generate_proposals(self, box):
+    def _generate_proposals(self, boxes):
         """ Generate proposal sample boxes from a GMM proposal distribution and compute their ground-truth density.
         This is used for ML and KL based regression learning of the bounding box regressor.
         args:
-            box - input bounding box
+            boxes - list of input bounding boxes, one per frame
+        returns:
+            list, list, list - proposals, proposal density and ground truth density for each frame
         """
         # Generate proposals
-        proposals, proposal_density, gt_density = prutils.sample_box_gmm(box, self.proposal_params['proposal_sigma'],
-                                                                         gt_sigma=self.proposal_params['gt_sigma'],
-                                                                         num_samples=self.proposal_params['boxes_per_frame'],
-                                                                         add_mean_box=self.proposal_params.get('add_mean_box', False))
+        boxes = torch.stack(list(boxes)).view(-1, 4)
+        proposals, proposal_density, gt_density = prutils.sample_boxes_gmm(boxes, self.proposal_params['proposal_sigma'],
+                                                                           gt_sigma=self.proposal_params['gt_sigma'],
+                                                                           num_samples=self.proposal_params['boxes_per_frame'],
+                                                                           add_mean_box=self.proposal_params.get('add_mean_box', False))
 
-        return proposals, proposal_density, gt_density
+        return list(proposals.unbind(0)), list(proposal_density.unbind(0)), list(gt_density.unbind(0))
 
     def _generate_label_function(self, target_bb):
         """ Generates the gaussian label function centered at target_bb
@@ -634,7 +688,7 @@ class KLDiMPProcessing(BaseProcessing):
             data[s + '_images'], data[s + '_anno'] = self.transform[s](image=crops, bbox=boxes, joint=False)
 
         # Generate proposals
-        proposals, proposal_density, gt_density = zip(*[self._generate_proposals(a) for a in data['test_anno']])
+        proposals, proposal_density, gt_density = self._generate_proposals(data['test_anno'])
 
         data['test_proposals'] = proposals
         data['proposal_density'] = proposal_density
@@ -875,23 +929,16 @@ class KYSProcessing(BaseProcessing):
 
         return out_boxes
 
-    def _generate_proposals(self, frame2_gt_crop):
-        # Generate proposals
-        num_proposals = self.proposal_params['boxes_per_frame']
-        frame2_proposals = np.zeros((num_proposals, 4))
-        gt_iou = np.zeros(num_proposals)
-        sample_p = np.zeros(num_proposals)
-
-        for i in range(num_proposals):
-            frame2_proposals[i, :], gt_iou[i], sample_p[i] = prutils.perturb_box(
-                frame2_gt_crop,
-                min_iou=self.proposal_params['min_iou'],
-                sigma_factor=self.proposal_params['sigma_factor']
-            )
+    def _generate_proposals(self, boxes):
+        # Generate proposals for all frames
+        boxes = torch.stack(list(boxes)).view(-1, 4)
+        frame2_proposals, gt_iou = prutils.perturb_boxes(boxes, self.proposal_params['boxes_per_frame'],
+                                                         min_iou=self.proposal_params['min_iou'],
+                                                         sigma_factor=self.proposal_params['sigma_factor'])
 
         gt_iou = gt_iou * 2 - 1
 
-        return frame2_proposals, gt_iou
+        return list(frame2_proposals.unbind(0)), list(gt_iou.unbind(0))
 
     def _generate_label_function(self, target_bb, target_absent=None):
         gauss_label = prutils.gaussian_label_function(target_bb.view(-1, 4), self.label_function_params['sigma_factor'],
@@ -921,10 +968,7 @@ class KYSProcessing(BaseProcessing):
             data[s + '_images'], data[s + '_anno'] = self.transform[s](image=crops, bbox=boxes, joint=False)
 
         if self.proposal_params:
-            frame2_proposals, gt_iou = zip(*[self._generate_proposals(a.numpy()) for a in data['test_anno']])
-
-            data['test_proposals'] = [torch.tensor(p, dtype=torch.float32) for p in frame2_proposals]
-            data['proposal_iou'] = [torch.tensor(gi, dtype=torch.float32) for gi in gt_iou]
+            data['test_proposals'], data['proposal_iou'] = self._generate_proposals(data['test_anno'])
 
         data = data.apply(stack_tensors)
 
@@ -964,6 +1008,10 @@ class TargetCandiateMatchingProcessing(BaseProcessing):
         artificial candidates that are ignored during training. In addition, the scores  and coordinates of each
         candidate are altered to increase matching difficulty. Finally, the assignment matrix is formed where a 1
         denotes a match between two candidates, -1 denotes that a match is not available.
+
+        If the dataset uses a FeatureStore, the precomputed backbone features of the search areas are returned as
+        feat_cropped0 and feat_cropped1 instead of the cropped images. For self-supervision, the second frame is then
+        one of the stored augmented views, with its search area box.
         """
 
     def __init__(self, output_sz, num_target_candidates=None, mode='self_sup',
@@ -993,37 +1041,90 @@ class TargetCandiateMatchingProcessing(BaseProcessing):
 
         return data
 
+    def get_search_area_views(self, img, sa_box, num_views=2):
+        """ Crops the search area and num_views - 1 augmented views of it, as used for self-supervision. The views
+        are used to precompute the backbone features, see ltr.dataset.feature_store.
+        returns:
+            Tensor - transformed crops (num_views x 3 x output_sz x output_sz)
+            Tensor - search area boxes (num_views x 4) of the views
+        """
+        crops = [self.transform['train'](image=prutils.sample_target_from_crop_region(img, sa_box, self.output_sz))]
+        boxes = [sa_box.float()]
+
+        for _ in range(1, num_views):
+            box = self._jitter_search_area_box(sa_box)
+            crop = prutils.sample_target_from_crop_region(img, box, self.output_sz)
+            crops.append(self.img_aug_transform(image=crop))
+            boxes.append(box.float())
+
+        return torch.stack(crops), torch.stack(boxes)
+
+    def _jitter_search_area_box(self, sa_box):
+        if not self.enable_search_area_aug:
+            return sa_box.clone()
+
+        x, y, w, h = sa_box.long().tolist()
+        l = self.search_area_jitter_value
+        return torch.tensor([x + torch.randint(-w//l, w//l+1, (1,)),
+                             y + torch.randint(-h//l, h//l+1, (1,)),
+                             w + torch.randint(-w//l, w//l+1, (1,)),
+                             h + torch.randint(-h//l, h//l+1, (1,))])
+
+    def _add_search_areas(self, data: TensorDict, out: TensorDict):
+        """ Adds the transformed search area crops of the frames to out, or their stored un-augmented features if the
+        dataset uses a FeatureStore. Returns the (height, width) of the full images. """
+        if 'features' in data:
+            data.pop('feature_boxes')
+            for i, features in enumerate(data.pop('features')):
+                out['feat_cropped{}'.format(i)] = [self._stored_features(features)]
+            return [tuple(s) for s in data.pop('img_shape')]
+
+        imgs = data.pop('img')
+        for i, (img, sa_box) in enumerate(zip(imgs, data['search_area_box'])):
+            frame_crop = prutils.sample_target_from_crop_region(img, sa_box, self.output_sz)
+            out['img_cropped{}'.format(i)] = [self.transform['train'](image=frame_crop)]
+        return [img.shape[:2] for img in imgs]
+
+    def _stored_features(self, features, view=0):
+        # Copies the view from the memory map. The features are kept in float16 and converted by the network.
+        return torch.from_numpy(np.array(features[view]))
+
     def _original_and_augmented_frame(self, data: TensorDict):
         out = TensorDict()
-        img = data.pop('img')[0]
         tsm_coords = data['target_candidate_coords'][0]
         scores = data['target_candidate_scores'][0]
         sa_box = data['search_area_box'][0]
         sa_box0 = sa_box.clone()
-        sa_box1 = sa_box.clone()
 
-        out['img_shape0'] = [torch.tensor(img.shape[:2])]
-        out['img_shape1'] = [torch.tensor(img.shape[:2])]
+        if 'features' in data:
+            features = data.pop('features')[0]
+            img_shape = tuple(data.pop('img_shape')[0])
 
-        # prepared cropped image
-        frame_crop0 = prutils.sample_target_from_crop_region(img, sa_box0, self.output_sz)
+            # Use one of the stored augmented views as second frame, or the search area itself if there are none
+            view = torch.randint(1, features.shape[0], (1,)).item() if features.shape[0] > 1 else 0
+            sa_box1 = data.pop('feature_boxes')[0][view].clone()
 
-        x, y, w, h = sa_box.long().tolist()
+            out['feat_cropped0'] = [self._stored_features(features, 0)]
+            out['feat_cropped1'] = [self._stored_features(features, view)]
+        else:
+            img = data.pop('img')[0]
+            img_shape = img.shape[:2]
+
+            # prepared cropped image
+            frame_crop0 = prutils.sample_target_from_crop_region(img, sa_box0, self.output_sz)
 
-        if self.enable_search_area_aug:
-            l = self.search_area_jitter_value
-            sa_box1 = torch.tensor([x + torch.randint(-w//l, w//l+1, (1,)),
-                                    y + torch.randint(-h//l, h//l+1, (1,)),
-                                    w + torch.randint(-w//l, w//l+1, (1,)),
-                                    h + torch.randint(-h//l, h//l+1, (1,))])
+            sa_box1 = self._jitter_search_area_box(sa_box)
 
-        frame_crop1 = prutils.sample_target_from_crop_region(img, sa_box1, self.output_sz)
+            frame_crop1 = prutils.sample_target_from_crop_region(img, sa_box1, self.output_sz)
 
-        frame_crop0 = self.transform['train'](image=frame_crop0)
-        frame_crop1 = self.img_aug_transform(image=frame_crop1)
+            frame_crop0 = self.transform['train'](image=frame_crop0)
+            frame_crop1 = self.img_aug_transform(image=frame_crop1)
 
-        out['img_cropped0'] = [frame_crop0]
-        out['img_cropped1'] = [frame_crop1]
+            out['img_cropped0'] = [frame_crop0]
+            out['img_cropped1'] = [frame_crop1]
+
+        out['img_shape0'] = [torch.tensor(img_shape)]
+        out['img_shape1'] = [torch.tensor(img_shape)]
 
         x, y, w, h = sa_box0.tolist()
         img_coords = torch.stack([
@@ -1034,7 +1135,7 @@ class TargetCandiateMatchingProcessing(BaseProcessing):
         img_coords_pad0, img_coords_pad1, valid0, valid1 = self._candidate_drop_out(img_coords, img_coords.clone())
 
         img_coords_pad0, img_coords_pad1 = self._pad_with_fake_candidates(img_coords_pad0, img_coords_pad1, valid0, valid1,
-                                                                          sa_box0, sa_box1, img.shape)
+                                                                          sa_box0, sa_box1, img_shape)
 
         scores_pad0 = self._add_fake_candidate_scores(scores, valid0)
         scores_pad1 = self._add_fake_candidate_scores(scores, valid1)
@@ -1061,7 +1162,7 @@ class TargetCandiateMatchingProcessing(BaseProcessing):
         assert torch.all(tsm_coords_pad0 >= 0) and torch.all(tsm_coords_pad0 < self.score_map_sz[0])
         assert torch.all(tsm_coords_pad1 >= 0) and torch.all(tsm_coords_pad1 < self.score_map_sz[0])
 
-        img_coords_pad1 = self._augment_coords(img_coords_pad1, img.shape, sa_box1)
+        img_coords_pad1 = self._augment_coords(img_coords_pad1, img_shape, sa_box1)
         scores_pad1 = self._augment_scores(scores_pad1, valid1, ~torch.all(valid0 == valid1))
 
         out['candidate_img_coords0'] = [img_coords_pad0]
@@ -1092,9 +1193,6 @@ class TargetCandiateMatchingProcessing(BaseProcessing):
 
     def _previous_and_current_frame(self, data: TensorDict):
         out = TensorDict()
-        imgs = data.pop('img')
-        img0 = imgs[0]
-        img1 = imgs[1]
         sa_box0 = data['search_area_box'][0]
         sa_box1 = data['search_area_box'][1]
         tsm_anno_coord0 = data['target_anno_coord'][0]
@@ -1104,17 +1202,10 @@ class TargetCandiateMatchingProcessing(BaseProcessing):
         scores0 = data['target_candidate_scores'][0]
         scores1 = data['target_candidate_scores'][1]
 
-        out['img_shape0'] = [torch.tensor(img0.shape[:2])]
-        out['img_shape1'] = [torch.tensor(img1.shape[:2])]
-
-        frame_crop0 = prutils.sample_target_from_crop_region(img0, sa_box0, self.output_sz)
-        frame_crop1 = prutils.sample_target_from_crop_region(img1, sa_box1, self.output_sz)
+        img_shape0, img_shape1 = self._add_search_areas(data, out)
 
-        frame_crop0 = self.transform['train'](image=frame_crop0)
-        frame_crop1 = self.transform['train'](image=frame_crop1)
-
-        out['img_cropped0'] = [frame_crop0]
-        out['img_cropped1'] = [frame_crop1]
+        out['img_shape0'] = [torch.tensor(img_shape0)]
+        out['img_shape1'] = [torch.tensor(img_shape1)]
 
         gt_idx0 = self._find_gt_candidate_index(tsm_coords0, tsm_anno_coord0)
         gt_idx1 = self._find_gt_candidate_index(tsm_coords1, tsm_anno_coord1)
@@ -1137,8 +1228,8 @@ class TargetCandiateMatchingProcessing(BaseProcessing):
         drop0 = dropout & (frame_id == 0)
         drop1 = dropout & (frame_id == 1)
 
-        img_coords_pad0, valid0 = self._pad_with_fake_candidates_drop_gt(img_coords0, drop0, gt_idx0, sa_box0, img0.shape)
-        img_coords_pad1, valid1 = self._pad_with_fake_candidates_drop_gt(img_coords1, drop1, gt_idx1, sa_box1, img1.shape)
+        img_coords_pad0, valid0 = self._pad_with_fake_candidates_drop_gt(img_coords0, drop0, gt_idx0, sa_box0, img_shape0)
+        img_coords_pad1, valid1 = self._pad_with_fake_candidates_drop_gt(img_coords1, drop1, gt_idx1, sa_box1, img_shape1)
 
         scores_pad0 = self._add_fake_candidate_scores(scores0, valid0)
         scores_pad1 = self._add_fake_candidate_scores(scores1, valid1)
@@ -1194,9 +1285,6 @@ class TargetCandiateMatchingProcessing(BaseProcessing):
 
     def _previous_and_current_frame_detected_target_candidates_only(self, data: TensorDict):
         out = TensorDict()
-        imgs = data.pop('img')
-        img0 = imgs[0]
-        img1 = imgs[1]
         sa_box0 = data['search_area_box'][0]
         sa_box1 = data['search_area_box'][1]
         tsm_anno_coord0 = data['target_anno_coord'][0]
@@ -1206,17 +1294,10 @@ class TargetCandiateMatchingProcessing(BaseProcessing):
         scores0 = data['target_candidate_scores'][0]
         scores1 = data['target_candidate_scores'][1]
 
-        out['img_shape0'] = [torch.tensor(img0.shape[:2])]
-        out['img_shape1'] = [torch.tensor(img1.shape[:2])]
-
-        frame_crop0 = prutils.sample_target_from_crop_region(img0, sa_box0, self.output_sz)
-        frame_crop1 = prutils.sample_target_from_crop_region(img1, sa_box1, self.output_sz)
+        img_shape0, img_shape1 = self._add_search_areas(data, out)
 
-        frame_crop0 = self.transform['train'](image=frame_crop0)
-        frame_crop1 = self.transform['train'](image=frame_crop1)
-
-        out['img_cropped0'] = [frame_crop0]
-        out['img_cropped1'] = [frame_crop1]
+        out['img_shape0'] = [torch.tensor(img_shape0)]
+        out['img_shape1'] = [torch.tensor(img_shape1)]
 
         gt_idx0 = self._find_gt_candidate_index(tsm_coords0, tsm_anno_coord0)
         gt_idx1 = self._find_gt_candidate_index(tsm_coords1, tsm_anno_coord1)
@@ -1827,13 +1908,18 @@ class TaMOsProcessing(BaseProcessing):
 
         gauss_labels = torch.zeros((len(target_bboxes), self.max_num_objects, feature_sz[1], feature_sz[0]))
 
-        for i in range(len(target_bboxes)):
-            for tid, target_bb in target_bboxes[i].items():
-                if tid < self.max_num_objects:
-                    gauss_label = prutils.gaussian_label_function(target_bb.view(-1, 4), sigma_factor, kernel_sz,
-                                                                  feature_sz, output_sz,
-                                                                  end_pad_if_even=end_pad_if_even)
-                    gauss_labels[i, tid] = gauss_label[0]
+        # Generate the labels of all targets in all frames at once
+        label_ids = [(i, tid) for i in range(len(target_bboxes)) for tid in target_bboxes[i].keys()
+                     if tid < self.max_num_objects]
+        if len(label_ids) == 0:
+            return gauss_labels
+
+        target_bb = torch.stack([target_bboxes[i][tid].view(4) for i, tid in label_ids])
+        gauss_label = prutils.gaussian_label_function(target_bb, sigma_factor, kernel_sz, feature_sz, output_sz,
+                                                      end_pad_if_even=end_pad_if_even)
+
+        frame_ids, target_ids = zip(*label_ids)
+        gauss_labels[list(frame_ids), list(target_ids)] = gauss_label
 
         return gauss_labels
 
@@ -1,7 +1,6 @@
 import torch
 import math
 import cv2 as cv
-import random
 import torch.nn.functional as F
 from .bounding_box_utils import rect_to_rel, rel_to_rect
 from pytracking import TensorList
@@ -430,6 +429,29 @@ def iou(reference, proposals):
     return intersection / union
 
 
+def iou_gen(reference, proposals):
+    """Compute the IoU between boxes with arbitrary, broadcastable leading dimensions.
+
+    args:
+        reference - Tensor of shape (..., 4).
+        proposals - Tensor of shape (..., 4)
+
+    returns:
+        torch.Tensor - Tensor of the broadcasted leading shape, containing the IoU of each pair of boxes.
+    """
+
+    # Intersection box
+    tl = torch.max(reference[..., :2], proposals[..., :2])
+    br = torch.min(reference[..., :2] + reference[..., 2:], proposals[..., :2] + proposals[..., 2:])
+    sz = (br - tl).clamp(0)
+
+    # Area
+    intersection = sz.prod(dim=-1)
+    union = reference[..., 2:].prod(dim=-1) + proposals[..., 2:].prod(dim=-1) - intersection
+
+    return intersection / union
+
+
 def rand_uniform(a, b, shape=1):
     """ sample numbers uniformly between a and b.
     args:
@@ -444,7 +466,8 @@ def rand_uniform(a, b, shape=1):
 
 
 def perturb_box(box, min_iou=0.5, sigma_factor=0.1):
-    """ Perturb the input box by adding gaussian noise to the co-ordinates
+    """ Perturb the input box by adding gaussian noise to the co-ordinates. See perturb_boxes for generating many
+    perturbed boxes at once.
 
      args:
         box - input box
@@ -457,52 +480,83 @@ def perturb_box(box, min_iou=0.5, sigma_factor=0.1):
     returns:
         torch.Tensor - the perturbed box
     """
+    box_per, box_iou = perturb_boxes(box.view(1, 4), 1, min_iou=min_iou, sigma_factor=sigma_factor)
+    return box_per[0, 0], box_iou[0]
 
-    if isinstance(sigma_factor, list):
-        # If list, sample one sigma_factor as current sigma factor
-        c_sigma_factor = random.choice(sigma_factor)
-    else:
-        c_sigma_factor = sigma_factor
 
-    if not isinstance(c_sigma_factor, torch.Tensor):
-        c_sigma_factor = c_sigma_factor * torch.ones(4)
+def _sample_perturbed_boxes(box, perturb_factor):
+    """ Draws one perturbed box for each row of box (N, 4), with the per co-ordinate std perturb_factor (N, 4). """
+    num_boxes = box.shape[0]
 
-    perturb_factor = torch.sqrt(box[2] * box[3]) * c_sigma_factor
+    center = box[:, :2] + 0.5 * box[:, 2:]
+    center_per = center + perturb_factor[:, :2] * torch.randn(num_boxes, 2)
+    sz_per = box[:, 2:] + perturb_factor[:, 2:] * torch.randn(num_boxes, 2)
 
-    # multiple tries to ensure that the perturbed box has iou > min_iou with the input box
-    for i_ in range(100):
-        c_x = box[0] + 0.5 * box[2]
-        c_y = box[1] + 0.5 * box[3]
-        c_x_per = random.gauss(c_x, perturb_factor[0])
-        c_y_per = random.gauss(c_y, perturb_factor[1])
+    sz_per = torch.where(sz_per <= 1, box[:, 2:] * rand_uniform(0.15, 0.5, (num_boxes, 2)), sz_per)
 
-        w_per = random.gauss(box[2], perturb_factor[2])
-        h_per = random.gauss(box[3], perturb_factor[3])
+    box_per = torch.cat((center_per - 0.5 * sz_per, sz_per), dim=1).round()
 
-        if w_per <= 1:
-            w_per = box[2] * rand_uniform(0.15, 0.5)
+    box_per[:, 2:] = torch.where(box_per[:, 2:] <= 1, box[:, 2:] * rand_uniform(0.15, 0.5, (num_boxes, 2)),
+                                 box_per[:, 2:])
+    return box_per
 
-        if h_per <= 1:
-            h_per = box[3] * rand_uniform(0.15, 0.5)
 
-        box_per = torch.Tensor([c_x_per - 0.5 * w_per, c_y_per - 0.5 * h_per, w_per, h_per]).round()
+def perturb_boxes(boxes, num_proposals, min_iou=0.5, sigma_factor=0.1, max_tries=100):
+    """ Generates num_proposals perturbed boxes for each of the input boxes, by adding gaussian noise to the
+    co-ordinates. Follows the same distribution as perturb_box, but all proposals are drawn at once. Proposals which do
+    not have sufficient overlap with their input box are re-drawn with a reduced perturbation, up to max_tries times.
 
-        if box_per[2] <= 1:
-            box_per[2] = box[2] * rand_uniform(0.15, 0.5)
+     args:
+        boxes - input boxes, tensor of shape (num_boxes, 4)
+        num_proposals - number of perturbed boxes per input box
+        min_iou - minimum IoU overlap between input box and the perturbed box
+        sigma_factor - amount of perturbation, relative to the box size. See perturb_box. If a list, one sigma_factor
+                        is sampled for each proposal.
+        max_tries - maximum number of draws per proposal
 
-        if box_per[3] <= 1:
-            box_per[3] = box[3] * rand_uniform(0.15, 0.5)
+    returns:
+        torch.Tensor - the perturbed boxes, shape (num_boxes, num_proposals, 4)
+        torch.Tensor - IoU of the perturbed boxes with their input box, shape (num_boxes, num_proposals)
+    """
+    boxes = boxes.view(-1, 4).float()
+    num_boxes = boxes.shape[0]
+
+    ref = boxes.repeat_interleave(num_proposals, dim=0)
+    num_total = ref.shape[0]
+
+    if isinstance(sigma_factor, list):
+        # If list, sample one sigma_factor per proposal
+        sigma_factors = torch.stack([s.float().view(4) if isinstance(s, torch.Tensor) else s * torch.ones(4)
+                                     for s in sigma_factor])
+        c_sigma_factor = sigma_factors[torch.randint(len(sigma_factor), (num_total,))]
+    elif isinstance(sigma_factor, torch.Tensor):
+        c_sigma_factor = sigma_factor.float().view(1, 4)
+    else:
+        c_sigma_factor = sigma_factor * torch.ones(1, 4)
+
+    perturb_factor = torch.sqrt(ref[:, 2] * ref[:, 3]).view(-1, 1) * c_sigma_factor
+
+    proposals = torch.zeros(num_total, 4)
+    proposal_iou = torch.zeros(num_total)
+
+    # Rows which do not yet have sufficient overlap with their input box
+    pending = torch.arange(num_total)
+
+    for i_ in range(max_tries):
+        box_per = _sample_perturbed_boxes(ref[pending], perturb_factor[pending])
+        box_iou = iou_gen(ref[pending], box_per)
 
-        box_iou = iou(box.view(1, 4), box_per.view(1, 4))
+        proposals[pending] = box_per
+        proposal_iou[pending] = box_iou
 
-        # if there is sufficient overlap, return
-        if box_iou > min_iou:
-            return box_per, box_iou
+        pending = pending[box_iou <= min_iou]
+        if pending.numel() == 0:
+            break
 
-        # else reduce the perturb factor
-        perturb_factor *= 0.9
+        # Reduce the perturb factor of the rejected rows
+        perturb_factor[pending] *= 0.9
 
-    return box_per, box_iou
+    return proposals.view(num_boxes, num_proposals, 4), proposal_iou.view(num_boxes, num_proposals)
 
 
 def gauss_1d(sz, sigma, center, end_pad=0, density=False):
@@ -637,31 +691,52 @@ def sample_box_gmm(mean_box, proposal_sigma, gt_sigma=None, num_samples=1, add_m
     returns:
         proposals, proposal density and ground truth density for all samples
     """
+    proposals, proposal_density, gt_density = sample_boxes_gmm(mean_box.view(1, 4), proposal_sigma, gt_sigma,
+                                                               num_samples, add_mean_box)
+    return proposals[0], proposal_density[0], gt_density[0]
+
+
+def sample_boxes_gmm(mean_boxes, proposal_sigma, gt_sigma=None, num_samples=1, add_mean_box=False):
+    """Sample boxes from a Gaussian mixture model, centered at each of the mean boxes. Batched version of
+    sample_box_gmm.
+    args:
+        mean_boxes - Center (or mean) bounding boxes, shape (num_boxes, 4)
+        proposal_sigma - List of standard deviations for each Gaussian
+        gt_sigma - Standard deviation of the ground truth distribution
+        num_samples - Number of sampled boxes per mean box
+        add_mean_box - Also add mean box as first element
+
+    returns:
+        proposals (num_boxes, num_samples, 4), proposal density and ground truth density (num_boxes, num_samples)
+    """
     center_std = torch.Tensor([s[0] for s in proposal_sigma])
     sz_std = torch.Tensor([s[1] for s in proposal_sigma])
     std = torch.stack([center_std, center_std, sz_std, sz_std])
 
-    mean_box = mean_box.view(1, 4)
-    sz_norm = mean_box[:, 2:].clone()
+    mean_boxes = mean_boxes.view(-1, 1, 4)
+    num_boxes = mean_boxes.shape[0]
+    sz_norm = mean_boxes[..., 2:].clone()
 
     # Sample boxes
-    proposals_rel_centered, proposal_density = sample_gmm_centered(std, num_samples)
+    proposals_rel_centered, proposal_density = sample_gmm_centered(std, num_boxes * num_samples)
+    proposals_rel_centered = proposals_rel_centered.view(num_boxes, num_samples, 4)
+    proposal_density = proposal_density.view(num_boxes, num_samples)
 
     # Add mean and map back
-    mean_box_rel = rect_to_rel(mean_box, sz_norm)
+    mean_box_rel = rect_to_rel(mean_boxes, sz_norm)
     proposals_rel = proposals_rel_centered + mean_box_rel
     proposals = rel_to_rect(proposals_rel, sz_norm)
 
     if gt_sigma is None or gt_sigma[0] == 0 and gt_sigma[1] == 0:
         gt_density = torch.zeros_like(proposal_density)
     else:
-        std_gt = torch.Tensor([gt_sigma[0], gt_sigma[0], gt_sigma[1], gt_sigma[1]]).view(1, 4)
+        std_gt = torch.Tensor([gt_sigma[0], gt_sigma[0], gt_sigma[1], gt_sigma[1]]).view(1, 1, 4)
         gt_density = gauss_density_centered(proposals_rel_centered, std_gt).prod(-1)
 
     if add_mean_box:
-        proposals = torch.cat((mean_box, proposals))
-        proposal_density = torch.cat((torch.Tensor([-1]), proposal_density))
-        gt_density = torch.cat((torch.Tensor([1]), gt_density))
+        proposals = torch.cat((mean_boxes, proposals), dim=1)
+        proposal_density = torch.cat((-torch.ones(num_boxes, 1), proposal_density), dim=1)
+        gt_density = torch.cat((torch.ones(num_boxes, 1), gt_density), dim=1)
 
     return proposals, proposal_density, gt_density
 
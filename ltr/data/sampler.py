@@ -1,13 +1,226 @@
+import os
+import json
 import random
+import bisect
+import hashlib
+import functools
+import numpy as np
 import torch.utils.data
+from contextlib import contextmanager
 from pytracking import TensorDict
+from ltr.data.image_loader import ScaledImageLoader
 
 
 def no_processing(data):
     return data
 
 
-class TrackingSampler(torch.utils.data.Dataset):
+class VisibleFrames:
+    """ Sorted frame numbers in which the target is visible. Allows sampling visible frames within an interval using
+    binary search, instead of scanning the visibility vector for every draw. len() returns the sequence length, such
+    that it can be used in place of the visibility vector in the samplers."""
+
+    def __init__(self, visible):
+        self.num_frames = len(visible)
+        self.ids = torch.nonzero(visible).view(-1).tolist()
+
+    def __len__(self):
+        return self.num_frames
+
+    def sample(self, num_ids, min_id, max_id):
+        """ Samples num_ids visible frames in [min_id, max_id), with replacement. None if there are none. """
+        start = bisect.bisect_left(self.ids, int(min_id))
+        end = bisect.bisect_left(self.ids, int(max_id))
+
+        if end <= start:
+            return None
+        return random.choices(self.ids[start:end], k=num_ids)
+
+
+class EligibleSequenceSampler:
+    """ Samples sequences uniformly among the ones fulfilling the requirements of a sampler, e.g. having enough visible
+    frames. The eligible sequences of a dataset can be determined beforehand, such that a draw never needs to be
+    rejected. This gives the same distribution as drawing sequences uniformly until an eligible one is found, which is
+    done otherwise. The number of wasted draws is recorded in both cases, see get_stats().
+
+    For datasets with an annotation index (see ltr.dataset.annotation_index), the eligible sequences are stored next to
+    the index, keyed by the index, the sequence list of the dataset and the eligibility_key of the sampler. They are
+    thus determined once per dataset and sampler configuration, and then loaded by all samplers and processes."""
+
+    def __init__(self, datasets, is_eligible, precompute=None, eligibility_key=None):
+        """
+        args:
+            datasets - List of datasets
+            is_eligible - Function taking the seq_info_dict of a sequence and returning whether it can be sampled.
+                          Sequences of image datasets are always eligible.
+            precompute - Whether to determine the eligible sequences of all datasets beforehand, which requires loading
+                         the annotations of every sequence once. If None, this is only done for the datasets for which
+                         the result can be stored, i.e. which have an annotation index.
+            eligibility_key - String identifying the requirements checked by is_eligible, e.g. the minimum number of
+                              visible frames. The eligible sequences are only stored if it is given.
+        """
+        self.datasets = datasets
+        self.is_eligible = is_eligible
+        self.eligibility_key = eligibility_key
+
+        self.eligible_seq_ids = None
+        if precompute is None or precompute:
+            self.eligible_seq_ids = [self._load_eligible_sequences(d, precompute) if d.is_video_sequence() else None
+                                     for d in datasets]
+
+        self.num_samples = 0
+        self.num_rejected_sequences = 0
+        self.num_frame_retries = 0
+
+    def _cache_path(self, dataset):
+        """ Path of the stored eligible sequences of a dataset, or None if they can not be stored. """
+        anno_index = getattr(dataset, 'anno_index', None)
+        sequence_list = getattr(dataset, 'sequence_list', None)
+        if self.eligibility_key is None or anno_index is None or sequence_list is None:
+            return None
+
+        key = '{}\n{}'.format(self.eligibility_key, '\n'.join(str(s) for s in sequence_list))
+        return '{}_eligible_{}.json'.format(anno_index.path.rstrip(os.sep),
+                                            hashlib.md5(key.encode('utf-8')).hexdigest()[:12])
+
+    def _load_eligible_sequences(self, dataset, precompute):
+        """ Loads the stored eligible sequences of a dataset, or determines and stores them. Returns None if precompute
+        is None and they can not be stored. """
+        cache_path = self._cache_path(dataset)
+        if cache_path is None:
+            return self._find_eligible_sequences(dataset) if precompute else None
+
+        try:
+            with open(cache_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+
+        seq_ids = self._find_eligible_sequences(dataset)
+
+        # Written to a temporary file first, since several processes may determine the sequences at the same time
+        tmp_path = '{}.{}.tmp'.format(cache_path, os.getpid())
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(seq_ids, f)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            pass
+        return seq_ids
+
+    def _find_eligible_sequences(self, dataset):
+        seq_ids = [seq_id for seq_id in range(dataset.get_num_sequences())
+                   if self.is_eligible(dataset.get_sequence_info(seq_id))]
+
+        if len(seq_ids) == 0:
+            raise ValueError('No sequence of dataset {} can be sampled.'.format(dataset.get_name()))
+        return seq_ids
+
+    def sample(self, dataset_id):
+        """ Returns the id and the seq_info_dict of a randomly sampled eligible sequence. """
+        dataset = self.datasets[dataset_id]
+        self.num_samples += 1
+
+        if self.eligible_seq_ids is not None and self.eligible_seq_ids[dataset_id] is not None:
+            seq_id = random.choice(self.eligible_seq_ids[dataset_id])
+            return seq_id, dataset.get_sequence_info(seq_id)
+
+        is_video_dataset = dataset.is_video_sequence()
+        while True:
+            seq_id = random.randint(0, dataset.get_num_sequences() - 1)
+            seq_info_dict = dataset.get_sequence_info(seq_id)
+
+            if not is_video_dataset or self.is_eligible(seq_info_dict):
+                return seq_id, seq_info_dict
+            self.num_rejected_sequences += 1
+
+    def record_frame_retry(self):
+        """ Shall be called by the sampler every time the frame sampling is retried with an increased gap. """
+        self.num_frame_retries += 1
+
+    def num_wasted_draws(self):
+        return self.num_rejected_sequences + self.num_frame_retries
+
+    def get_stats(self):
+        """ Returns the number of samples, the number of rejected sequence draws and the number of frame sampling
+        retries, counted in the current process. """
+        return {'samples': self.num_samples,
+                'rejected_sequence_draws': self.num_rejected_sequences,
+                'frame_retries': self.num_frame_retries,
+                'wasted_draws_per_sample': (self.num_rejected_sequences + self.num_frame_retries) / max(self.num_samples, 1)}
+
+
+def seed_sample_rngs(seed, epoch, index, stream=''):
+    """ Seeds the random number generators of random, numpy and torch from the seed, the name of the sample stream,
+    the epoch and the sample index. The stream separates the samplers using the same seed, e.g. the training and
+    validation samplers. """
+    key = '{}_{}_{}_{}'.format(seed, stream, epoch, index).encode('utf-8')
+    sample_seed = int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'little')
+
+    random.seed(sample_seed)
+    np.random.seed(sample_seed % 2**32)
+    torch.manual_seed(sample_seed)
+
+
+def seeded_sample(getitem):
+    """ Decorator of the __getitem__ method of a SeedableSampler, which draws the sample with the random number
+    generators seeded from the index. """
+    @functools.wraps(getitem)
+    def seeded_getitem(self, index):
+        with self._seeded_rngs(index):
+            return getitem(self, index)
+    return seeded_getitem
+
+
+class SeedableSampler(torch.utils.data.Dataset):
+    """ Base class for the samplers which draw a new random sample for every index. If a seed is set, the random
+    number generators are seeded from the seed, the epoch and the index before drawing each sample, including the
+    processing. Every sample then only depends on its index, such that the data of an epoch does not depend on the
+    number of workers, and a partially finished epoch can be resumed at any iteration, see LTRLoader.set_epoch.
+
+    The seed_stream is set by the LTRLoader to its name, such that e.g. the training and validation samplers draw
+    different samples from the same seed. When the samples are loaded in the main process, i.e. with num_workers=0,
+    the state of the global random number generators is restored after each sample."""
+    seed = None
+    seed_stream = ''
+    epoch = 0
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def set_seed_stream(self, stream):
+        self.seed_stream = stream
+
+    @contextmanager
+    def _seeded_rngs(self, index):
+        """ Context in which a sample is drawn, see seeded_sample. """
+        if self.seed is None:
+            yield
+            return
+
+        # The worker processes own their random number generators, the main process does not
+        restore_state = torch.utils.data.get_worker_info() is None
+        if restore_state:
+            state = random.getstate(), np.random.get_state(), torch.get_rng_state()
+
+        seed_sample_rngs(self.seed, self.epoch, index, self.seed_stream)
+        try:
+            yield
+        finally:
+            if restore_state:
+                random.setstate(state[0])
+                np.random.set_state(state[1])
+                torch.set_rng_state(state[2])
+
+    def _add_sample_retries(self, data, wasted_draws_before):
+        """ Adds the number of wasted draws for the sample, see EligibleSequenceSampler, as data['sample_retries'].
+        The trainer reports the average per dataset, since the counters of the worker processes are not accessible."""
+        if isinstance(data, dict):
+            data['sample_retries'] = self.sequence_sampler.num_wasted_draws() - wasted_draws_before
+        return data
+
+
+class TrackingSampler(SeedableSampler):
     """ Class responsible for sampling frames from training sequences to form batches. Each training sample is a
     tuple consisting of i) a set of train frames, used to learn the DiMP classification model and obtain the
     modulation vector for IoU-Net, and ii) a set of test frames on which target classification loss for the predicted
@@ -23,7 +236,8 @@ class TrackingSampler(torch.utils.data.Dataset):
     """
 
     def __init__(self, datasets, p_datasets, samples_per_epoch, max_gap,
-                 num_test_frames, num_train_frames=1, processing=no_processing, frame_sample_mode='causal'):
+                 num_test_frames, num_train_frames=1, processing=no_processing, frame_sample_mode='causal',
+                 precompute_eligible=None, seed=None):
         """
         args:
             datasets - List of datasets to be used for training
@@ -35,8 +249,13 @@ class TrackingSampler(torch.utils.data.Dataset):
             processing - An instance of Processing class which performs the necessary processing of the data.
             frame_sample_mode - Either 'causal' or 'interval'. If 'causal', then the test frames are sampled in a causally,
                                 otherwise randomly within the interval.
+            precompute_eligible - Determine the sequences with enough visible frames beforehand, instead of drawing
+                                  sequences until one is found. By default, this is done for the datasets with an
+                                  annotation index, where the result is stored. See EligibleSequenceSampler.
+            seed - If set, each sample is drawn deterministically from the seed, epoch and index. See SeedableSampler.
         """
         self.datasets = datasets
+        self.seed = seed
 
         # If p not provided, sample uniformly from all videos
         if p_datasets is None:
@@ -53,14 +272,29 @@ class TrackingSampler(torch.utils.data.Dataset):
         self.processing = processing
         self.frame_sample_mode = frame_sample_mode
 
+        self.sequence_sampler = EligibleSequenceSampler(self.datasets, self._is_eligible_sequence, precompute_eligible,
+                                                        self._eligibility_key())
+
     def __len__(self):
         return self.samples_per_epoch
 
+    def _is_eligible_sequence(self, seq_info_dict):
+        visible = seq_info_dict['visible']
+        return visible.type(torch.int64).sum().item() > 2 * (self.num_test_frames + self.num_train_frames) and \
+            len(visible) >= 20
+
+    def _eligibility_key(self):
+        return 'visible>{}_length>=20'.format(2 * (self.num_test_frames + self.num_train_frames))
+
+    def get_sampling_stats(self):
+        """ Statistics on the wasted draws, see EligibleSequenceSampler.get_stats. """
+        return self.sequence_sampler.get_stats()
+
     def _sample_visible_ids(self, visible, num_ids=1, min_id=None, max_id=None):
         """ Samples num_ids frames between min_id and max_id for which target is visible
 
         args:
-            visible - 1d Tensor indicating whether target is visible for each frame
+            visible - 1d Tensor indicating whether target is visible for each frame, or VisibleFrames
             num_ids - number of frames to be samples
             min_id - Minimum allowed frame number
             max_id - Maximum allowed frame number
@@ -75,6 +309,9 @@ class TrackingSampler(torch.utils.data.Dataset):
         if max_id is None or max_id > len(visible):
             max_id = len(visible)
 
+        if isinstance(visible, VisibleFrames):
+            return visible.sample(num_ids, min_id, max_id)
+
         valid_ids = [i for i in range(min_id, max_id) if visible[i]]
 
         # No visible ids
@@ -83,6 +320,7 @@ class TrackingSampler(torch.utils.data.Dataset):
 
         return random.choices(valid_ids, k=num_ids)
 
+    @seeded_sample
     def __getitem__(self, index):
         """
         args:
@@ -91,27 +329,18 @@ class TrackingSampler(torch.utils.data.Dataset):
         returns:
             TensorDict - dict containing all the data blocks
         """
+        wasted_draws = self.sequence_sampler.num_wasted_draws()
 
         # Select a dataset
-        dataset = random.choices(self.datasets, self.p_datasets)[0]
+        dataset_id = random.choices(range(len(self.datasets)), self.p_datasets)[0]
+        dataset = self.datasets[dataset_id]
         is_video_dataset = dataset.is_video_sequence()
 
         # Sample a sequence with enough visible frames
-        enough_visible_frames = False
-        while not enough_visible_frames:
-            # Sample a sequence
-            seq_id = random.randint(0, dataset.get_num_sequences() - 1)
-
-            # Sample frames
-            seq_info_dict = dataset.get_sequence_info(seq_id)
-            visible = seq_info_dict['visible']
-
-            enough_visible_frames = visible.type(torch.int64).sum().item() > 2 * (
-                    self.num_test_frames + self.num_train_frames) and len(visible) >= 20
-
-            enough_visible_frames = enough_visible_frames or not is_video_dataset
+        seq_id, seq_info_dict = self.sequence_sampler.sample(dataset_id)
 
         if is_video_dataset:
+            visible = VisibleFrames(seq_info_dict['visible'])
             train_frame_ids = None
             test_frame_ids = None
             gap_increase = 0
@@ -127,12 +356,15 @@ class TrackingSampler(torch.utils.data.Dataset):
                                                                                 0] + self.max_gap + gap_increase)
                     if extra_train_frame_ids is None:
                         gap_increase += 5
+                        self.sequence_sampler.record_frame_retry()
                         continue
                     train_frame_ids = base_frame_id + extra_train_frame_ids
                     test_frame_ids = self._sample_visible_ids(visible, num_ids=self.num_test_frames,
                                                               min_id=train_frame_ids[0] - self.max_gap - gap_increase,
                                                               max_id=train_frame_ids[0] + self.max_gap + gap_increase)
                     gap_increase += 5  # Increase gap until a frame is found
+                    if test_frame_ids is None:
+                        self.sequence_sampler.record_frame_retry()
 
             elif self.frame_sample_mode == 'causal':
                 # Sample test and train frames in a causal manner, i.e. test_frame_ids > train_frame_ids
@@ -144,6 +376,7 @@ class TrackingSampler(torch.utils.data.Dataset):
                                                               max_id=base_frame_id[0])
                     if prev_frame_ids is None:
                         gap_increase += 5
+                        self.sequence_sampler.record_frame_retry()
                         continue
                     train_frame_ids = base_frame_id + prev_frame_ids
                     test_frame_ids = self._sample_visible_ids(visible, min_id=train_frame_ids[0] + 1,
@@ -151,13 +384,27 @@ class TrackingSampler(torch.utils.data.Dataset):
                                                               num_ids=self.num_test_frames)
                     # Increase gap until a frame is found
                     gap_increase += 5
+                    if test_frame_ids is None:
+                        self.sequence_sampler.record_frame_retry()
         else:
             # In case of image dataset, just repeat the image to generate synthetic video
             train_frame_ids = [1] * self.num_train_frames
             test_frame_ids = [1] * self.num_test_frames
 
-        train_frames, train_anno, meta_obj_train = dataset.get_frames(seq_id, train_frame_ids, seq_info_dict)
-        test_frames, test_anno, meta_obj_test = dataset.get_frames(seq_id, test_frame_ids, seq_info_dict)
+        image_loader = getattr(dataset, 'image_loader', None)
+        if isinstance(image_loader, ScaledImageLoader):
+            # Decode the frames at reduced resolution if the search regions are downsampled anyway
+            downscale = self._get_input_downscale(dataset, seq_info_dict, train_frame_ids, test_frame_ids)
+            with image_loader.downscaled(downscale):
+                train_frames, train_anno, meta_obj_train = dataset.get_frames(seq_id, train_frame_ids, seq_info_dict)
+                test_frames, test_anno, meta_obj_test = dataset.get_frames(seq_id, test_frame_ids, seq_info_dict)
+
+            if downscale > 1:
+                self._downscale_anno(train_anno, downscale)
+                self._downscale_anno(test_anno, downscale)
+        else:
+            train_frames, train_anno, meta_obj_train = dataset.get_frames(seq_id, train_frame_ids, seq_info_dict)
+            test_frames, test_anno, meta_obj_test = dataset.get_frames(seq_id, test_frame_ids, seq_info_dict)
 
         data = TensorDict({'train_images': train_frames,
                            'train_anno': train_anno['bbox'],
@@ -166,30 +413,55 @@ class TrackingSampler(torch.utils.data.Dataset):
                            'dataset': dataset.get_name(),
                            'test_class': meta_obj_test.get('object_class_name')})
 
-        return self.processing(data)
+        return self._add_sample_retries(self.processing(data), wasted_draws)
+
+    def _get_input_downscale(self, dataset, seq_info_dict, train_frame_ids, test_frame_ids):
+        """ Factor by which the frames can be decoded downscaled, see BaseProcessing.max_input_downscale. """
+        if not hasattr(self.processing, 'max_input_downscale'):
+            return 1
+
+        bbox = seq_info_dict['bbox']
+        if not dataset.is_video_sequence():
+            # The annotation of an image dataset only contains the box of the image, which is repeated for all frames
+            train_frame_ids = [0] * len(train_frame_ids)
+            test_frame_ids = [0] * len(test_frame_ids)
+        return self.processing.max_input_downscale({'train_anno': [bbox[f_id, :] for f_id in train_frame_ids],
+                                                    'test_anno': [bbox[f_id, :] for f_id in test_frame_ids]})
+
+    @staticmethod
+    def _downscale_anno(anno, downscale):
+        """ Rescales the boxes and masks of frames which were decoded downscaled by the factor downscale. The masks are
+        subsampled, which gives the size of the reduced resolution decoding, see ltr.data.image_loader.resize_reduced."""
+        anno['bbox'] = [bb / downscale for bb in anno['bbox']]
+        if 'mask' in anno:
+            anno['mask'] = [m[..., ::downscale, ::downscale] for m in anno['mask']]
 
 
 class DiMPSampler(TrackingSampler):
     """ See TrackingSampler."""
 
     def __init__(self, datasets, p_datasets, samples_per_epoch, max_gap,
-                 num_test_frames, num_train_frames=1, processing=no_processing, frame_sample_mode='causal'):
+                 num_test_frames, num_train_frames=1, processing=no_processing, frame_sample_mode='causal',
+                 precompute_eligible=None, seed=None):
         super().__init__(datasets=datasets, p_datasets=p_datasets, samples_per_epoch=samples_per_epoch, max_gap=max_gap,
                          num_test_frames=num_test_frames, num_train_frames=num_train_frames, processing=processing,
-                         frame_sample_mode=frame_sample_mode)
+                         frame_sample_mode=frame_sample_mode, precompute_eligible=precompute_eligible,
+                         seed=seed)
 
 
 class ATOMSampler(TrackingSampler):
     """ See TrackingSampler."""
 
     def __init__(self, datasets, p_datasets, samples_per_epoch, max_gap,
-                 num_test_frames=1, num_train_frames=1, processing=no_processing, frame_sample_mode='interval'):
+                 num_test_frames=1, num_train_frames=1, processing=no_processing, frame_sample_mode='interval',
+                 precompute_eligible=None, seed=None):
         super().__init__(datasets=datasets, p_datasets=p_datasets, samples_per_epoch=samples_per_epoch, max_gap=max_gap,
                          num_test_frames=num_test_frames, num_train_frames=num_train_frames, processing=processing,
-                         frame_sample_mode=frame_sample_mode)
+                         frame_sample_mode=frame_sample_mode, precompute_eligible=precompute_eligible,
+                         seed=seed)
 
 
-class LWLSampler(torch.utils.data.Dataset):
+class LWLSampler(SeedableSampler):
     """ Class responsible for sampling frames from training sequences to form batches. Each training sample is a
     tuple consisting of i) a set of train frames and ii) a set of test frames. The train frames, along with the
     ground-truth masks, are passed to the few-shot learner to obtain the target model parameters \tau. The test frames
@@ -207,7 +479,8 @@ class LWLSampler(torch.utils.data.Dataset):
     """
 
     def __init__(self, datasets, p_datasets, samples_per_epoch, max_gap,
-                 num_test_frames, num_train_frames=1, processing=no_processing, p_reverse=None):
+                 num_test_frames, num_train_frames=1, processing=no_processing, p_reverse=None,
+                 precompute_eligible=None, seed=None):
         """
         args:
             datasets - List of datasets to be used for training
@@ -218,8 +491,13 @@ class LWLSampler(torch.utils.data.Dataset):
             num_train_frames - Number of train frames to sample.
             processing - An instance of Processing class which performs the necessary processing of the data.
             p_reverse - Probability that a sequence is temporally reversed
+            precompute_eligible - Determine the sequences with enough visible frames beforehand, instead of drawing
+                                  sequences until one is found. By default, this is done for the datasets with an
+                                  annotation index, where the result is stored. See EligibleSequenceSampler.
+            seed - If set, each sample is drawn deterministically from the seed, epoch and index. See SeedableSampler.
         """
         self.datasets = datasets
+        self.seed = seed
 
         # If p not provided, sample uniformly from all videos
         if p_datasets is None:
@@ -237,14 +515,27 @@ class LWLSampler(torch.utils.data.Dataset):
 
         self.p_reverse = p_reverse
 
+        self.sequence_sampler = EligibleSequenceSampler(self.datasets, self._is_eligible_sequence, precompute_eligible,
+                                                        self._eligibility_key())
+
     def __len__(self):
         return self.samples_per_epoch
 
+    def _is_eligible_sequence(self, seq_info_dict):
+        return seq_info_dict['visible'].type(torch.int64).sum().item() > 2 * (self.num_test_frames + self.num_train_frames)
+
+    def _eligibility_key(self):
+        return 'visible>{}'.format(2 * (self.num_test_frames + self.num_train_frames))
+
+    def get_sampling_stats(self):
+        """ Statistics on the wasted draws, see EligibleSequenceSampler.get_stats. """
+        return self.sequence_sampler.get_stats()
+
     def _sample_visible_ids(self, visible, num_ids=1, min_id=None, max_id=None):
         """ Samples num_ids frames between min_id and max_id for which target is visible
 
         args:
-            visible - 1d Tensor indicating whether target is visible for each frame
+            visible - 1d Tensor indicating whether target is visible for each frame, or VisibleFrames
             num_ids - number of frames to be samples
             min_id - Minimum allowed frame number
             max_id - Maximum allowed frame number
@@ -257,6 +548,9 @@ class LWLSampler(torch.utils.data.Dataset):
         if max_id is None or max_id > len(visible):
             max_id = len(visible)
 
+        if isinstance(visible, VisibleFrames):
+            return visible.sample(num_ids, min_id, max_id)
+
         valid_ids = [i for i in range(min_id, max_id) if visible[i]]
 
         # No visible ids
@@ -265,6 +559,7 @@ class LWLSampler(torch.utils.data.Dataset):
 
         return random.choices(valid_ids, k=num_ids)
 
+    @seeded_sample
     def __getitem__(self, index):
         """
         args:
@@ -273,9 +568,11 @@ class LWLSampler(torch.utils.data.Dataset):
         returns:
             TensorDict - dict containing all the data blocks
         """
+        wasted_draws = self.sequence_sampler.num_wasted_draws()
 
         # Select a dataset
-        dataset = random.choices(self.datasets, self.p_datasets)[0]
+        dataset_id = random.choices(range(len(self.datasets)), self.p_datasets)[0]
+        dataset = self.datasets[dataset_id]
 
         is_video_dataset = dataset.is_video_sequence()
 
@@ -284,20 +581,10 @@ class LWLSampler(torch.utils.data.Dataset):
             reverse_sequence = random.random() < self.p_reverse
 
         # Sample a sequence with enough visible frames
-        enough_visible_frames = False
-        while not enough_visible_frames:
-            # Sample a sequence
-            seq_id = random.randint(0, dataset.get_num_sequences() - 1)
-
-            # Sample frames
-            seq_info_dict = dataset.get_sequence_info(seq_id)
-            visible = seq_info_dict['visible']
-
-            enough_visible_frames = visible.type(torch.int64).sum().item() > 2 * (self.num_test_frames + self.num_train_frames)
-
-            enough_visible_frames = enough_visible_frames or not is_video_dataset
+        seq_id, seq_info_dict = self.sequence_sampler.sample(dataset_id)
 
         if is_video_dataset:
+            visible = VisibleFrames(seq_info_dict['visible'])
             train_frame_ids = None
             test_frame_ids = None
             gap_increase = 0
@@ -315,6 +602,7 @@ class LWLSampler(torch.utils.data.Dataset):
                                                               max_id=base_frame_id[0])
                     if prev_frame_ids is None:
                         gap_increase += 5
+                        self.sequence_sampler.record_frame_retry()
                         continue
                     train_frame_ids = base_frame_id + prev_frame_ids
                     test_frame_ids = self._sample_visible_ids(visible, min_id=train_frame_ids[0]+1,
@@ -323,6 +611,8 @@ class LWLSampler(torch.utils.data.Dataset):
 
                     # Increase gap until a frame is found
                     gap_increase += 5
+                    if test_frame_ids is None:
+                        self.sequence_sampler.record_frame_retry()
                 else:
                     # Sample in reverse order, i.e. train frames come after the test frames
                     base_frame_id = self._sample_visible_ids(visible, num_ids=1, min_id=self.num_test_frames + 1,
@@ -332,6 +622,7 @@ class LWLSampler(torch.utils.data.Dataset):
                                                               max_id=base_frame_id[0] + self.max_gap + gap_increase)
                     if prev_frame_ids is None:
                         gap_increase += 5
+                        self.sequence_sampler.record_frame_retry()
                         continue
                     train_frame_ids = base_frame_id + prev_frame_ids
                     test_frame_ids = self._sample_visible_ids(visible, min_id=0,
@@ -340,6 +631,8 @@ class LWLSampler(torch.utils.data.Dataset):
 
                     # Increase gap until a frame is found
                     gap_increase += 5
+                    if test_frame_ids is None:
+                        self.sequence_sampler.record_frame_retry()
         else:
             # In case of image dataset, just repeat the image to generate synthetic video
             train_frame_ids = [1]*self.num_train_frames
@@ -374,12 +667,12 @@ class LWLSampler(torch.utils.data.Dataset):
                            'test_anno': test_anno['bbox'],
                            'dataset': dataset.get_name()})
 
-        return self.processing(data)
+        return self._add_sample_retries(self.processing(data), wasted_draws)
 
 
-class KYSSampler(torch.utils.data.Dataset):
+class KYSSampler(SeedableSampler):
     def __init__(self, datasets, p_datasets, samples_per_epoch, sequence_sample_info, processing=no_processing,
-                 sample_occluded_sequences=False):
+                 sample_occluded_sequences=False, precompute_eligible=None, seed=None):
         """
         args:
             datasets - List of datasets to be used for training
@@ -389,9 +682,14 @@ class KYSSampler(torch.utils.data.Dataset):
                                     max gap between frames, etc.
             processing - An instance of Processing class which performs the necessary processing of the data.
             sample_occluded_sequences - If true, sub-sequence containing occlusion is sampled whenever possible
+            precompute_eligible - Determine the sequences with enough visible frames beforehand, instead of drawing
+                                  sequences until one is found. By default, this is done for the datasets with an
+                                  annotation index, where the result is stored. See EligibleSequenceSampler.
+            seed - If set, each sample is drawn deterministically from the seed, epoch and index. See SeedableSampler.
         """
 
         self.datasets = datasets
+        self.seed = seed
 
         # If p not provided, sample uniformly from all videos
         if p_datasets is None:
@@ -407,9 +705,24 @@ class KYSSampler(torch.utils.data.Dataset):
 
         self.sample_occluded_sequences = sample_occluded_sequences
 
+        self.sequence_sampler = EligibleSequenceSampler(self.datasets, self._is_eligible_sequence, precompute_eligible,
+                                                        self._eligibility_key())
+
     def __len__(self):
         return self.samples_per_epoch
 
+    def _is_eligible_sequence(self, seq_info_dict):
+        # Only allow_missing_target is supported, for which at least one visible frame is needed
+        visible = seq_info_dict['visible']
+        return visible.type(torch.int64).sum().item() > 0 and len(visible) >= 20
+
+    def _eligibility_key(self):
+        return 'visible>0_length>=20'
+
+    def get_sampling_stats(self):
+        """ Statistics on the wasted draws, see EligibleSequenceSampler.get_stats. """
+        return self.sequence_sampler.get_stats()
+
     def _sample_ids(self, valid, num_ids=1, min_id=None, max_id=None):
         """ Samples num_ids frames between min_id and max_id for which target is visible
 
@@ -427,6 +740,9 @@ class KYSSampler(torch.utils.data.Dataset):
         if max_id is None or max_id > len(valid):
             max_id = len(valid)
 
+        if isinstance(valid, VisibleFrames):
+            return valid.sample(num_ids, min_id, max_id)
+
         valid_ids = [i for i in range(min_id, max_id) if valid[i]]
 
         # No visible ids
@@ -442,6 +758,7 @@ class KYSSampler(torch.utils.data.Dataset):
 
         return len(target_not_fully_visible)
 
+    @seeded_sample
     def __getitem__(self, index):
         """
         args:
@@ -450,11 +767,13 @@ class KYSSampler(torch.utils.data.Dataset):
         returns:
             TensorDict - dict containing all the data blocks
         """
+        wasted_draws = self.sequence_sampler.num_wasted_draws()
 
         # Select a dataset
         p_datasets = self.p_datasets
 
-        dataset = random.choices(self.datasets, p_datasets)[0]
+        dataset_id = random.choices(range(len(self.datasets)), p_datasets)[0]
+        dataset = self.datasets[dataset_id]
         is_video_dataset = dataset.is_video_sequence()
 
         num_train_frames = self.sequence_sample_info['num_train_frames']
@@ -463,26 +782,13 @@ class KYSSampler(torch.utils.data.Dataset):
         allow_missing_target = self.sequence_sample_info['allow_missing_target']
         min_fraction_valid_frames = self.sequence_sample_info.get('min_fraction_valid_frames', 0.0)
 
-        if allow_missing_target:
-            min_visible_frames = 0
-        else:
+        if not allow_missing_target:
             raise NotImplementedError
 
-        valid_sequence = False
-
         # Sample a sequence with enough visible frames and get anno for the same
-        while not valid_sequence:
-            seq_id = random.randint(0, dataset.get_num_sequences() - 1)
-
-            seq_info_dict = dataset.get_sequence_info(seq_id)
-            visible = seq_info_dict['visible']
-            visible_ratio = seq_info_dict.get('visible_ratio', visible)
-
-            num_visible = visible.type(torch.int64).sum().item()
-
-            enough_visible_frames = not is_video_dataset or (num_visible > min_visible_frames and len(visible) >= 20)
-
-            valid_sequence = enough_visible_frames
+        seq_id, seq_info_dict = self.sequence_sampler.sample(dataset_id)
+        visible_ratio = seq_info_dict.get('visible_ratio', seq_info_dict['visible'])
+        visible = VisibleFrames(seq_info_dict['visible'])
 
         if self.sequence_sample_info['mode'] == 'Sequence':
             if is_video_dataset:
@@ -522,6 +828,7 @@ class KYSSampler(torch.utils.data.Dataset):
                                 prev_frame_ids = [base_frame_id] * num_train_frames
                             else:
                                 gap_increase += 5
+                                self.sequence_sampler.record_frame_retry()
                                 continue
 
                         train_frame_ids = prev_frame_ids
@@ -558,6 +865,7 @@ class KYSSampler(torch.utils.data.Dataset):
                                 prev_frame_ids = [base_frame_id] * num_train_frames
                             else:
                                 gap_increase += 5
+                                self.sequence_sampler.record_frame_retry()
                                 continue
 
                         train_frame_ids = prev_frame_ids
@@ -593,12 +901,12 @@ class KYSSampler(torch.utils.data.Dataset):
                            'dataset': dataset.get_name()})
 
         # Send for processing
-        return self.processing(data)
+        return self._add_sample_retries(self.processing(data), wasted_draws)
 
 
-class SequentialTargetCandidateMatchingSampler(torch.utils.data.Dataset):
+class SequentialTargetCandidateMatchingSampler(SeedableSampler):
     def __init__(self, dataset, samples_per_epoch, sup_modes, p_sup_modes=None, processing=no_processing,
-                 subseq_modes=None, p_subseq_modes=None, frame_modes=None, p_frame_modes=None):
+                 subseq_modes=None, p_subseq_modes=None, frame_modes=None, p_frame_modes=None, seed=None):
         """
         args:
             datasets - List of datasets to be used for training
@@ -610,9 +918,10 @@ class SequentialTargetCandidateMatchingSampler(torch.utils.data.Dataset):
             p_subseq_modes - List of subseq_mode sample probabilities.
             frame_modes - List of different frame mode to sample from (H, K, J), see KeepTrack paper for details.
             p_frame_modes - List of frame_mode sample probabilities.
-
+            seed - If set, each sample is drawn deterministically from the seed, epoch and index. See SeedableSampler.
         """
         self.dataset = dataset
+        self.seed = seed
         self.samples_per_epoch = samples_per_epoch
         self.processing = processing
         self.subseq_modes = subseq_modes
@@ -684,6 +993,7 @@ class SequentialTargetCandidateMatchingSampler(torch.utils.data.Dataset):
         return ids_begin + ids_end
 
 
+    @seeded_sample
     def __getitem__(self, index):
         """
         args:
@@ -743,7 +1053,7 @@ class TaMOsDatasetSampler(TrackingSampler):
                  buffer_size=160, use_gap=False):
         super().__init__(datasets=datasets, p_datasets=p_datasets, samples_per_epoch=samples_per_epoch, max_gap=max_gap,
                          num_test_frames=num_test_frames, num_train_frames=num_train_frames, processing=processing,
-                         frame_sample_mode=frame_sample_mode)
+                         frame_sample_mode=frame_sample_mode, precompute_eligible=False)
 
         self.buffer_size = buffer_size
         self.samples = self.buffer_size * [None]
@@ -0,0 +1,277 @@
+import os
+import json
+import mmap
+import hashlib
+import numpy as np
+import cv2 as cv
+from ltr.data.image_loader import ScaledImageLoader, load_reduced
+
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def _normalize_path(rel_path):
+    return os.path.normpath(rel_path).replace(os.sep, '/')
+
+
+def _path_key(rel_path):
+    """ 64 bit key of a frame path relative to the dataset root. """
+    digest = hashlib.blake2b(_normalize_path(rel_path).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little', signed=True)
+
+
+def decode_image_bytes(buffer, downscale=1):
+    """ Decodes an encoded image, downscaled by the factor downscale (1, 2, 4 or 8), and returns it in rgb format. """
+    flags = cv.IMREAD_COLOR if downscale == 1 else ScaledImageLoader.reduced_flags[downscale]
+    im = cv.imdecode(np.frombuffer(buffer, dtype=np.uint8), flags)
+    if im is None:
+        raise ValueError('Could not decode image.')
+    return cv.cvtColor(im, cv.COLOR_BGR2RGB, dst=im)
+
+
+def list_sequence_frames(root):
+    """ Lists all image files below root, grouped by directory. Each directory is considered a sequence.
+
+    returns:
+        list - List of (directory, [frame paths]) tuples, with the paths relative to root and sorted
+    """
+    sequences = []
+    for dir_path, dir_names, file_names in os.walk(root):
+        dir_names.sort()
+        frames = sorted(f for f in file_names if f.lower().endswith(IMAGE_EXTENSIONS))
+        if len(frames) > 0:
+            rel_dir = os.path.relpath(dir_path, root)
+            sequences.append((rel_dir, [os.path.join(rel_dir, f) for f in frames]))
+    return sequences
+
+
+def pack_frames(root, shard_dir, sequences=None, shard_size=2**30, verbose=True):
+    """ Packs the frames of a dataset into a few large shard files, such that a frame is read with a single
+    positioned read instead of opening a separate file. The encoded files are copied as they are, without re-encoding.
+    The frames of a sequence are always stored contiguously in the same shard.
+
+    The shard directory contains
+        shard_XXXXX.bin - Concatenated image files
+        keys.npy - Sorted int64 hashes of the frame paths, relative to root
+        entries.npy - int64 array (num_frames x 3) containing shard id, offset and size of each frame, in key order
+        meta.json - Shard file names and the dataset root used when packing
+
+    args:
+        root - Root directory of the dataset. The frames are identified by their path relative to root.
+        shard_dir - Output directory.
+        sequences - List of (name, [frame paths relative to root]) tuples. If None, all images below root are packed,
+                    with one sequence per directory.
+        shard_size - Approximate size of each shard in bytes. A new shard is started once the size is exceeded.
+        verbose - Print progress.
+    """
+    if sequences is None:
+        sequences = list_sequence_frames(root)
+
+    os.makedirs(shard_dir, exist_ok=True)
+
+    shard_names = []
+    keys = []
+    entries = []
+
+    shard_file = None
+    shard_offset = 0
+
+    try:
+        for seq_num, (seq_name, frames) in enumerate(sequences):
+            if shard_file is None or shard_offset >= shard_size:
+                if shard_file is not None:
+                    shard_file.close()
+                shard_names.append('shard_{:05d}.bin'.format(len(shard_names)))
+                shard_file = open(os.path.join(shard_dir, shard_names[-1]), 'wb')
+                shard_offset = 0
+
+            for frame in frames:
+                with open(os.path.join(root, frame), 'rb') as f:
+                    data = f.read()
+                shard_file.write(data)
+
+                keys.append(_path_key(frame))
+                entries.append((len(shard_names) - 1, shard_offset, len(data)))
+                shard_offset += len(data)
+
+            if verbose and (seq_num + 1) % 100 == 0:
+                print('Packed {} / {} sequences'.format(seq_num + 1, len(sequences)))
+    finally:
+        if shard_file is not None:
+            shard_file.close()
+
+    keys = np.array(keys, dtype=np.int64)
+    entries = np.array(entries, dtype=np.int64).reshape(-1, 3)
+
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    entries = entries[order]
+
+    if np.any(keys[1:] == keys[:-1]):
+        raise RuntimeError('Duplicate frame paths or hash collision while packing {}.'.format(root))
+
+    np.save(os.path.join(shard_dir, 'keys.npy'), keys)
+    np.save(os.path.join(shard_dir, 'entries.npy'), entries)
+
+    with open(os.path.join(shard_dir, 'meta.json'), 'w') as f:
+        json.dump({'version': ShardStorage.version, 'root': os.path.abspath(root), 'shards': shard_names}, f)
+
+    if verbose:
+        print('Packed {} frames into {} shards in {}'.format(len(keys), len(shard_names), shard_dir))
+
+
+class ShardStorage:
+    """ Read access to frames packed with pack_frames. Frames are looked up by their original path, either absolute
+    or relative to the dataset root, and read using positioned reads (os.pread) or through a memory map of the shard.
+    The index arrays are memory-mapped and the shard files are opened lazily in each process, such that the storage
+    can be shared by DataLoader workers."""
+    version = 1
+
+    def __init__(self, shard_dir, root=None, use_mmap=False):
+        """
+        args:
+            shard_dir - Directory written by pack_frames.
+            root - Dataset root the frame paths are relative to. Defaults to the root used when packing.
+            use_mmap - Read through a memory map of the shards instead of os.pread.
+        """
+        self.shard_dir = shard_dir
+        self.use_mmap = use_mmap
+
+        with open(os.path.join(shard_dir, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+
+        if meta['version'] != ShardStorage.version:
+            raise RuntimeError('Shard storage {} has an unsupported version.'.format(shard_dir))
+
+        self.root = os.path.abspath(meta['root'] if root is None else root)
+        self.shard_names = meta['shards']
+
+        self._open_index()
+
+    def _open_index(self):
+        self.keys = np.load(os.path.join(self.shard_dir, 'keys.npy'), mmap_mode='r')
+        self.entries = np.load(os.path.join(self.shard_dir, 'entries.npy'), mmap_mode='r')
+        self._files = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['keys'], state['entries'], state['_files']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._open_index()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, path):
+        return self._find(path) is not None
+
+    def _relative_path(self, path):
+        path = os.fspath(path)
+        rel_path = os.path.relpath(os.path.abspath(path), self.root)
+
+        # Relative paths which are not below the root, e.g. 'airplane-1/img/00000001.jpg', are relative to the root
+        if not os.path.isabs(path) and rel_path.split(os.sep)[0] == os.pardir:
+            return path
+        return rel_path
+
+    def _find(self, path):
+        key = _path_key(self._relative_path(path))
+        idx = int(np.searchsorted(self.keys, key))
+        if idx < len(self.keys) and self.keys[idx] == key:
+            return idx
+        return None
+
+    def _get_shard(self, shard_id):
+        # Files are opened per process, since file descriptors and memory maps are not shared with spawned workers
+        pid = os.getpid()
+        if self._files.get('pid') != pid:
+            self._files = {'pid': pid}
+
+        if shard_id not in self._files:
+            fd = os.open(os.path.join(self.shard_dir, self.shard_names[shard_id]), os.O_RDONLY)
+            if self.use_mmap:
+                self._files[shard_id] = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+                os.close(fd)
+            else:
+                self._files[shard_id] = fd
+        return self._files[shard_id]
+
+    def read_bytes(self, path):
+        """ Returns the encoded file of the given frame, or None if it is not in the storage. """
+        idx = self._find(path)
+        if idx is None:
+            return None
+
+        shard_id, offset, size = (int(v) for v in self.entries[idx])
+        shard = self._get_shard(shard_id)
+
+        if self.use_mmap:
+            return shard[offset:offset + size]
+        return os.pread(shard, size, offset)
+
+    def load_image(self, path, downscale=1):
+        """ Reads and decodes the given frame, downscaled by the factor downscale. Returns the image in rgb format, or
+        None if it is not in the storage."""
+        data = self.read_bytes(path)
+        if data is None:
+            return None
+        return decode_image_bytes(data, downscale)
+
+    def frame_refs(self, frames):
+        """ Converts a list of frame paths into ShardFrame references, which are read from this storage. """
+        return [ShardFrame(f, self) for f in frames]
+
+
+class ShardFrame(str):
+    """ Reference to a frame in a ShardStorage. Behaves as the original path string, such that it can be used in place of
+    the paths in Sequence.frames, and additionally allows reading the frame from the storage using load()."""
+
+    def __new__(cls, path, storage):
+        obj = super().__new__(cls, os.fspath(path))
+        obj.storage = storage
+        return obj
+
+    def __reduce__(self):
+        return ShardFrame, (str(self), self.storage)
+
+    def load(self):
+        im = self.storage.load_image(self)
+        if im is None:
+            raise FileNotFoundError('Frame {} is not contained in {}'.format(str(self), self.storage.shard_dir))
+        return im
+
+
+class ShardImageLoader:
+    """ Image loader reading the frames from a ShardStorage. Can be passed as image_loader to any dataset, e.g.
+    Lasot(image_loader=ShardImageLoader(shard_dir, root)). Frames which are not contained in the storage are read
+    using the fallback loader."""
+
+    def __init__(self, shard_dir, root=None, use_mmap=False, fallback_loader=None):
+        """
+        args:
+            shard_dir, root, use_mmap - See ShardStorage.
+            fallback_loader - Loader used for the frames missing in the storage. If None, an error is raised instead.
+        """
+        self.storage = ShardStorage(shard_dir, root, use_mmap)
+        self.fallback_loader = fallback_loader
+
+    def __call__(self, path):
+        return self.load_reduced(path, 1)
+
+    def load_reduced(self, path, downscale):
+        """ Reads the frame downscaled by the factor downscale, see ltr.data.image_loader.load_reduced. """
+        try:
+            im = self.storage.load_image(path, downscale)
+        except Exception as e:
+            print('ERROR: Could not read image "{}" from {}'.format(path, self.storage.shard_dir))
+            print(e)
+            return None
+
+        if im is None:
+            if self.fallback_loader is None:
+                raise FileNotFoundError('Frame {} is not contained in {}'.format(path, self.storage.shard_dir))
+            return load_reduced(self.fallback_loader, path, downscale)
+        return im
@@ -200,6 +200,23 @@ class ToTensor(TransformBase):
             return torch.from_numpy(mask)
 
 
+class ToByteTensor(TransformBase):
+    """Convert to a uint8 Tensor, without scaling. Used when the augmentation is instead performed on the collated
+    batch, see ltr.data.batch_transforms."""
+
+    def transform_image(self, image):
+        # handle numpy array
+        if image.ndim == 2:
+            image = image[:, :, None]
+
+        return torch.from_numpy(np.ascontiguousarray(image.transpose((2, 0, 1))))
+
+    def transform_mask(self, mask):
+        if isinstance(mask, np.ndarray):
+            return torch.from_numpy(mask)
+        return mask
+
+
 class ToTensorAndJitter(TransformBase):
     """Convert to a Tensor and jitter brightness"""
 
@@ -0,0 +1,150 @@
+import os
+import shutil
+import hashlib
+import numpy as np
+import torch
+from ltr.admin.environment import env_settings
+from ltr.dataset.array_store import ArrayStore, write_store
+
+
+def default_index_dir():
+    """ Directory for the annotation indices, given by env_settings().anno_index_dir. Returns None if it is not set. """
+    try:
+        return getattr(env_settings(), 'anno_index_dir', None) or None
+    except RuntimeError:
+        return None
+
+
+def index_path(index_dir, dataset_key, sequence_names, anno_files=()):
+    """ Path of the index for the given sequences. The sequence names, the format version of the index and the
+    names, sizes and modification times of the annotation files are hashed, such that every dataset split gets its own
+    index, and a new index is built when the annotations are edited.
+    args:
+        anno_files - Paths of the annotation files read when building the index. Missing files are ignored.
+    """
+    h = hashlib.md5('v{}\n'.format(AnnotationIndex.version).encode('utf-8'))
+    h.update('\n'.join(sorted(str(s) for s in sequence_names)).encode('utf-8'))
+    for path in sorted(anno_files):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        h.update('\n{} {} {}'.format(path, stat.st_size, stat.st_mtime_ns).encode('utf-8'))
+    return os.path.join(index_dir, '{}_{}'.format(dataset_key, h.hexdigest()[:12]))
+
+
+class AnnotationIndex(ArrayStore):
+    """ Persistent, memory-mapped annotation index for a video dataset.
+
+    The annotations of all sequences are concatenated and stored as .npy files, which are memory-mapped when the
+    index is opened. Thus, the annotations are parsed only once, when the index is built, and all DataLoader workers
+    share the same pages instead of keeping a copy each. The index directory contains
+        meta.json - sequence names, per-sequence meta info and dataset level meta info
+        offsets.npy - int64 array of size num_sequences + 1. Frames of sequence i are offsets[i]:offsets[i+1]
+        <key>.npy - one array per annotation key, e.g. bbox (float32, num_frames x 4) and visible (uint8, num_frames)
+    """
+    store_name = 'Annotation index'
+    version = 1
+    mapped_attributes = ('offsets', 'arrays')
+
+    def _load_meta(self, meta):
+        self.sequence_names = meta['sequences']
+        self.keys = meta['keys']
+        self.sequence_meta = meta['sequence_meta']
+        self.dataset_meta = meta['dataset_meta']
+        self._name_to_id = {name: i for i, name in enumerate(self.sequence_names)}
+
+    def _open_arrays(self):
+        self.offsets = np.load(os.path.join(self.path, 'offsets.npy'))
+        self.arrays = {key: np.load(os.path.join(self.path, key + '.npy'), mmap_mode='r') for key in self.keys}
+
+    def __len__(self):
+        return len(self.sequence_names)
+
+    def __contains__(self, sequence_name):
+        return sequence_name in self._name_to_id
+
+    def contains_all(self, sequence_names):
+        return all(s in self._name_to_id for s in sequence_names)
+
+    def get_sequence_length(self, sequence_name):
+        i = self._name_to_id[sequence_name]
+        return int(self.offsets[i + 1] - self.offsets[i])
+
+    def get_sequence_meta(self, sequence_name):
+        if self.sequence_meta is None:
+            return None
+        return self.sequence_meta[self._name_to_id[sequence_name]]
+
+    def get_annotations(self, sequence_name):
+        """ Returns a dict with a tensor per annotation key. The tensors are copies and can be modified freely. """
+        i = self._name_to_id[sequence_name]
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return {key: torch.from_numpy(np.array(arr[start:end])) for key, arr in self.arrays.items()}
+
+    @staticmethod
+    def build(path, sequence_names, read_anno, read_meta=None, dataset_meta=None):
+        """ Builds the index and writes it to path, see write_store. An index written by another process in the
+        meantime is kept.
+        args:
+            path - Output directory
+            sequence_names - List of sequence names. Must be json serializable.
+            read_anno - Function taking a sequence name and returning a dict of per-frame annotations (tensors or
+                        numpy arrays with the frames in the first dimension). All sequences must return the same keys.
+            read_meta - Optional function taking a sequence name and returning json serializable meta info.
+            dataset_meta - Optional json serializable dataset level meta info.
+        returns:
+            AnnotationIndex - the opened index
+        """
+        annos = {}
+        lengths = []
+        sequence_meta = [] if read_meta is not None else None
+
+        for seq_name in sequence_names:
+            anno = read_anno(seq_name)
+            anno = {key: val.numpy() if torch.is_tensor(val) else np.asarray(val) for key, val in anno.items()}
+
+            if not annos:
+                annos = {key: [] for key in anno.keys()}
+            elif set(anno.keys()) != set(annos.keys()):
+                raise ValueError('Sequence {} has different annotation keys.'.format(seq_name))
+
+            seq_len = len(next(iter(anno.values())))
+            if any(len(val) != seq_len for val in anno.values()):
+                raise ValueError('Sequence {} has annotations of different lengths.'.format(seq_name))
+
+            for key, val in anno.items():
+                annos[key].append(val)
+            lengths.append(seq_len)
+
+            if read_meta is not None:
+                sequence_meta.append(read_meta(seq_name))
+
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(lengths)
+
+        with write_store(path, replace=False) as tmp_path:
+            np.save(os.path.join(tmp_path, 'offsets.npy'), offsets)
+            for key, vals in annos.items():
+                np.save(os.path.join(tmp_path, key + '.npy'), np.ascontiguousarray(np.concatenate(vals, axis=0)))
+
+            AnnotationIndex.write_meta(tmp_path,
+                                       sequences=list(sequence_names),
+                                       keys=list(annos.keys()),
+                                       sequence_meta=sequence_meta,
+                                       dataset_meta=dataset_meta)
+
+        return AnnotationIndex(path)
+
+    @staticmethod
+    def load_or_build(path, sequence_names, read_anno, read_meta=None, dataset_meta=None):
+        """ Opens the index at path if it exists and contains all the sequences. Otherwise, the index is (re)built.
+        See AnnotationIndex.build for the arguments."""
+        if os.path.isfile(os.path.join(path, 'meta.json')):
+            index = AnnotationIndex(path)
+            if index.contains_all(sequence_names):
+                return index
+            shutil.rmtree(path, ignore_errors=True)
+
+        print('Building annotation index {}. This is only done once.'.format(path))
+        return AnnotationIndex.build(path, sequence_names, read_anno, read_meta, dataset_meta)
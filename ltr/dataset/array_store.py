@@ -0,0 +1,91 @@
+import os
+import json
+import shutil
+from contextlib import contextmanager
+import numpy as np
+
+
+class ArrayStore:
+    """ Base class of the stores which consist of a directory containing a meta.json file and .npy arrays, which are
+    memory-mapped when the store is opened, e.g. AnnotationIndex, MaskStore and FeatureStore. All DataLoader workers
+    thus share the same pages. The arrays are not pickled, but re-opened by each worker process.
+
+    Subclasses set store_name, version and array_names, and read their fields from the meta in _load_meta. The arrays
+    in array_names are opened as attributes of the same name. Stores which open their arrays differently override
+    _open_arrays and list the attributes holding them in mapped_attributes. Stores are written using write_store and
+    write_meta.
+    """
+    store_name = 'Store'
+    version = 1
+    array_names = ()
+
+    def __init__(self, path):
+        """
+        args:
+            path - Directory containing the store.
+        """
+        self.path = path
+
+        with open(os.path.join(path, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+
+        if meta['version'] != self.version:
+            raise RuntimeError('{} {} has an unsupported version and must be rebuilt.'.format(self.store_name, path))
+
+        self._load_meta(meta)
+        self._open_arrays()
+
+    @property
+    def mapped_attributes(self):
+        return self.array_names
+
+    def _load_meta(self, meta):
+        pass
+
+    def _open_arrays(self):
+        for name in self.array_names:
+            setattr(self, name, np.load(os.path.join(self.path, name + '.npy'), mmap_mode='r'))
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name in self.mapped_attributes:
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._open_arrays()
+
+    @classmethod
+    def write_meta(cls, store_path, **meta):
+        """ Writes meta.json, containing the version of the store and the given fields, to the store directory. """
+        with open(os.path.join(store_path, 'meta.json'), 'w') as f:
+            json.dump(dict(version=cls.version, **meta), f)
+
+
+@contextmanager
+def write_store(path, replace=True):
+    """ Context in which a store is written. Yields a temporary directory in which the files are written, and which
+    is renamed to path on exit, such that other processes never see a partially written store. The temporary directory
+    is removed if an exception is raised.
+    args:
+        path - Output directory.
+        replace - Replace an existing store at path. Otherwise, a store written by another process in the meantime is
+                  kept.
+    """
+    tmp_path = '{}.tmp{}'.format(path.rstrip(os.sep), os.getpid())
+    os.makedirs(tmp_path, exist_ok=True)
+    try:
+        yield tmp_path
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+
+    if replace and os.path.exists(path):
+        shutil.rmtree(path)
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        if replace:
+            raise
+        shutil.rmtree(tmp_path, ignore_errors=True)
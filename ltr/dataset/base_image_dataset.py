@@ -1,21 +1,26 @@
 import torch.utils.data
-from ltr.data.image_loader import jpeg4py_loader
+from ltr.data.image_loader import default_image_loader, init_default_decoder, uses_default_image_loader
+from ltr.data.frame_cache import cache_image_loader
 
 
 class BaseImageDataset(torch.utils.data.Dataset):
     """ Base class for image datasets """
 
-    def __init__(self, name, root, image_loader=jpeg4py_loader):
+    def __init__(self, name, root, image_loader=default_image_loader):
         """
         args:
             root - The root path to the dataset
-            image_loader (jpeg4py_loader) -  The function to read the images. jpeg4py (https://github.com/ajkxyz/jpeg4py)
-                                            is used by default.
+            image_loader (default_image_loader) -  The function to read the images. The fastest available decoder
+                                            is used by default, see ltr.data.image_loader.
         """
         self.name = name
         self.root = root
         self.image_loader = image_loader
 
+        # Benchmark the decoders before the DataLoader workers are started
+        if uses_default_image_loader(image_loader):
+            init_default_decoder(root)
+
         self.image_list = []     # Contains the list of sequences.
         self.class_list = []
 
@@ -39,6 +44,15 @@ class BaseImageDataset(torch.utils.data.Dataset):
         """
         raise NotImplementedError
 
+    def use_frame_cache(self, cache):
+        """ Caches the decoded frames in a SharedFrameCache, which is shared by all DataLoader workers. Must be called in
+        the main process, before the workers are started. See ltr.data.frame_cache.
+
+        args:
+            cache - SharedFrameCache. The same cache can be used by several datasets.
+        """
+        self.image_loader = cache_image_loader(self.image_loader, cache, self.get_name())
+
     def get_num_images(self):
         """ Number of sequences in a dataset
 
@@ -1,21 +1,27 @@
 import torch.utils.data
-from ltr.data.image_loader import jpeg4py_loader
+from ltr.data.image_loader import default_image_loader, init_default_decoder, uses_default_image_loader
+from ltr.data.frame_cache import cache_image_loader
+from ltr.dataset.annotation_index import AnnotationIndex, default_index_dir, index_path
 
 
 class BaseVideoDataset(torch.utils.data.Dataset):
     """ Base class for video datasets """
 
-    def __init__(self, name, root, image_loader=jpeg4py_loader):
+    def __init__(self, name, root, image_loader=default_image_loader):
         """
         args:
             root - The root path to the dataset
-            image_loader (jpeg4py_loader) -  The function to read the images. jpeg4py (https://github.com/ajkxyz/jpeg4py)
-                                            is used by default.
+            image_loader (default_image_loader) -  The function to read the images. The fastest available decoder
+                                            is used by default, see ltr.data.image_loader.
         """
         self.name = name
         self.root = root
         self.image_loader = image_loader
 
+        # Benchmark the decoders before the DataLoader workers are started
+        if uses_default_image_loader(image_loader):
+            init_default_decoder(root)
+
         self.sequence_list = []     # Contains the list of sequences.
         self.class_list = []
 
@@ -55,6 +61,15 @@ class BaseVideoDataset(torch.utils.data.Dataset):
         """
         raise NotImplementedError
 
+    def use_frame_cache(self, cache):
+        """ Caches the decoded frames in a SharedFrameCache, which is shared by all DataLoader workers. Must be called in
+        the main process, before the workers are started. See ltr.data.frame_cache.
+
+        args:
+            cache - SharedFrameCache. The same cache can be used by several datasets.
+        """
+        self.image_loader = cache_image_loader(self.image_loader, cache, self.get_name())
+
     def get_num_sequences(self):
         """ Number of sequences in a dataset
 
@@ -83,6 +98,33 @@ class BaseVideoDataset(torch.utils.data.Dataset):
     def has_segmentation_info(self):
         return False
 
+    def _load_anno_index(self, sequence_names, anno_index_dir=None, read_meta=None, dataset_meta=None):
+        """ Opens the memory-mapped annotation index (see ltr.dataset.annotation_index) for the given sequences, and
+        builds it if it does not exist yet. The dataset must implement _read_sequence_anno(sequence_name), and
+        should list the files it reads in _sequence_anno_files(sequence_name), such that the index is rebuilt when they
+        are edited.
+
+        args:
+            sequence_names - Names of the sequences to be included in the index.
+            anno_index_dir - Directory containing the indices. If None, env_settings().anno_index_dir is used.
+            read_meta - Optional function returning the meta info of a sequence, to be stored in the index.
+            dataset_meta - Optional dataset level meta info to be stored in the index.
+
+        returns:
+            AnnotationIndex - The index, or None if no index directory is set.
+        """
+        anno_index_dir = default_index_dir() if anno_index_dir is None else anno_index_dir
+        if not anno_index_dir:
+            return None
+
+        anno_files = [f for seq_name in sequence_names for f in self._sequence_anno_files(seq_name)]
+        path = index_path(anno_index_dir, type(self).__name__.lower(), sequence_names, anno_files)
+        return AnnotationIndex.load_or_build(path, sequence_names, self._read_sequence_anno, read_meta, dataset_meta)
+
+    def _sequence_anno_files(self, sequence_name):
+        """ Paths of the annotation files of a sequence which are stored in the annotation index. """
+        return []
+
     def get_sequence_info(self, seq_id):
         """ Returns information about a particular sequences,
 
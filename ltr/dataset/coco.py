@@ -1,6 +1,6 @@
 import os
 from .base_image_dataset import BaseImageDataset
-from ltr.data.image_loader import jpeg4py_loader
+from ltr.data.image_loader import default_image_loader
 import torch
 from pycocotools.coco import COCO
 import random
@@ -31,13 +31,13 @@ class MSCOCO(BaseImageDataset):
     Note: You also have to install the coco pythonAPI from https://github.com/cocodataset/cocoapi.
     """
 
-    def __init__(self, root=None, image_loader=jpeg4py_loader, data_fraction=None, min_area=None,
+    def __init__(self, root=None, image_loader=default_image_loader, data_fraction=None, min_area=None,
                  split="train", version="2014"):
         """
         args:
             root - path to coco root folder
-            image_loader (jpeg4py_loader) - The function to read the images. jpeg4py (https://github.com/ajkxyz/jpeg4py)
-                                            is used by default.
+            image_loader (default_image_loader) - The function to read the images. The fastest available decoder
+                                            is used by default, see ltr.data.image_loader.
             data_fraction - Fraction of dataset to be used. The complete dataset is used by default
             min_area - Objects with area less than min_area are filtered out. Default is 0.0
             split - 'train' or 'val'.
@@ -1,6 +1,6 @@
 import os
 from .base_video_dataset import BaseVideoDataset
-from ltr.data.image_loader import jpeg4py_loader
+from ltr.data.image_loader import default_image_loader
 import torch
 import random
 from pycocotools.coco import COCO
@@ -31,13 +31,12 @@ class MSCOCOSeq(BaseVideoDataset):
     Note: You also have to install the coco pythonAPI from https://github.com/cocodataset/cocoapi.
     """
 
-    def __init__(self, root=None, image_loader=jpeg4py_loader, data_fraction=None, split="train", version="2014"):
+    def __init__(self, root=None, image_loader=default_image_loader, data_fraction=None, split="train", version="2014"):
         """
         args:
             root - path to the coco dataset.
-            image_loader (default_image_loader) -  The function to read the images. If installed,
-                                                   jpeg4py (https://github.com/ajkxyz/jpeg4py) is used by default. Else,
-                                                   opencv's imread is used.
+            image_loader (default_image_loader) -  The function to read the images. The fastest available
+                                                   decoder is used by default, see ltr.data.image_loader.
             data_fraction (None) - Fraction of images to be used. The images are selected randomly. If None, all the
                                   images  will be used
             split - 'train' or 'val'.
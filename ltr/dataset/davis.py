@@ -2,7 +2,7 @@ from pathlib import Path
 from ltr.dataset.vos_base import VOSDatasetBase, VOSMeta
 from pytracking.evaluation import Sequence
 from ltr.admin.environment import env_settings
-from ltr.data.image_loader import jpeg4py_loader
+from ltr.data.image_loader import default_image_loader
 
 
 class Davis(VOSDatasetBase):
@@ -17,7 +17,7 @@ class Davis(VOSDatasetBase):
         Download the dataset from https://davischallenge.org/davis2017/code.html
         """
     def __init__(self, root=None, sequences=None, version='2017', split='train', multiobj=True,
-                 vis_threshold=10, image_loader=jpeg4py_loader):
+                 vis_threshold=10, image_loader=default_image_loader, update_meta=False):
         """
         args:
              root - Dataset root path. If unset, it uses the path in your local.py config.
@@ -27,8 +27,10 @@ class Davis(VOSDatasetBase):
              multiobj - Whether the dataset will return all objects in a sequence or multiple sequences with one object
                         in each.
              vis_threshold - Minimum number of pixels required to consider a target object "visible".
-             image_loader (jpeg4py_loader) - The function to read the images. jpeg4py (https://github.com/ajkxyz/jpeg4py)
-                                            is used by default.
+             image_loader (default_image_loader) - The function to read the images. The fastest available decoder
+                                            is used by default, see ltr.data.image_loader.
+             update_meta - Re-process the sequences which changed since generated_meta.json was generated, see
+                           VOSMeta.load_or_generate.
         """
         if version == '2017':
             if split in ['train', 'val']:
@@ -48,11 +50,8 @@ class Davis(VOSDatasetBase):
         self._anno_path = dset_path / 'Annotations' / '480p'
 
         meta_path = dset_path / "generated_meta.json"
-        if meta_path.exists():
-            self.gmeta = VOSMeta(filename=meta_path)
-        else:
-            self.gmeta = VOSMeta.generate('DAVIS', self._jpeg_path, self._anno_path)
-            self.gmeta.save(meta_path)
+        self.gmeta = VOSMeta.load_or_generate(meta_path, 'DAVIS', self._jpeg_path, self._anno_path,
+                                              update=update_meta)
 
         if sequences is None:
             if self.split != 'all':
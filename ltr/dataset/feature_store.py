@@ -0,0 +1,151 @@
+import os
+import random
+import numpy as np
+import torch
+import torch.utils.data
+from ltr.dataset.array_store import ArrayStore, write_store
+
+
+class FeatureStore(ArrayStore):
+    """ Memory-mapped float16 store of the backbone features of the search areas of a candidate matching dataset, e.g.
+    LasotCandidateMatching, written by build_feature_store.
+
+    The search areas are given by the dumped search area boxes, such that their features do not change between epochs
+    as long as the backbone is frozen. For each frame, the store contains the features of the un-augmented search area
+    (view 0) and optionally of num_views - 1 augmented views, used as second frame for self-supervision. The frames are
+    identified by the key '<sequence name>/<frame id>'. The store directory contains
+        meta.json - keys of the frames, backbone layer, output size of the crops and shape of the features
+        features.npy - float16 array (num_frames x num_views x C x H x W)
+        boxes.npy - float32 array (num_frames x num_views x 4) containing the search area box [x, y, w, h] of each view
+        image_sizes.npy - int64 array (num_frames x 2) containing the height and width of the full images
+    """
+    store_name = 'Feature store'
+    version = 1
+    array_names = ('features', 'boxes', 'image_sizes')
+
+    def _load_meta(self, meta):
+        self.keys = meta['keys']
+        self.layer = meta['layer']
+        self.output_sz = meta['output_sz']
+        self.num_views = meta['num_views']
+        self._key_to_id = {key: i for i, key in enumerate(self.keys)}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self._key_to_id
+
+    @staticmethod
+    def get_key(seq_name, frame_id):
+        return '{}/{}'.format(seq_name, frame_id)
+
+    def get_features(self, key):
+        """ Returns the memory-mapped features (num_views x C x H x W) of a frame. Only the views which are accessed are
+        read from disk. """
+        return self.features[self._key_to_id[key]]
+
+    def get_boxes(self, key):
+        """ Returns the search area boxes (num_views x 4) of the views of a frame. """
+        return np.array(self.boxes[self._key_to_id[key]])
+
+    def get_image_size(self, key):
+        """ Returns the (height, width) of the full image of a frame. """
+        return tuple(int(s) for s in self.image_sizes[self._key_to_id[key]])
+
+
+class _SearchAreaViews(torch.utils.data.Dataset):
+    """ Crops the views of the search areas of the given frames, for build_feature_store. """
+
+    def __init__(self, dataset, frames, processing, num_views, seed):
+        self.dataset = dataset
+        self.frames = frames
+        self.processing = processing
+        self.num_views = num_views
+        self.seed = seed
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __getitem__(self, index):
+        # The augmentations of each frame are reproducible, independent of the number of workers
+        random.seed(self.seed + index)
+        torch.manual_seed(self.seed + index)
+
+        seq_id, frame_id = self.frames[index]
+        img, sa_box = self.dataset.get_search_area(seq_id, frame_id)
+        crops, boxes = self.processing.get_search_area_views(img, sa_box, self.num_views)
+        return index, crops, boxes, torch.tensor(img.shape[:2])
+
+
+def build_feature_store(net, dataset, processing, out_path, num_views=1, batch_size=32, num_workers=8,
+                        device='cuda', seed=0, verbose=True):
+    """ Runs the frozen backbone of a target candidate matching network over the search areas of all frames used by the
+    frame and subsequence states of a candidate matching dataset, and writes the features into a FeatureStore, see
+    write_store.
+    args:
+        net - TargetCandidateMatchingNetwork. Only its feature extractor is run, in eval mode.
+        dataset - LasotCandidateMatching dataset. Use the split containing all sequences used for training and
+                  validation, e.g. split='train'.
+        processing - TargetCandiateMatchingProcessing which defines the output size and the transforms of the views,
+                     see TargetCandiateMatchingProcessing.get_search_area_views.
+        out_path - Output directory of the store.
+        num_views - Number of views per frame. View 0 is the un-augmented search area, the others are augmented and
+                    used as second frame for self-supervision.
+        batch_size, num_workers - Number of frames per batch and number of processes used to load and crop the frames.
+        device - Device on which the backbone is run.
+        seed - Seed of the augmentations.
+    returns:
+        FeatureStore - the opened store
+    """
+    if len(net.classification_layer) != 1:
+        raise ValueError('The feature store only supports networks with a single classification layer.')
+    layer = net.classification_layer[0]
+
+    frames = dataset.get_state_frames()
+    keys = [FeatureStore.get_key(dataset.get_sequence_name(seq_id), frame_id) for seq_id, frame_id in frames]
+
+    loader = torch.utils.data.DataLoader(_SearchAreaViews(dataset, frames, processing, num_views, seed),
+                                         batch_size=batch_size, num_workers=num_workers, shuffle=False)
+
+    boxes = np.zeros((len(frames), num_views, 4), dtype=np.float32)
+    image_sizes = np.zeros((len(frames), 2), dtype=np.int64)
+    features = None
+
+    net = net.to(device)
+    net.eval()
+
+    with write_store(out_path) as tmp_path, torch.no_grad():
+        for batch_num, (index, crops, crop_boxes, sizes) in enumerate(loader, 1):
+            feat = net.extract_backbone_features(crops.reshape(-1, *crops.shape[-3:]).to(device), layers=[layer])[layer]
+            feat = feat.reshape(crops.shape[0], num_views, *feat.shape[-3:])
+
+            if features is None:
+                features = np.lib.format.open_memmap(os.path.join(tmp_path, 'features.npy'), mode='w+',
+                                                     dtype=np.float16, shape=(len(frames), *feat.shape[1:]))
+
+            index = index.numpy()
+            features[index] = feat.half().cpu().numpy()
+            boxes[index] = crop_boxes.numpy()
+            image_sizes[index] = sizes.numpy()
+
+            if verbose and batch_num % 100 == 0:
+                print('Processed {} / {} frames'.format(min(batch_num * batch_size, len(frames)), len(frames)))
+
+        if features is None:
+            raise RuntimeError('The dataset does not contain any frames.')
+
+        feature_shape = list(features.shape[2:])
+        features.flush()
+        del features
+
+        np.save(os.path.join(tmp_path, 'boxes.npy'), boxes)
+        np.save(os.path.join(tmp_path, 'image_sizes.npy'), image_sizes)
+
+        FeatureStore.write_meta(tmp_path, keys=keys, layer=layer, output_sz=processing.output_sz, num_views=num_views,
+                                feature_shape=feature_shape)
+
+    store = FeatureStore(out_path)
+    if verbose:
+        print('Stored the features of {} frames in {}'.format(len(store), out_path))
+    return store
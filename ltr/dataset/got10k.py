@@ -7,7 +7,7 @@ import pandas
 import random
 from collections import OrderedDict
 from .base_video_dataset import BaseVideoDataset
-from ltr.data.image_loader import jpeg4py_loader
+from ltr.data.image_loader import default_image_loader
 from ltr.admin.environment import env_settings
 
 
@@ -23,18 +23,22 @@ class Got10k(BaseVideoDataset):
     Download dataset from http://got-10k.aitestunion.com/downloads
     """
 
-    def __init__(self, root=None, image_loader=jpeg4py_loader, split=None, seq_ids=None, data_fraction=None):
+    def __init__(self, root=None, image_loader=default_image_loader, split=None, seq_ids=None, data_fraction=None,
+                 anno_index_dir=None):
         """
         args:
             root - path to the got-10k training data. Note: This should point to the 'train' folder inside GOT-10k
-            image_loader (jpeg4py_loader) -  The function to read the images. jpeg4py (https://github.com/ajkxyz/jpeg4py)
-                                            is used by default.
+            image_loader (default_image_loader) -  The function to read the images. The fastest available decoder
+                                            is used by default, see ltr.data.image_loader.
             split - 'train' or 'val'. Note: The validation split here is a subset of the official got-10k train split,
                     not NOT the official got-10k validation split. To use the official validation split, provide that as
                     the root folder instead.
             seq_ids - List containing the ids of the videos to be used for training. Note: Only one of 'split' or 'seq_ids'
                         options can be used at the same time.
             data_fraction - Fraction of dataset to be used. The complete dataset is used by default
+            anno_index_dir - Directory of the memory-mapped annotation index (see ltr.dataset.annotation_index). If
+                            None, env_settings().anno_index_dir is used. The annotations are parsed from the text files
+                            if neither is set.
         """
         root = env_settings().got10k_dir if root is None else root
         super().__init__('GOT10k', root, image_loader)
@@ -62,6 +66,8 @@ class Got10k(BaseVideoDataset):
             seq_ids = list(range(0, len(self.sequence_list)))
 
         self.sequence_list = [self.sequence_list[i] for i in seq_ids]
+        self.anno_index = self._load_anno_index(self.sequence_list, anno_index_dir,
+                                                read_meta=lambda s: self._read_meta(os.path.join(self.root, s)))
 
         if data_fraction is not None:
             self.sequence_list = random.sample(self.sequence_list, int(len(self.sequence_list)*data_fraction))
@@ -82,6 +88,9 @@ class Got10k(BaseVideoDataset):
         return True
 
     def _load_meta_info(self):
+        if self.anno_index is not None:
+            # Avoids opening the meta_info.ini files of all sequences
+            return {s: OrderedDict(self.anno_index.get_sequence_meta(s)) for s in self.sequence_list}
         sequence_meta_info = {s: self._read_meta(os.path.join(self.root, s)) for s in self.sequence_list}
         return sequence_meta_info
 
@@ -146,13 +155,26 @@ class Got10k(BaseVideoDataset):
     def _get_sequence_path(self, seq_id):
         return os.path.join(self.root, self.sequence_list[seq_id])
 
+    def _sequence_anno_files(self, seq_name):
+        seq_path = os.path.join(self.root, seq_name)
+        return [os.path.join(seq_path, f) for f in ('groundtruth.txt', 'absence.label', 'cover.label', 'meta_info.ini')]
+
+    def _read_sequence_anno(self, seq_name):
+        seq_path = os.path.join(self.root, seq_name)
+        target_visible, visible_ratio = self._read_target_visible(seq_path)
+        return {'bbox': self._read_bb_anno(seq_path), 'visible': target_visible, 'visible_ratio': visible_ratio}
+
     def get_sequence_info(self, seq_id):
-        seq_path = self._get_sequence_path(seq_id)
-        bbox = self._read_bb_anno(seq_path)
+        seq_name = self.sequence_list[seq_id]
+        if self.anno_index is not None:
+            anno = self.anno_index.get_annotations(seq_name)
+        else:
+            anno = self._read_sequence_anno(seq_name)
+        bbox = anno['bbox']
 
         valid = (bbox[:, 2] > 0) & (bbox[:, 3] > 0)
-        visible, visible_ratio = self._read_target_visible(seq_path)
-        visible = visible & valid.byte()
+        visible = anno['visible'] & valid.byte()
+        visible_ratio = anno['visible_ratio']
 
         return {'bbox': bbox, 'valid': valid, 'visible': visible, 'visible_ratio': visible_ratio}
 
@@ -4,16 +4,24 @@ import numpy as np
 import torch
 from PIL import Image
 from ltr.dataset.got10k import Got10k
-from ltr.data.image_loader import jpeg4py_loader, imread_indexed
+from ltr.data.image_loader import imread_indexed
+from ltr.dataset.mask_store import MaskStore
 
 
 class Got10kVOS(Got10k):
     """ Got10K video object segmentation dataset.
     """
 
-    def __init__(self, anno_path=None, split='train'):
+    def __init__(self, anno_path=None, split='train', mask_store=None):
+        """
+        args:
+            anno_path - Path to the mask annotations
+            split - Split of the dataset
+            mask_store - Optional MaskStore, or path to it, converted from anno_path. See ltr.dataset.mask_store.
+        """
         super().__init__(split=split)
         self.anno_path = anno_path
+        self.mask_store = MaskStore(mask_store) if isinstance(mask_store, str) else mask_store
 
         # TODO this prevents a crash, because that particular sequence does not have masks.
         # Once the missing mask is added, the following code can be removed (handled in base)
@@ -34,6 +42,13 @@ class Got10kVOS(Got10k):
         im = np.atleast_3d(im)[..., 0]
         return im
 
+    def _load_mask(self, path):
+        if self.mask_store is not None:
+            key = os.path.splitext(os.path.relpath(path, self.anno_path))[0].replace(os.sep, '/')
+            if key in self.mask_store:
+                return self.mask_store.get_labels(key)
+        return self._load_anno(Path(path))
+
     def _get_anno_sequence_path(self, seq_id):
         return os.path.join(self.anno_path, self.sequence_list[seq_id])
 
@@ -55,7 +70,7 @@ class Got10kVOS(Got10k):
 
         anno_seq_path = self._get_anno_sequence_path(seq_id)
 
-        labels = [self._load_anno(Path(self._get_anno_frame_path(anno_seq_path, f))) for f in frame_ids]
+        labels = [self._load_mask(self._get_anno_frame_path(anno_seq_path, f)) for f in frame_ids]
         labels = [torch.Tensor(lb) for lb in labels]
         anno_frames['mask'] = labels
 
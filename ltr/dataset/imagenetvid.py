@@ -31,9 +31,8 @@ class ImagenetVID(BaseVideoDataset):
         """
         args:
             root - path to the imagenet vid dataset.
-            image_loader (default_image_loader) -  The function to read the images. If installed,
-                                                   jpeg4py (https://github.com/ajkxyz/jpeg4py) is used by default. Else,
-                                                   opencv's imread is used.
+            image_loader (default_image_loader) -  The function to read the images. The fastest available
+                                                   decoder is used by default, see ltr.data.image_loader.
             min_length - Minimum allowed sequence length.
             max_target_area - max allowed ratio between target area and image area. Can be used to filter out targets
                                 which cover complete image.
@@ -1,7 +1,7 @@
 import os
 import pandas
 from .base_video_dataset import BaseVideoDataset
-from ltr.data.image_loader import jpeg4py_loader
+from ltr.data.image_loader import default_image_loader
 import json
 import torch
 from collections import OrderedDict
@@ -15,7 +15,7 @@ def get_target_to_image_ratio(seq):
 
 
 class ImagenetVIDMOT(BaseVideoDataset):
-    def __init__(self, root=None, image_loader=jpeg4py_loader, split=None, multiobj=True):
+    def __init__(self, root=None, image_loader=default_image_loader, split=None, multiobj=True):
         root = env_settings().imagenet_vid_gmot_dir if root is None else root
         super().__init__('ImagenetVIDMOT', root, image_loader)
 
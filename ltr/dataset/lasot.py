@@ -7,7 +7,7 @@ import csv
 import random
 from collections import OrderedDict
 from .base_video_dataset import BaseVideoDataset
-from ltr.data.image_loader import jpeg4py_loader
+from ltr.data.image_loader import default_image_loader
 from ltr.admin.environment import env_settings
 
 
@@ -23,17 +23,21 @@ class Lasot(BaseVideoDataset):
     Download the dataset from https://cis.temple.edu/lasot/download.html
     """
 
-    def __init__(self, root=None, image_loader=jpeg4py_loader, vid_ids=None, split=None, data_fraction=None):
+    def __init__(self, root=None, image_loader=default_image_loader, vid_ids=None, split=None, data_fraction=None,
+                 anno_index_dir=None):
         """
         args:
             root - path to the lasot dataset.
-            image_loader (jpeg4py_loader) -  The function to read the images. jpeg4py (https://github.com/ajkxyz/jpeg4py)
-                                            is used by default.
+            image_loader (default_image_loader) -  The function to read the images. The fastest available decoder
+                                            is used by default, see ltr.data.image_loader.
             vid_ids - List containing the ids of the videos (1 - 20) used for training. If vid_ids = [1, 3, 5], then the
                     videos with subscripts -1, -3, and -5 from each class will be used for training.
             split - If split='train', the official train split (protocol-II) is used for training. Note: Only one of
                     vid_ids or split option can be used at a time.
             data_fraction - Fraction of dataset to be used. The complete dataset is used by default
+            anno_index_dir - Directory of the memory-mapped annotation index (see ltr.dataset.annotation_index). If
+                            None, env_settings().anno_index_dir is used. The annotations are parsed from the text files
+                            if neither is set.
         """
         root = env_settings().lasot_dir if root is None else root
         super().__init__('LaSOT', root, image_loader)
@@ -43,6 +47,7 @@ class Lasot(BaseVideoDataset):
         self.class_to_id = {cls_name: cls_id for cls_id, cls_name in enumerate(self.class_list)}
 
         self.sequence_list = self._build_sequence_list(vid_ids, split)
+        self.anno_index = self._load_anno_index(self.sequence_list, anno_index_dir)
 
         if data_fraction is not None:
             self.sequence_list = random.sample(self.sequence_list, int(len(self.sequence_list)*data_fraction))
@@ -115,18 +120,32 @@ class Lasot(BaseVideoDataset):
         return target_visible
 
     def _get_sequence_path(self, seq_id):
-        seq_name = self.sequence_list[seq_id]
+        return self._get_sequence_path_from_name(self.sequence_list[seq_id])
+
+    def _get_sequence_path_from_name(self, seq_name):
         class_name = seq_name.split('-')[0]
         vid_id = seq_name.split('-')[1]
 
         return os.path.join(self.root, class_name, class_name + '-' + vid_id)
 
+    def _sequence_anno_files(self, seq_name):
+        seq_path = self._get_sequence_path_from_name(seq_name)
+        return [os.path.join(seq_path, f) for f in ('groundtruth.txt', 'full_occlusion.txt', 'out_of_view.txt')]
+
+    def _read_sequence_anno(self, seq_name):
+        seq_path = self._get_sequence_path_from_name(seq_name)
+        return {'bbox': self._read_bb_anno(seq_path), 'visible': self._read_target_visible(seq_path)}
+
     def get_sequence_info(self, seq_id):
-        seq_path = self._get_sequence_path(seq_id)
-        bbox = self._read_bb_anno(seq_path)
+        seq_name = self.sequence_list[seq_id]
+        if self.anno_index is not None:
+            anno = self.anno_index.get_annotations(seq_name)
+        else:
+            anno = self._read_sequence_anno(seq_name)
+        bbox = anno['bbox']
 
         valid = (bbox[:, 2] > 0) & (bbox[:, 3] > 0)
-        visible = self._read_target_visible(seq_path) & valid.byte()
+        visible = anno['visible'] & valid.byte()
 
         return {'bbox': bbox, 'valid': valid, 'visible': visible}
 
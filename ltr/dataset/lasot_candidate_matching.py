@@ -8,25 +8,33 @@ import csv
 import random
 from collections import OrderedDict, defaultdict
 from ltr.dataset.base_video_dataset import BaseVideoDataset
-from ltr.data.image_loader import jpeg4py_loader
+from ltr.data.image_loader import default_image_loader
 from ltr.admin.environment import env_settings
+from ltr.dataset.feature_store import FeatureStore
+from ltr.dataset.sequence_records import SequenceRecordReader, index_path
 
 
 class LasotCandidateMatching(BaseVideoDataset):
     """ LaSOT dataset dumped results during tracking super_dimp_hinge.
     """
 
-    def __init__(self, root=None, path_to_json=None, image_loader=jpeg4py_loader, vid_ids=None, split=None, data_fraction=None):
+    def __init__(self, root=None, path_to_json=None, image_loader=default_image_loader, vid_ids=None, split=None, data_fraction=None,
+                 feature_store=None):
         """
         args:
             root - path to the lasot candidate matching dataset json file.
-            image_loader (jpeg4py_loader) -  The function to read the images. jpeg4py (https://github.com/ajkxyz/jpeg4py)
-                                            is used by default.
+            path_to_json - The candidate matching dataset, either a json file or a record file written by
+                           pytracking/util_scripts/create_distractor_dataset.py, whose sequences are loaded lazily.
+            image_loader (default_image_loader) -  The function to read the images. The fastest available decoder
+                                            is used by default, see ltr.data.image_loader.
             vid_ids - List containing the ids of the videos (1 - 20) used for training. If vid_ids = [1, 3, 5], then the
                     videos with subscripts -1, -3, and -5 from each class will be used for training.
             split - If split='train', the official train split (protocol-II) is used for training. Note: Only one of
                     vid_ids or split option can be used at a time.
             data_fraction - Fraction of dataset to be used. The complete dataset is used by default
+            feature_store - FeatureStore, or path to it, containing the precomputed backbone features of the search
+                            areas, see ltr/run_precompute_features.py. If set, the features are returned instead of the
+                            images.
         """
         root = env_settings().lasot_dir if root is None else root
         path_to_json = env_settings().lasot_candidate_matching_dataset_path if path_to_json is None else path_to_json
@@ -47,17 +55,31 @@ class LasotCandidateMatching(BaseVideoDataset):
 
         self.dataset = self._load_dataset(path_to_json)
 
+        self.feature_store = None
+        if feature_store is not None:
+            self.use_feature_store(feature_store)
+
     def _load_dataset(self, path):
+        # Record files written by create_distractor_dataset.py are loaded lazily, only the states are read here
+        if os.path.exists(index_path(path)):
+            return SequenceRecordReader(path)
+
         with open(path, 'r') as f:
             data = json.load(f)
         return data
 
+    def _get_sequence_states(self, seq_name):
+        if isinstance(self.dataset, SequenceRecordReader):
+            return self.dataset.get_states(seq_name)
+        return self.dataset[seq_name]
+
     def get_frame_states(self):
         frame_states_all = defaultdict(list)
 
         for seq_id, seq_name in enumerate(self.sequence_list):
-            if 'frame_states' in self.dataset[seq_name]:
-                for frame_state_name, frame_state_indices in self.dataset[seq_name]['frame_states'].items():
+            seq_states = self._get_sequence_states(seq_name)
+            if seq_states.get('frame_states'):
+                for frame_state_name, frame_state_indices in seq_states['frame_states'].items():
                     frame_state_indices = torch.tensor(frame_state_indices).view(-1, 1)
                     seq_ids = seq_id * torch.ones_like(frame_state_indices).view(-1, 1)
                     data = torch.cat([seq_ids, frame_state_indices], dim=1)
@@ -68,12 +90,32 @@ class LasotCandidateMatching(BaseVideoDataset):
 
         return frame_states_all
 
+    def get_state_frames(self):
+        """ Returns the sorted list of (seq_id, frame_id) of all frames used by the frame and subsequence states. """
+        frames = set()
+        for states in self.get_frame_states().values():
+            frames.update((int(s), int(f)) for s, f in states.tolist())
+        for states in self.get_subseq_states().values():
+            for s, f in states.tolist():
+                frames.update([(int(s), int(f)), (int(s), int(f) + 1)])
+        return sorted(frames)
+
+    def use_feature_store(self, feature_store):
+        """ Returns the precomputed backbone features of the search areas instead of the images.
+        args:
+            feature_store - FeatureStore, or path to it.
+        """
+        if isinstance(feature_store, str):
+            feature_store = FeatureStore(feature_store)
+        self.feature_store = feature_store
+
     def get_subseq_states(self):
         subseq_states_all = defaultdict(list)
 
         for seq_id, seq_name in enumerate(self.sequence_list):
-            if 'subseq_states' in self.dataset[seq_name]:
-                for subseq_state_name, subseq_state_indices in self.dataset[seq_name]['subseq_states'].items():
+            seq_states = self._get_sequence_states(seq_name)
+            if seq_states.get('subseq_states'):
+                for subseq_state_name, subseq_state_indices in seq_states['subseq_states'].items():
                     subseq_state_indices = torch.tensor(subseq_state_indices).view(-1, 1)
                     seq_ids = seq_id * torch.ones_like(subseq_state_indices).view(-1, 1)
                     data = torch.cat([seq_ids, subseq_state_indices], dim=1)
@@ -194,10 +236,26 @@ class LasotCandidateMatching(BaseVideoDataset):
         target_candidate_coords = torch.FloatTensor(data['target_candidate_coords'][idx])
         target_anno_coord = torch.FloatTensor(data['target_anno_coord'][idx])
 
-        img = self.image_loader(self._get_frame_path(seq_img_path, frame_id))
+        frame_data = dict(search_area_box=search_area_box, target_anno_coord=target_anno_coord,
+                          target_candidate_coords=target_candidate_coords,
+                          target_candidate_scores=target_candidate_scores)
 
-        return dict(search_area_box=search_area_box, img=img, target_anno_coord=target_anno_coord,
-                    target_candidate_coords=target_candidate_coords, target_candidate_scores=target_candidate_scores)
+        if self.feature_store is not None:
+            key = FeatureStore.get_key(self.get_sequence_name(seq_id), frame_id)
+            frame_data['features'] = self.feature_store.get_features(key)
+            frame_data['feature_boxes'] = torch.from_numpy(self.feature_store.get_boxes(key))
+            frame_data['img_shape'] = self.feature_store.get_image_size(key)
+        else:
+            frame_data['img'] = self.image_loader(self._get_frame_path(seq_img_path, frame_id))
+
+        return frame_data
+
+    def get_search_area(self, seq_id, frame_id):
+        """ Returns the image and the dumped search area box of a frame. """
+        data = self.dataset[self.get_sequence_name(seq_id)]
+        search_area_box = torch.FloatTensor(data['search_area_box'][data['index'].index(frame_id)])
+        seq_path_img = self._get_sequence_path(env_settings().lasot_dir, seq_id)
+        return self.image_loader(self._get_frame_path(seq_path_img, frame_id)), search_area_box
 
     def get_class_name(self, seq_id):
         seq_path = self._get_sequence_path(self.root, seq_id)
@@ -1,6 +1,6 @@
 import os
 from .base_image_dataset import BaseImageDataset
-from ltr.data.image_loader import jpeg4py_loader_w_failsafe
+from ltr.data.image_loader import default_image_loader
 import torch
 import random
 import lvis.lvis as lvis_pk
@@ -30,12 +30,12 @@ class LVIS(BaseImageDataset):
     Note: You also have to install the lvis Python API from https://github.com/lvis-dataset/lvis-api
     """
 
-    def __init__(self, root=None, image_loader=jpeg4py_loader_w_failsafe, data_fraction=None, min_area=None, split="train"):
+    def __init__(self, root=None, image_loader=default_image_loader, data_fraction=None, min_area=None, split="train"):
         """
         args:
             root - path to lvis root folder
-            image_loader (jpeg4py_loader) - The function to read the images. jpeg4py (https://github.com/ajkxyz/jpeg4py)
-                                            is used by default.
+            image_loader (default_image_loader) - The function to read the images. The fastest available decoder
+                                            is used by default, see ltr.data.image_loader.
             data_fraction - Fraction of dataset to be used. The complete dataset is used by default
             min_area - Objects with area less than min_area are filtered out. Default is 0.0
             split - 'train' or 'val'.
@@ -0,0 +1,197 @@
+import os
+import multiprocessing
+import numpy as np
+from ltr.data.image_loader import imread_indexed
+from ltr.dataset.array_store import ArrayStore, write_store
+
+
+def encode_labels(labels):
+    """ Run-length encodes each object of a label image, in row-major order.
+    args:
+        labels - Label image (H, W). 0 is the background.
+    returns:
+        list - (object id, runs, bbox) for each object. runs is an int32 array (num_runs, 2) of start index in the
+               flattened image and run length. bbox is [x, y, w, h], with w and h counted in pixels.
+    """
+    labels = np.asarray(labels)
+    h, w = labels.shape[:2]
+    flat = labels.reshape(-1)
+
+    objects = []
+    for obj_id in np.unique(flat):
+        if obj_id == 0:
+            continue
+        mask = np.concatenate(([False], flat == obj_id, [False])).view(np.int8)
+        d = np.diff(mask)
+        starts = np.nonzero(d == 1)[0]
+        ends = np.nonzero(d == -1)[0]
+        runs = np.stack((starts, ends - starts), axis=1).astype(np.int32)
+
+        # Rows and columns covered by the runs
+        rows = np.concatenate((starts // w, (ends - 1) // w))
+        if np.any(starts // w != (ends - 1) // w):
+            # A run spans several rows, and thus covers all columns
+            x0, x1 = 0, w - 1
+        else:
+            x0, x1 = int((starts % w).min()), int(((ends - 1) % w).max())
+        y0, y1 = int(rows.min()), int(rows.max())
+
+        objects.append((int(obj_id), runs, [x0, y0, x1 - x0 + 1, y1 - y0 + 1]))
+    return objects
+
+
+def _encode_sequence(args):
+    """ Encodes all label images of a sequence directory. Module level function, such that it can be run in a process
+    pool. """
+    anno_root, seq = args
+    seq_dir = os.path.join(anno_root, seq)
+    frames = []
+    for name in sorted(f for f in os.listdir(seq_dir) if f.endswith('.png')):
+        labels = imread_indexed(os.path.join(seq_dir, name))
+        frames.append(('{}/{}'.format(seq, os.path.splitext(name)[0]), labels.shape[:2], encode_labels(labels)))
+    return frames
+
+
+class MaskStore(ArrayStore):
+    """ Memory-mapped store of run-length encoded segmentation masks, written by MaskStore.build or convert_masks.
+
+    The masks of each frame are stored per object, such that only the requested objects, and optionally only a range
+    of rows, are decoded. The bounding box of each object is stored as well. The frames are identified by the key
+    '<sequence>/<annotation file stem>'. The store directory contains
+        meta.json - keys of the frames
+        frames.npy - int64 array (num_frames x 4) containing height, width, first object and number of objects
+        objects.npy - int64 array (num_objects x 7) containing object id, first run, number of runs and bbox [x, y, w, h]
+        runs.npy - int32 array (num_runs x 2) containing start index in the flattened frame and length of each run
+    """
+    store_name = 'Mask store'
+    version = 1
+    array_names = ('frames', 'objects', 'runs')
+
+    def _load_meta(self, meta):
+        self.keys = meta['keys']
+        self._key_to_id = {key: i for i, key in enumerate(self.keys)}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self._key_to_id
+
+    def _frame_objects(self, key):
+        height, width, obj_start, num_objs = (int(v) for v in self.frames[self._key_to_id[key]])
+        return height, width, self.objects[obj_start:obj_start + num_objs]
+
+    def get_shape(self, key):
+        height, width, _ = self._frame_objects(key)
+        return height, width
+
+    def get_object_ids(self, key):
+        return [int(o) for o in self._frame_objects(key)[2][:, 0]]
+
+    def get_bboxes(self, key):
+        """ Returns a dict mapping the object ids of the frame to their bounding box [x, y, w, h]. """
+        return {int(o[0]): [int(v) for v in o[3:7]] for o in self._frame_objects(key)[2]}
+
+    def get_labels(self, key, obj_ids=None, rows=None):
+        """ Decodes the label image of a frame.
+        args:
+            key - Frame key, '<sequence>/<annotation file stem>'
+            obj_ids - Ids of the objects to decode. The other objects are set to background. All objects if None.
+            rows - (first, last + 1) range of rows to decode. All rows if None.
+        returns:
+            np.array - uint8 label image (num_rows, width)
+        """
+        height, width, objects = self._frame_objects(key)
+        r0, r1 = (0, height) if rows is None else (max(int(rows[0]), 0), min(int(rows[1]), height))
+        r1 = max(r1, r0)
+        lo, hi = r0 * width, r1 * width
+
+        labels = np.zeros(hi - lo, dtype=np.uint8)
+        if obj_ids is not None:
+            obj_ids = set(int(o) for o in obj_ids)
+
+        for obj_id, run_start, num_runs in objects[:, :3]:
+            if obj_ids is not None and int(obj_id) not in obj_ids:
+                continue
+
+            runs = self.runs[run_start:run_start + num_runs]
+            starts = runs[:, 0].astype(np.int64)
+            ends = starts + runs[:, 1]
+
+            # Runs overlapping the rows, clipped to them
+            first, last = np.searchsorted(ends, lo, side='right'), np.searchsorted(starts, hi, side='left')
+            starts = np.clip(starts[first:last], lo, hi) - lo
+            ends = np.clip(ends[first:last], lo, hi) - lo
+
+            # Runs of an object never touch, so each position is either a start or an end
+            d = np.zeros(hi - lo + 1, dtype=np.int8)
+            d[starts] = 1
+            d[ends] = -1
+            labels[np.cumsum(d[:-1], dtype=np.int8).astype(bool)] = obj_id
+
+        return labels.reshape(r1 - r0, width)
+
+    @staticmethod
+    def build(path, frames):
+        """ Writes a store, see write_store.
+        args:
+            path - Output directory
+            frames - Iterable of (key, (height, width), objects) tuples, with objects as returned by encode_labels.
+        returns:
+            MaskStore - the opened store
+        """
+        keys, frame_rows, object_rows, runs = [], [], [], []
+        num_objects = 0
+        num_runs = 0
+
+        for key, (height, width), objects in frames:
+            keys.append(key)
+            frame_rows.append((height, width, num_objects, len(objects)))
+            for obj_id, obj_runs, bbox in objects:
+                object_rows.append([obj_id, num_runs, len(obj_runs)] + list(bbox))
+                runs.append(obj_runs)
+                num_runs += len(obj_runs)
+            num_objects += len(objects)
+
+        with write_store(path) as tmp_path:
+            np.save(os.path.join(tmp_path, 'frames.npy'), np.array(frame_rows, dtype=np.int64).reshape(-1, 4))
+            np.save(os.path.join(tmp_path, 'objects.npy'), np.array(object_rows, dtype=np.int64).reshape(-1, 7))
+            np.save(os.path.join(tmp_path, 'runs.npy'),
+                    np.concatenate(runs, axis=0) if runs else np.zeros((0, 2), dtype=np.int32))
+            MaskStore.write_meta(tmp_path, keys=keys)
+
+        return MaskStore(path)
+
+
+def convert_masks(anno_root, out_path, sequences=None, num_workers=None, verbose=True):
+    """ Converts the indexed png annotations of a VOS dataset, stored as anno_root/<sequence>/<frame>.png, into a
+    MaskStore. Works for e.g. DAVIS, YouTube-VOS, LaSOT-VOS and GOT10k-VOS.
+    args:
+        anno_root - Annotation directory, containing a directory per sequence.
+        out_path - Output directory of the store.
+        sequences - Sequences to convert. All directories in anno_root if None.
+        num_workers - Number of processes. Defaults to the number of cpus.
+    """
+    if sequences is None:
+        sequences = sorted(d for d in os.listdir(anno_root) if os.path.isdir(os.path.join(anno_root, d)))
+
+    if num_workers is None:
+        num_workers = os.cpu_count() or 1
+
+    args = [(anno_root, seq) for seq in sequences]
+
+    def encoded_frames(results):
+        for seq_num, frames in enumerate(results):
+            yield from frames
+            if verbose and (seq_num + 1) % 100 == 0:
+                print('Converted {} / {} sequences'.format(seq_num + 1, len(sequences)))
+
+    if num_workers <= 1:
+        store = MaskStore.build(out_path, encoded_frames(map(_encode_sequence, args)))
+    else:
+        with multiprocessing.get_context('spawn').Pool(num_workers) as pool:
+            store = MaskStore.build(out_path, encoded_frames(pool.imap(_encode_sequence, args, chunksize=4)))
+
+    if verbose:
+        print('Converted {} frames into {}'.format(len(store), out_path))
+    return store
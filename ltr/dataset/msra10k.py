@@ -1,6 +1,6 @@
 import os
 from .base_image_dataset import BaseImageDataset
-from ltr.data.image_loader import jpeg4py_loader, imread_indexed
+from ltr.data.image_loader import default_image_loader, imread_indexed
 import torch
 from collections import OrderedDict
 from ltr.admin.environment import env_settings
@@ -20,12 +20,12 @@ class MSRA10k(BaseImageDataset):
     Download dataset from https://mmcheng.net/msra10k/
     """
 
-    def __init__(self, root=None, image_loader=jpeg4py_loader, data_fraction=None, min_area=None):
+    def __init__(self, root=None, image_loader=default_image_loader, data_fraction=None, min_area=None):
         """
         args:
             root - path to MSRA10k root folder
-            image_loader (jpeg4py_loader) - The function to read the images. jpeg4py (https://github.com/ajkxyz/jpeg4py)
-                                            is used by default.
+            image_loader (default_image_loader) - The function to read the images. The fastest available decoder
+                                            is used by default, see ltr.data.image_loader.
             data_fraction - Fraction of dataset to be used. The complete dataset is used by default
             min_area - Objects with area less than min_area are filtered out. Default is 0.0
         """
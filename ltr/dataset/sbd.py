@@ -1,5 +1,5 @@
 from .base_image_dataset import BaseImageDataset
-from ltr.data.image_loader import jpeg4py_loader_w_failsafe
+from ltr.data.image_loader import default_image_loader
 import torch
 from collections import OrderedDict
 import os
@@ -21,12 +21,12 @@ class SBD(BaseImageDataset):
 
     Download dataset from: http://home.bharathh.info/pubs/codes/SBD/download.html
     """
-    def __init__(self, root=None, image_loader=jpeg4py_loader_w_failsafe, data_fraction=None, split="train"):
+    def __init__(self, root=None, image_loader=default_image_loader, data_fraction=None, split="train"):
         """
         args:
             root - path to SBD root folder
-            image_loader - The function to read the images. jpeg4py (https://github.com/ajkxyz/jpeg4py)
-                           is used by default.
+            image_loader - The function to read the images. The fastest available decoder
+                           is used by default, see ltr.data.image_loader.
             data_fraction - Fraction of dataset to be used. The complete dataset is used by default
             split - dataset split ("train", "train_noval", "val")
         """
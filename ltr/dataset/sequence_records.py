@@ -0,0 +1,159 @@
+import os
+import json
+from collections import OrderedDict
+
+
+def index_path(path):
+    """ Path of the index of a record file. """
+    return path + '.index'
+
+
+def _read_index(path):
+    """ Reads the index entries of a record file. An incomplete last entry, written while the writer was interrupted,
+    is ignored.
+    returns:
+        list - index entries
+        int - size in bytes of the complete entries
+    """
+    entries = []
+    size = 0
+    if not os.path.exists(index_path(path)):
+        return entries, size
+
+    with open(index_path(path), 'rb') as f:
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            try:
+                entries.append(json.loads(line.decode('utf-8')))
+            except ValueError:
+                break
+            size += len(line)
+    return entries, size
+
+
+class SequenceRecordWriter:
+    """ Appends one record per sequence to a record file, e.g. the candidate data of a sequence of the distractor
+    dataset used to train KeepTrack. The records are written as one json line each to path, and an index entry
+    containing the name, byte range and frame and subsequence states of each sequence is appended to path.index after
+    the record is written. Records which are not in the index, e.g. since the writer was interrupted, are discarded
+    when the file is re-opened, such that the generation can be resumed. See SequenceRecordReader. """
+
+    def __init__(self, path):
+        """
+        args:
+            path - Record file. Existing records are kept.
+        """
+        self.path = path
+        entries, index_size = _read_index(path)
+        self.names = set(e['name'] for e in entries)
+        end = max((e['offset'] + e['length'] for e in entries), default=0)
+
+        # Remove incomplete records and index entries
+        mode = 'r+b' if os.path.exists(path) else 'w+b'
+        self._file = open(path, mode)
+        self._file.truncate(end)
+        self._file.seek(end)
+
+        mode = 'r+b' if os.path.exists(index_path(path)) else 'w+b'
+        self._index_file = open(index_path(path), mode)
+        self._index_file.truncate(index_size)
+        self._index_file.seek(index_size)
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def __len__(self):
+        return len(self.names)
+
+    def append(self, name, seq_data):
+        """ Appends the record of a sequence. The record is flushed to disk before it is added to the index. """
+        if name in self.names:
+            raise ValueError('The record file already contains the sequence {}.'.format(name))
+
+        record = (json.dumps(seq_data) + '\n').encode('utf-8')
+        offset = self._file.tell()
+        self._file.write(record)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+        entry = {'name': name, 'offset': offset, 'length': len(record),
+                 'frame_states': seq_data.get('frame_states', {}), 'subseq_states': seq_data.get('subseq_states', {})}
+        self._index_file.write((json.dumps(entry) + '\n').encode('utf-8'))
+        self._index_file.flush()
+        os.fsync(self._index_file.fileno())
+
+        self.names.add(name)
+
+    def close(self):
+        self._file.close()
+        self._index_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class SequenceRecordReader:
+    """ Reads a record file written by SequenceRecordWriter. Only the index, containing the frame and subsequence
+    states, is loaded when opened. The record of a sequence is loaded when it is accessed, and the most recently used
+    records are cached. The reader can be indexed by the sequence name like the dict of the json dataset files. """
+
+    def __init__(self, path, cache_size=64):
+        """
+        args:
+            path - Record file.
+            cache_size - Number of records kept in memory.
+        """
+        if not os.path.exists(index_path(path)):
+            raise RuntimeError('The record file {} has no index.'.format(path))
+
+        self.path = path
+        self.cache_size = cache_size
+        entries, _ = _read_index(path)
+        self._index = {e['name']: e for e in entries}
+
+        self._file = None
+        self._pid = None
+        self._cache = OrderedDict()
+
+    def __getstate__(self):
+        # Each worker process opens the file itself
+        state = self.__dict__.copy()
+        state['_file'] = None
+        state['_pid'] = None
+        state['_cache'] = OrderedDict()
+        return state
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def keys(self):
+        return self._index.keys()
+
+    def get_states(self, name):
+        """ Returns the frame and subsequence states of a sequence, without loading its record. """
+        entry = self._index[name]
+        return {'frame_states': entry['frame_states'], 'subseq_states': entry['subseq_states']}
+
+    def __getitem__(self, name):
+        if name in self._cache:
+            self._cache.move_to_end(name)
+            return self._cache[name]
+
+        entry = self._index[name]
+        if self._file is None or self._pid != os.getpid():
+            self._file = open(self.path, 'rb')
+            self._pid = os.getpid()
+        self._file.seek(entry['offset'])
+        seq_data = json.loads(self._file.read(entry['length']).decode('utf-8'))
+
+        self._cache[name] = seq_data
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return seq_data
@@ -1,6 +1,6 @@
 import os
 from .base_video_dataset import BaseVideoDataset
-from ltr.data.image_loader import jpeg4py_loader
+from ltr.data.image_loader import default_image_loader
 import json
 import torch
 from collections import OrderedDict
@@ -8,7 +8,7 @@ from ltr.admin.environment import env_settings
 
 
 class TAOBURST(BaseVideoDataset):
-    def __init__(self, root=None, image_loader=jpeg4py_loader, split=None, multiobj=True):
+    def __init__(self, root=None, image_loader=default_image_loader, split=None, multiobj=True):
         root = env_settings().tao_burst_dir if root is None else root
         super().__init__('TAOBURST', root, image_loader)
 
@@ -6,7 +6,7 @@ import pandas
 import random
 from collections import OrderedDict
 
-from ltr.data.image_loader import jpeg4py_loader
+from ltr.data.image_loader import default_image_loader
 from .base_video_dataset import BaseVideoDataset
 from ltr.admin.environment import env_settings
 
@@ -43,15 +43,18 @@ class TrackingNet(BaseVideoDataset):
 
     Download the dataset using the toolkit https://github.com/SilvioGiancola/TrackingNet-devkit.
     """
-    def __init__(self, root=None, image_loader=jpeg4py_loader, set_ids=None, data_fraction=None):
+    def __init__(self, root=None, image_loader=default_image_loader, set_ids=None, data_fraction=None, anno_index_dir=None):
         """
         args:
             root        - The path to the TrackingNet folder, containing the training sets.
-            image_loader (jpeg4py_loader) -  The function to read the images. jpeg4py (https://github.com/ajkxyz/jpeg4py)
-                                            is used by default.
+            image_loader (default_image_loader) -  The function to read the images. The fastest available decoder
+                                            is used by default, see ltr.data.image_loader.
             set_ids (None) - List containing the ids of the TrackingNet sets to be used for training. If None, all the
                             sets (0 - 11) will be used.
             data_fraction - Fraction of dataset to be used. The complete dataset is used by default
+            anno_index_dir - Directory of the memory-mapped annotation index (see ltr.dataset.annotation_index). If
+                            None, env_settings().anno_index_dir is used. The annotations are parsed from the text files
+                            if neither is set.
         """
         root = env_settings().trackingnet_dir if root is None else root
         super().__init__('TrackingNet', root, image_loader)
@@ -64,6 +67,8 @@ class TrackingNet(BaseVideoDataset):
         # Keep a list of all videos. Sequence list is a list of tuples (set_id, video_name) containing the set_id and
         # video_name for each sequence
         self.sequence_list = list_sequences(self.root, self.set_ids)
+        self.anno_index = self._load_anno_index([self._get_sequence_name(seq) for seq in self.sequence_list],
+                                                anno_index_dir)
 
         if data_fraction is not None:
             self.sequence_list = random.sample(self.sequence_list, int(len(self.sequence_list) * data_fraction))
@@ -100,7 +105,25 @@ class TrackingNet(BaseVideoDataset):
     def get_sequences_in_class(self, class_name):
         return self.seq_per_class[class_name]
 
+    @staticmethod
+    def _get_sequence_name(seq):
+        return 'TRAIN_{}/{}'.format(seq[0], seq[1])
+
+    def _sequence_anno_files(self, seq_name):
+        set_name, vid_name = seq_name.split('/')
+        return [os.path.join(self.root, set_name, "anno", vid_name + ".txt")]
+
+    def _read_sequence_anno(self, seq_name):
+        set_name, vid_name = seq_name.split('/')
+        bb_anno_file = os.path.join(self.root, set_name, "anno", vid_name + ".txt")
+        gt = pandas.read_csv(bb_anno_file, delimiter=',', header=None, dtype=np.float32, na_filter=False,
+                             low_memory=False).values
+        return {'bbox': torch.tensor(gt)}
+
     def _read_bb_anno(self, seq_id):
+        if self.anno_index is not None:
+            return self.anno_index.get_annotations(self._get_sequence_name(self.sequence_list[seq_id]))['bbox']
+
         set_id = self.sequence_list[seq_id][0]
         vid_name = self.sequence_list[seq_id][1]
         bb_anno_file = os.path.join(self.root, "TRAIN_" + str(set_id), "anno", vid_name + ".txt")
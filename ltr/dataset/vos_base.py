@@ -2,12 +2,16 @@ import torch
 from pathlib import Path
 from collections import OrderedDict, defaultdict
 import json
+import hashlib
 import numpy as np
 import os
+import multiprocessing
 
 from .base_video_dataset import BaseVideoDataset
-from ltr.data.image_loader import jpeg4py_loader, imread_indexed
+from ltr.data.image_loader import default_image_loader, imread_indexed
 from ltr.data.bounding_box_utils import masks_to_bboxes
+from ltr.dataset.mask_store import MaskStore
+from ltr.admin import distributed
 
 
 class VOSMeta:
@@ -20,8 +24,12 @@ class VOSMeta:
             raise ValueError("Must set either data or filename parameter")
 
     def save(self, gen_meta: Path):
+        # Written to a temporary file first, such that a concurrent reader never sees a partially written file
         gen_meta.parent.mkdir(exist_ok=True, parents=True)
-        json.dump(self._data, open(gen_meta, "w"))
+        tmp_path = gen_meta.with_name('{}.{}.tmp'.format(gen_meta.name, os.getpid()))
+        with open(tmp_path, "w") as f:
+            json.dump(self._data, f)
+        os.replace(tmp_path, gen_meta)
 
     def load(self, gen_meta: Path):
         if not gen_meta.exists():
@@ -31,12 +39,17 @@ class VOSMeta:
         self._data = json.load(open(gen_meta), object_pairs_hook=OrderedDict)
 
     @classmethod
-    def generate(cls, dset_name: str, dset_images_path: Path, dset_annos_path: Path):
+    def generate(cls, dset_name: str, dset_images_path: Path, dset_annos_path: Path, num_workers=None,
+                 previous=None):
         """
         Count the annotation mask pixels per object, per frame, in all sequences in a dataset
         :param dset_name:        Dataset name, for printing the progress bar.
         :param dset_annos_path:  Path to annotations directory, containing sequence directories,
                                  with annotation frames in them.
+        :param num_workers:      Number of processes the sequences are distributed over. Defaults to the number of
+                                 cpus. The sequences are processed in the current process if 0.
+        :param previous:         Previously generated VOSMeta. Only the sequences whose annotation or image directory
+                                 changed since are processed again, see _sequence_signature.
 
         :return: Dataset meta dict:
 
@@ -58,8 +71,18 @@ class VOSMeta:
         """
         assert(dset_annos_path.exists())
 
-        dset_meta = OrderedDict()
         sequences = [p.stem for p in sorted(dset_annos_path.glob("*")) if p.is_dir()]
+        signatures = {seq: _sequence_signature(dset_images_path, dset_annos_path, seq) for seq in sequences}
+
+        dset_meta = OrderedDict()
+        previous_meta = previous._data if previous is not None else {}
+        for seq in sequences:
+            if seq in previous_meta:
+                # Entries generated before the signatures were recorded are assumed to be up to date
+                if previous_meta[seq].get('signature', signatures[seq]) == signatures[seq]:
+                    dset_meta[seq] = previous_meta[seq]
+                    dset_meta[seq]['signature'] = signatures[seq]
+        to_process = [seq for seq in sequences if seq not in dset_meta]
 
         try:
             from tqdm import tqdm
@@ -67,42 +90,88 @@ class VOSMeta:
             def tqdm(x, *args, **kwargs):
                 return x
 
-        for seq in tqdm(sequences, desc=dset_name, unit="seq"):
+        if num_workers is None:
+            num_workers = os.cpu_count() or 1
+        num_workers = min(num_workers, len(to_process))
 
-            obj_sizes2 = defaultdict(OrderedDict)
-            bboxes = defaultdict(OrderedDict)
-            shape = None
-            frame_names = [file.stem for file in sorted((dset_images_path / seq).glob("*.jpg"))]
-            anno_paths = list(sorted((dset_annos_path / seq).glob("*.png")))
+        args = [(dset_images_path, dset_annos_path, seq) for seq in to_process]
+        if num_workers <= 1:
+            results = [_generate_sequence_meta(a) for a in tqdm(args, desc=dset_name, unit="seq")]
+        else:
+            with multiprocessing.get_context('spawn').Pool(num_workers) as pool:
+                results = list(tqdm(pool.imap(_generate_sequence_meta, args, chunksize=4),
+                                    total=len(args), desc=dset_name, unit="seq"))
 
-            # Extract information from the given label frames
-            for path in anno_paths:
-                f_id = path.stem
+        for seq, seq_meta in zip(to_process, results):
+            seq_meta['signature'] = signatures[seq]
+            dset_meta[seq] = seq_meta
 
-                # Count label-pixels per frame
-                labels = imread_indexed(path)
-                # labels = np.array(Image.open(path))
-                obj_ids, obj_sizes = np.unique(labels, return_counts=True)
-                obj_ids = [str(oid) for oid in obj_ids]
-                obj_sizes = obj_sizes.tolist()
+        # Keep the order of the sequences
+        dset_meta = OrderedDict((seq, dset_meta[seq]) for seq in sequences)
+        meta = VOSMeta(dset_meta)
+        meta.num_updated = len(to_process)
+        return meta
 
-                if '0' in obj_ids:  # Remove background id
-                    obj_ids = obj_ids[1:]
-                    obj_sizes = obj_sizes[1:]
-                obj_sizes2[f_id] = OrderedDict(zip(obj_ids, obj_sizes))
+    @classmethod
+    def load_or_generate(cls, meta_path: Path, dset_name: str, dset_images_path: Path, dset_annos_path: Path,
+                         num_workers=None, update=False):
+        """ Loads the generated meta from meta_path, or generates and saves it if it does not exist. If update is
+        True, the sequences which changed on disk are processed again, as well as the new ones, and the file is only
+        rewritten if a sequence was added, removed or changed. In distributed training, only the main process
+        generates the meta, and the others load it once it is saved. If the file can not be written, e.g. in a read-only
+        dataset directory, the generated meta is used without saving it. """
+        exists = meta_path.exists()
+        # All processes must see the same state, before the main process may create the file
+        distributed.barrier()
+
+        previous = VOSMeta(filename=meta_path) if exists else None
+        if previous is not None and not update:
+            return previous
+
+        meta = None
+        if distributed.is_main_process():
+            meta = cls.generate(dset_name, dset_images_path, dset_annos_path, num_workers, previous)
+            if previous is None or meta.num_updated > 0 or set(meta._data.keys()) != set(previous._data.keys()):
+                try:
+                    meta.save(meta_path)
+                except OSError as e:
+                    print('Could not save the generated metadata to {}: {}'.format(meta_path, e))
+        distributed.barrier()
+
+        if meta is None:
+            if meta_path.exists():
+                return VOSMeta(filename=meta_path)
+            meta = cls.generate(dset_name, dset_images_path, dset_annos_path, num_workers, previous)
+        return meta
 
-                # Generate per-label bounding boxes
-                for obj_id in obj_ids:
-                    bboxes[f_id][obj_id] = cls._mask_to_bbox(labels == int(obj_id))
+    @staticmethod
+    def _labels_to_meta(labels: np.ndarray):
+        """ Pixel counts and bounding boxes of all objects in a label image, computed in a single pass. Gives the same
+        result as np.unique and _mask_to_bbox per object.
+        :return: (object ids, pixel counts, bboxes [x, y, w, h]), excluding the background label 0
+        """
+        labels = labels.astype(np.int64, copy=False)
+        num_labels = int(labels.max()) + 1
+        h, w = labels.shape[:2]
 
-                if shape is None:
-                    shape = labels.shape[:2]
+        counts = np.bincount(labels.ravel(), minlength=num_labels)
+        obj_ids = np.nonzero(counts)[0]
+        obj_ids = obj_ids[obj_ids != 0]
 
-            # Format result
+        # Columns and rows in which each label occurs
+        in_cols = np.zeros((num_labels, w), dtype=bool)
+        in_rows = np.zeros((num_labels, h), dtype=bool)
+        in_cols[labels, np.arange(w)[None, :]] = True
+        in_rows[labels, np.arange(h)[:, None]] = True
 
-            dset_meta[seq] = dict(shape=shape, obj_sizes=obj_sizes2, bboxes=bboxes, frame_names=frame_names)
+        in_cols, in_rows = in_cols[obj_ids], in_rows[obj_ids]
+        x0 = in_cols.argmax(axis=1)
+        x1 = w - 1 - in_cols[:, ::-1].argmax(axis=1)
+        y0 = in_rows.argmax(axis=1)
+        y1 = h - 1 - in_rows[:, ::-1].argmax(axis=1)
+        bboxes = np.stack((x0, y0, x1 - x0, y1 - y0), axis=1)
 
-        return VOSMeta(dset_meta)
+        return obj_ids.tolist(), counts[obj_ids].tolist(), bboxes.tolist()
 
     @staticmethod
     def _mask_to_bbox(mask: np.ndarray):
@@ -202,12 +271,56 @@ class VOSMeta:
         VOSMeta.generate("SyntheticCoco", src / "JPEGImages", src / "Annotations").save(src / "generated_meta.json")
 
 
+def _sequence_signature(dset_images_path: Path, dset_annos_path: Path, seq):
+    """ Hash of the names, sizes and modification times of the annotation files of a sequence, and the names of its
+    frames. Used to detect the sequences which changed since the meta was generated. """
+    h = hashlib.md5()
+    for entry in sorted(os.scandir(dset_annos_path / seq), key=lambda e: e.name):
+        if entry.name.endswith('.png'):
+            stat = entry.stat()
+            h.update('{} {} {}\n'.format(entry.name, stat.st_size, stat.st_mtime_ns).encode('utf-8'))
+    images_path = dset_images_path / seq
+    if images_path.is_dir():
+        for name in sorted(e.name for e in os.scandir(images_path) if e.name.endswith('.jpg')):
+            h.update('{}\n'.format(name).encode('utf-8'))
+    return h.hexdigest()
+
+
+def _generate_sequence_meta(args):
+    """ Meta of a single sequence, see VOSMeta.generate. Module level function, such that it can be run in a process
+    pool. """
+    dset_images_path, dset_annos_path, seq = args
+
+    obj_sizes = defaultdict(OrderedDict)
+    bboxes = defaultdict(OrderedDict)
+    shape = None
+    frame_names = [file.stem for file in sorted((dset_images_path / seq).glob("*.jpg"))]
+    anno_paths = list(sorted((dset_annos_path / seq).glob("*.png")))
+
+    # Extract information from the given label frames
+    for path in anno_paths:
+        f_id = path.stem
+
+        labels = imread_indexed(path)
+        obj_ids, sizes, boxes = VOSMeta._labels_to_meta(labels)
+        obj_ids = [str(oid) for oid in obj_ids]
+
+        obj_sizes[f_id] = OrderedDict(zip(obj_ids, sizes))
+        for obj_id, box in zip(obj_ids, boxes):
+            bboxes[f_id][obj_id] = box
+
+        if shape is None:
+            shape = labels.shape[:2]
+
+    return dict(shape=shape, obj_sizes=obj_sizes, bboxes=bboxes, frame_names=frame_names)
+
+
 class VOSDatasetBase(BaseVideoDataset):
 
     """ Generic VOS dataset reader base class, for both DAVIS and YouTubeVOS """
 
     def __init__(self, name: str, root: Path, version=None, split='train',
-                 multiobj=True, vis_threshold=10, image_loader=jpeg4py_loader):
+                 multiobj=True, vis_threshold=10, image_loader=default_image_loader):
         """
         :param root:            Dataset root path, eg /path/to/DAVIS or /path/to/YouTubeVOS/
                                 Note: YouTubeVOS 2018 and 2019 are expected to be in
@@ -230,6 +343,14 @@ class VOSDatasetBase(BaseVideoDataset):
         self.split = split
         self.vis_threshold = vis_threshold
         self.multiobj = multiobj
+        self.mask_store = None
+
+    def use_mask_store(self, mask_store):
+        """ Reads the masks from a MaskStore instead of the png annotations. Only the requested objects are decoded.
+        :param mask_store:  MaskStore, or path to a store created with ltr.dataset.mask_store.convert_masks from the
+                            annotation directory of this dataset.
+        """
+        self.mask_store = MaskStore(mask_store) if isinstance(mask_store, str) else mask_store
 
     def _load_image(self, path):
         im = self.image_loader(str(path))
@@ -338,19 +459,24 @@ class VOSDatasetBase(BaseVideoDataset):
         meta = self.get_sequence_info(sample_id) if anno is None else anno
         frame_names = meta['frame_names']
         images = [self._load_image(self._jpeg_path / seq_name / (frame_names[f] + ".jpg")) for f in frame_ids]
-        labels = [self._load_anno(self._anno_path / seq_name / (frame_names[f] + ".png")) for f in frame_ids]
 
-        # Generate bounding boxes for the requested objects
-        bboxes = []
-        for lb in labels:
-            lb = torch.from_numpy(np.array(lb.squeeze()))
-            frame_bbs = {}
-            for obj_id in obj_ids:
-                bbox = masks_to_bboxes(lb == int(obj_id), fmt='t')
-                if bbox[3] == 0 or bbox[2] == 0:
-                    print("!")
-                frame_bbs[obj_id] = bbox
-            bboxes.append(frame_bbs)
+        store_keys = [seq_name + '/' + frame_names[f] for f in frame_ids]
+        if self.mask_store is not None and all(k in self.mask_store for k in store_keys):
+            labels, bboxes = self._load_stored_annos(store_keys, obj_ids)
+        else:
+            labels = [self._load_anno(self._anno_path / seq_name / (frame_names[f] + ".png")) for f in frame_ids]
+
+            # Generate bounding boxes for the requested objects
+            bboxes = []
+            for lb in labels:
+                lb = torch.from_numpy(np.array(lb.squeeze()))
+                frame_bbs = {}
+                for obj_id in obj_ids:
+                    bbox = masks_to_bboxes(lb == int(obj_id), fmt='t')
+                    if bbox[3] == 0 or bbox[2] == 0:
+                        print("!")
+                    frame_bbs[obj_id] = bbox
+                bboxes.append(frame_bbs)
 
         # Insert empty bboxes for missing object ids
         for bbox in bboxes:
@@ -376,6 +502,19 @@ class VOSDatasetBase(BaseVideoDataset):
 
         return images, anno_frames, object_meta
 
+    def _load_stored_annos(self, store_keys, obj_ids):
+        """ Label images and bounding boxes of the requested objects from the mask store. In single object mode, only
+        the requested object is decoded. """
+        labels = [self.mask_store.get_labels(k, None if self.multiobj else obj_ids) for k in store_keys]
+
+        bboxes = []
+        for k in store_keys:
+            stored_bbs = self.mask_store.get_bboxes(k)
+            # Objects which are not in the frame get the same box as from masks_to_bboxes
+            bboxes.append({obj_id: torch.tensor(stored_bbs.get(int(obj_id), [0, 0, 1, 1]), dtype=torch.float32)
+                           for obj_id in obj_ids})
+        return labels, bboxes
+
     def get_name(self):
         return "%s/%s/%s" % (self.name, self.version, self.split)
 
@@ -4,7 +4,7 @@ from ltr.dataset.vos_base import VOSDatasetBase, VOSMeta
 from pytracking.evaluation import Sequence
 import json
 from ltr.admin.environment import env_settings
-from ltr.data.image_loader import jpeg4py_loader
+from ltr.data.image_loader import default_image_loader
 
 
 class YouTubeVOSMeta:
@@ -70,7 +70,7 @@ class YouTubeVOS(VOSDatasetBase):
     Download dataset from: https://youtube-vos.org/dataset/
     """
     def __init__(self, root=None, version='2019', split='train', cleanup=None, all_frames=False, sequences=None,
-                 multiobj=True, vis_threshold=10, image_loader=jpeg4py_loader):
+                 multiobj=True, vis_threshold=10, image_loader=default_image_loader, update_meta=False):
         """
         args:
             root - Dataset root path. If unset, it uses the path in your local.py config.
@@ -87,6 +87,8 @@ class YouTubeVOS(VOSDatasetBase):
                        object in each.
             vis_threshold - Minimum number of pixels required to consider a target object "visible".
             image_loader - Image loader.
+            update_meta - Re-process the sequences which changed since generated_meta.json was generated, see
+                          VOSMeta.load_or_generate.
         """
         root = env_settings().youtubevos_dir if root is None else root
         super().__init__(name="YouTubeVOS", root=Path(root), version=version, split=split, multiobj=multiobj,
@@ -107,11 +109,8 @@ class YouTubeVOS(VOSDatasetBase):
 
         self.meta = YouTubeVOSMeta(dset_path)
         meta_path = dset_path / "generated_meta.json"
-        if meta_path.exists():
-            self.gmeta = VOSMeta(filename=meta_path)
-        else:
-            self.gmeta = VOSMeta.generate('YouTubeVOS', self._jpeg_path, self._anno_path)
-            self.gmeta.save(meta_path)
+        self.gmeta = VOSMeta.load_or_generate(meta_path, 'YouTubeVOS', self._jpeg_path, self._anno_path,
+                                              update=update_meta)
 
         if all_frames:
             self.gmeta.enable_all_frames(self._jpeg_path)
@@ -9,7 +9,7 @@ print = functools.partial(print, flush=True)
 import torch
 import torch.nn.functional as F
 from torch import nn
-import torch.utils.checkpoint as checkpoint
+from ltr.models.layers.checkpoint import checkpoint_block, use_checkpointing
 import numpy as np
 from timm.models.layers import DropPath, to_2tuple, trunc_normal_
 import ltr.admin.settings as env_settings
@@ -380,8 +380,8 @@ class BasicLayer(nn.Module):
 
         for blk in self.blocks:
             blk.H, blk.W = H, W
-            if self.use_checkpoint:
-                x = checkpoint.checkpoint(blk, x, attn_mask)
+            if use_checkpointing(self):
+                x = checkpoint_block(blk, x, attn_mask)
             else:
                 x = blk(x, attn_mask)
         if self.downsample is not None:
@@ -606,7 +606,7 @@ class SwinTransformer(Backbone):
                 p.requires_grad_(False)
 
 
-def swin_base384_flex(output_layers=None, pretrained=False, **kwargs):
+def swin_base384_flex(output_layers=None, pretrained=False, use_checkpoint=False, **kwargs):
     if output_layers is None:
         output_layers = (0, 1, 2, 3)
     else:
@@ -618,7 +618,7 @@ def swin_base384_flex(output_layers=None, pretrained=False, **kwargs):
     model = SwinTransformer(embed_dim=128, depths=[2, 2, 18, 2], num_heads=[4, 8, 16, 32], window_size=12,
                             mlp_ratio=4., qkv_bias=True, qk_scale=None, drop_rate=0., attn_drop_rate=0.,
                             drop_path_rate=0.3, ape=False, patch_norm=True, out_indices=output_layers,
-                            use_checkpoint=False, **kwargs)
+                            use_checkpoint=use_checkpoint, **kwargs)
 
     if pretrained:
         weights_path = os.path.join(env_settings.Settings().env.pretrained_networks,
@@ -1,15 +1,64 @@
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
 import numpy as np
 
-from spatial_correlation_sampler import SpatialCorrelationSampler
+try:
+    from spatial_correlation_sampler import SpatialCorrelationSampler
+except ImportError:
+    SpatialCorrelationSampler = None
+
+
+def spatial_correlation(feat1, feat2, kernel_size, patch_size, stride=1, padding=0):
+    """Pure pytorch version of the correlation computed by spatial_correlation_sampler
+    (https://github.com/ClementPinard/Pytorch-Correlation-extension), with dilation 1.
+    args:
+        feat1, feat2:  Input feature maps. Dims (batch, feat_dim, H, W).
+        kernel_size:  Size of the window that is summed over in feat1 and feat2.
+        patch_size:  Number of displacements in each direction, i.e. 2*max_displacement + 1.
+        stride:  Stride of the output w.r.t. the inputs.
+        padding:  Zero padding of the kernel window.
+    returns:
+        correlation:  Dims (batch, patch_size, patch_size, H_out, W_out)."""
+
+    batch_size, num_channels, height, width = feat1.shape
+    md = (patch_size - 1) // 2
+
+    # Windows of feat2 for all displacements, as a strided view of shape (batch, feat_dim, pH, pW, H, W)
+    feat2_windows = F.pad(feat2, (md, md, md, md)).unfold(2, height, 1).unfold(3, width, 1)
+
+    # Only one row of displacements is materialized at a time to bound memory to patch_size*feat_dim*H*W
+    corr = torch.stack([torch.einsum('bchw,bcqhw->bqhw', feat1, feat2_windows[:, :, dy])
+                        for dy in range(patch_size)], dim=1)
+    corr = corr.view(batch_size, patch_size * patch_size, height, width)
+
+    if kernel_size > 1 or stride > 1:
+        corr = F.avg_pool2d(corr, kernel_size, stride=stride, padding=padding,
+                            count_include_pad=True) * (kernel_size * kernel_size)
+
+    return corr.view(batch_size, patch_size, patch_size, corr.shape[-2], corr.shape[-1])
+
+
+class SpatialCorrelationSamplerTorch(nn.Module):
+    """Drop-in replacement for SpatialCorrelationSampler, used when the extension is not installed."""
+    def __init__(self, kernel_size=1, patch_size=1, stride=1, padding=0):
+        super().__init__()
+        self.kernel_size = kernel_size
+        self.patch_size = patch_size
+        self.stride = stride
+        self.padding = padding
+
+    def forward(self, feat1, feat2):
+        return spatial_correlation(feat1, feat2, self.kernel_size, self.patch_size, self.stride, self.padding)
 
 
 class CostVolume(nn.Module):
     def __init__(self, kernel_size, max_displacement, stride=1, abs_coordinate_output=False):
         super().__init__()
-        self.correlation_layer = SpatialCorrelationSampler(kernel_size, 2*max_displacement + 1, stride,
-                                                           int((kernel_size-1)/2))
+        correlation_sampler = SpatialCorrelationSampler if SpatialCorrelationSampler is not None \
+            else SpatialCorrelationSamplerTorch
+        self.correlation_layer = correlation_sampler(kernel_size, 2*max_displacement + 1, stride,
+                                                     int((kernel_size-1)/2))
         self.abs_coordinate_output = abs_coordinate_output
 
     def forward(self, feat1, feat2):
@@ -45,31 +94,22 @@ def remap_cost_volume(cost_volume):
 
     cost_volume = cost_volume.view(batch_size, int(d_sqrt_), int(d_sqrt_), num_rows, num_cols)
 
-    cost_volume_remapped = torch.zeros((batch_size, num_rows, num_cols,
-                                        num_rows, num_cols),
-                                       dtype=cost_volume.dtype,
-                                       device=cost_volume.device)
-
     if cost_volume.size()[1] % 2 != 1:
         raise ValueError
 
-    md = int((cost_volume.size()[1]-1)/2)
-
-    for r in range(num_rows):
-        for c in range(num_cols):
-            r1_ = r - md
-            r2_ = r1_ + 2*md + 1
-            c1_ = c - md
-            c2_ = c1_ + 2*md + 1
+    d_ = cost_volume.size()[1]
+    md = int((d_-1)/2)
 
-            r1_pad_ = max(-r1_, 0)
-            r2_pad_ = max(r2_ - cost_volume_remapped.shape[1], 0)
+    # cost_volume_remapped[:, r_, c_, r, c] = cost_volume[:, r_ - r + md, c_ - c + md, r, c] within the displacement range
+    rows = torch.arange(num_rows, device=cost_volume.device)
+    cols = torch.arange(num_cols, device=cost_volume.device)
 
-            c1_pad_ = max(-c1_, 0)
-            c2_pad_ = max(c2_ - cost_volume_remapped.shape[2], 0)
+    d_row = rows.view(-1, 1, 1, 1) - rows.view(1, 1, -1, 1) + md
+    d_col = cols.view(1, -1, 1, 1) - cols.view(1, 1, 1, -1) + md
+    valid = (d_row >= 0) & (d_row < d_) & (d_col >= 0) & (d_col < d_)
 
-            d_ = cost_volume.size()[1]
-            cost_volume_remapped[:, r1_+r1_pad_:r2_-r2_pad_, c1_+c1_pad_:c2_-c2_pad_, r, c] = \
-                cost_volume[:, r1_pad_:d_-r2_pad_, c1_pad_:d_-c2_pad_, r, c]
+    cost_volume_remapped = cost_volume[:, d_row.clamp(0, d_-1), d_col.clamp(0, d_-1),
+                                       rows.view(1, 1, -1, 1), cols.view(1, 1, 1, -1)]
 
-    return cost_volume_remapped
+    # Masked with where instead of a product, such that inf values at the invalid entries do not give nan
+    return torch.where(valid, cost_volume_remapped, cost_volume_remapped.new_zeros(()))
@@ -0,0 +1,37 @@
+import inspect
+import torch
+import torch.utils.checkpoint
+
+
+# The non-reentrant implementation also computes the gradients of the parameters of a block if none of its inputs
+# requires gradients, e.g. after frozen layers. It is only available in newer pytorch versions.
+_NON_REENTRANT = 'use_reentrant' in inspect.signature(torch.utils.checkpoint.checkpoint).parameters
+
+
+def checkpoint_block(block, *args):
+    """ Runs block(*args) without storing its intermediate activations, which are recomputed in the backward pass.
+    The random number generator state is restored for the recomputation, such that dropout is applied identically. """
+    if _NON_REENTRANT:
+        return torch.utils.checkpoint.checkpoint(block, *args, use_reentrant=False)
+    return torch.utils.checkpoint.checkpoint(block, *args)
+
+
+def use_checkpointing(module):
+    """ Whether the blocks of module should be checkpointed, i.e. if checkpointing is enabled and gradients are
+    computed. """
+    return getattr(module, 'use_checkpoint', False) and torch.is_grad_enabled()
+
+
+def set_activation_checkpointing(net, enabled=True):
+    """ Enables or disables activation checkpointing of all modules of net which support it, i.e. the blocks of the
+    Swin transformer stages, the layers of the transformer encoders and decoders, and the SuperGlue GNN layers. Used
+    by LTRTrainer if settings.activation_checkpointing is True.
+    returns:
+        int - number of modules which were changed
+    """
+    num_modules = 0
+    for module in net.modules():
+        if hasattr(module, 'use_checkpoint'):
+            module.use_checkpoint = enabled
+            num_modules += 1
+    return num_modules
@@ -0,0 +1,93 @@
+import torch
+import torch.nn as nn
+
+try:
+    from ltr.external.PreciseRoIPooling.pytorch.prroi_pool.functional import prroi_pool2d as _prroi_pool2d_cuda
+except ImportError:
+    _prroi_pool2d_cuda = None
+
+
+def _hat_integral(t):
+    """Antiderivative of the bilinear hat function max(0, 1 - |t|), with value 0 at t = -1 and 1 at t = 1."""
+    t = t.clamp(-1.0, 1.0)
+    return 0.5 + t - 0.5 * t * t.abs()
+
+
+def _bin_weights(start, end, size):
+    """Integral of the interpolation kernel of every grid point over every bin.
+    args:
+        start:  Bin start coordinates in the feature map. Dims (num_rois, num_bins).
+        end:  Bin end coordinates in the feature map. Dims (num_rois, num_bins).
+        size:  Number of grid points along the dimension.
+    returns:
+        weights:  Dims (num_rois, num_bins, size)."""
+    grid = torch.arange(size, dtype=start.dtype, device=start.device).view(1, 1, -1)
+    return _hat_integral(end.unsqueeze(-1) - grid) - _hat_integral(start.unsqueeze(-1) - grid)
+
+
+def prroi_pool2d_torch(features, rois, pooled_height, pooled_width, spatial_scale):
+    """Precise RoI pooling implemented with standard pytorch ops. Computes the exact integral of the bilinearly
+    interpolated feature map over each bin, divided by the bin area, as the original PrRoIPool2D. The bilinear
+    interpolation is separable, so the integral reduces to two small matrix products per roi. All rois are processed
+    in one batch and the gradients w.r.t. both the features and the roi coordinates are obtained through autograd.
+    args:
+        features:  Input feature maps. Dims (batch, feat_dim, H, W).
+        rois:  Regions as (batch_index, x0, y0, x1, y1) in image coords. Dims (num_rois, 5).
+        pooled_height, pooled_width:  Output size of each pooled region.
+        spatial_scale:  Scale factor from image coords to feature coords.
+    returns:
+        pooled_feat:  Dims (num_rois, feat_dim, pooled_height, pooled_width)."""
+
+    pooled_height = int(pooled_height)
+    pooled_width = int(pooled_width)
+
+    rois = rois.to(features.dtype)
+    batch_index = rois[:, 0].long()
+    box = rois[:, 1:] * spatial_scale
+
+    roi_w = (box[:, 2] - box[:, 0]).clamp(min=0)
+    roi_h = (box[:, 3] - box[:, 1]).clamp(min=0)
+    bin_w = roi_w / pooled_width
+    bin_h = roi_h / pooled_height
+
+    ph = torch.arange(pooled_height, dtype=features.dtype, device=features.device).view(1, -1)
+    pw = torch.arange(pooled_width, dtype=features.dtype, device=features.device).view(1, -1)
+
+    y0 = box[:, 1:2] + ph * bin_h.view(-1, 1)
+    x0 = box[:, 0:1] + pw * bin_w.view(-1, 1)
+
+    weights_y = _bin_weights(y0, y0 + bin_h.view(-1, 1), features.shape[-2])
+    weights_x = _bin_weights(x0, x0 + bin_w.view(-1, 1), features.shape[-1])
+
+    # Integrate along y, then along x: (R,1,PH,H) @ (R,C,H,W) @ (R,1,W,PW)
+    roi_feat = features.index_select(0, batch_index)
+    pooled = torch.matmul(torch.matmul(weights_y.unsqueeze(1), roi_feat), weights_x.transpose(1, 2).unsqueeze(1))
+
+    # Empty bins are set to zero, as in the original implementation
+    area = (bin_w * bin_h).view(-1, 1, 1, 1)
+    inv_area = (area > 0).to(features.dtype) / area.clamp(min=torch.finfo(features.dtype).tiny)
+
+    return pooled * inv_area
+
+
+class PrRoIPool2D(nn.Module):
+    """Precise RoI pooling (https://github.com/vacancy/PreciseRoIPooling). Uses the compiled CUDA extension if it is
+    available and the input is on the GPU, and the pure pytorch implementation prroi_pool2d_torch otherwise.
+    args:
+        pooled_height, pooled_width:  Output size of each pooled region.
+        spatial_scale:  Scale factor from image coords to feature coords."""
+
+    def __init__(self, pooled_height, pooled_width, spatial_scale):
+        super().__init__()
+
+        self.pooled_height = int(pooled_height)
+        self.pooled_width = int(pooled_width)
+        self.spatial_scale = float(spatial_scale)
+
+    def forward(self, features, rois):
+        if _prroi_pool2d_cuda is not None and features.is_cuda:
+            return _prroi_pool2d_cuda(features, rois, self.pooled_height, self.pooled_width, self.spatial_scale)
+        return prroi_pool2d_torch(features, rois, self.pooled_height, self.pooled_width, self.spatial_scale)
+
+    def extra_repr(self):
+        return 'kernel_size=({pooled_height}, {pooled_width}), spatial_scale={spatial_scale}'.format(**self.__dict__)
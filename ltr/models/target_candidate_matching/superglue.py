@@ -6,12 +6,12 @@
 
 
 import torch
-import torch.utils.checkpoint
 
 from torch import nn
 
 from copy import deepcopy, copy
 from abc import ABCMeta, abstractmethod
+from ltr.models.layers.checkpoint import checkpoint_block, use_checkpointing
 
 
 class BaseModel(nn.Module, metaclass=ABCMeta):
@@ -179,29 +179,33 @@ class GNNLayer(nn.Module):
 class AttentionalGNN(nn.Module):
     def __init__(self, feature_dim, layer_types, checkpointed=False):
         super().__init__()
-        self.checkpointed = checkpointed
+        self.use_checkpoint = checkpointed
         self.layers = nn.ModuleList([
             GNNLayer(feature_dim, layer_type) for layer_type in layer_types])
 
     def forward(self, desc0, desc1):
         for layer in self.layers:
-            if self.checkpointed:
-                desc0, desc1 = torch.utils.checkpoint.checkpoint(
-                        layer, desc0, desc1, preserve_rng_state=False)
+            if use_checkpointing(self):
+                desc0, desc1 = checkpoint_block(layer, desc0, desc1)
             else:
                 desc0, desc1 = layer(desc0, desc1)
         return desc0, desc1
 
 
-def log_sinkhorn_iterations(Z, log_mu, log_nu, iters):
+def log_sinkhorn_iterations(Z, log_mu, log_nu, iters, tol=None):
+    """If tol is given, the iterations stop early once the row marginals of the previous estimate, which are
+    measured by the change of u, are within tol of log_mu. The column marginals are exact after every iteration."""
     u, v = torch.zeros_like(log_mu), torch.zeros_like(log_nu)
     for _ in range(iters):
+        u_prev = u
         u = log_mu - torch.logsumexp(Z + v.unsqueeze(1), dim=2)
         v = log_nu - torch.logsumexp(Z + u.unsqueeze(2), dim=1)
+        if tol is not None and (u - u_prev).abs().max() < tol:
+            break
     return Z + u.unsqueeze(2) + v.unsqueeze(1)
 
 
-def log_optimal_transport(scores, alpha, iters):
+def log_optimal_transport(scores, alpha, iters, tol=None):
     b, m, n = scores.shape
     one = scores.new_tensor(1)
     ms, ns = (m*one).to(scores), (n*one).to(scores)
@@ -218,7 +222,7 @@ def log_optimal_transport(scores, alpha, iters):
     log_nu = torch.cat([norm.expand(n), ms.log()[None] + norm])
     log_mu, log_nu = log_mu[None].expand(b, -1), log_nu[None].expand(b, -1)
 
-    Z = log_sinkhorn_iterations(couplings, log_mu, log_nu, iters)
+    Z = log_sinkhorn_iterations(couplings, log_mu, log_nu, iters, tol)
     Z = Z - norm  # multiply probabilities by M+N
     return Z
 
@@ -251,6 +255,7 @@ class SuperGlue(BaseModel):
         'GNN_layers': ['self', 'cross'] * 9,
         'output_normalization': 'sinkhorn',
         'num_sinkhorn_iterations': 50,
+        'sinkhorn_tolerance': None,
         'filter_threshold': 0.2,
         'checkpointed': False,
         'loss': {
@@ -297,6 +302,22 @@ class SuperGlue(BaseModel):
         bin_score = torch.nn.Parameter(torch.tensor(0.0))
         self.register_parameter('bin_score', bin_score)
 
+    def encode_descriptors(self, desc, kpts, scores, image_size, pred, i):
+        """Applies the bottleneck, input projection and keypoint encoding to the descriptors of frame i."""
+        if self.conf['bottleneck_dim'] is not None:
+            pred['down_descriptors{}'.format(i)] = desc = self.bottleneck_down(desc)
+            desc = self.bottleneck_up(desc)
+            desc = nn.functional.normalize(desc, p=2, dim=1)
+            pred['bottleneck_descriptors{}'.format(i)] = desc
+            if self.conf['loss']['nll_weight'] == 0:
+                desc = desc.detach()
+
+        if self.conf['input_dim'] != self.conf['descriptor_dim']:
+            desc = self.input_proj(desc)
+
+        kpts = normalize_keypoints(kpts, image_size)
+        return desc + self.kenc(kpts, scores)
+
     def _forward(self, data):
         pred = {}
         desc0, desc1 = data['descriptors0'], data['descriptors1']
@@ -311,28 +332,13 @@ class SuperGlue(BaseModel):
                 'match_scores1': kpts1.new_zeros(shape1),
             }
 
-        if self.conf['bottleneck_dim'] is not None:
-            pred['down_descriptors0'] = desc0 = self.bottleneck_down(desc0)
-            pred['down_descriptors1'] = desc1 = self.bottleneck_down(desc1)
-            desc0 = self.bottleneck_up(desc0)
-            desc1 = self.bottleneck_up(desc1)
-            desc0 = nn.functional.normalize(desc0, p=2, dim=1)
-            desc1 = nn.functional.normalize(desc1, p=2, dim=1)
-            pred['bottleneck_descriptors0'] = desc0
-            pred['bottleneck_descriptors1'] = desc1
-            if self.conf['loss']['nll_weight'] == 0:
-                desc0 = desc0.detach()
-                desc1 = desc1.detach()
-
-        if self.conf['input_dim'] != self.conf['descriptor_dim']:
-            desc0 = self.input_proj(desc0)
-            desc1 = self.input_proj(desc1)
-
-        kpts0 = normalize_keypoints(kpts0, data['image_size0'])
-        kpts1 = normalize_keypoints(kpts1, data['image_size1'])
-
-        desc0 = desc0 + self.kenc(kpts0, data['scores0'])
-        desc1 = desc1 + self.kenc(kpts1, data['scores1'])
+        # The encoded descriptors of frame 0 can be passed in, e.g. cached from the previous call during tracking
+        if data.get('encoded_descriptors0') is not None:
+            desc0 = data['encoded_descriptors0']
+        else:
+            desc0 = self.encode_descriptors(desc0, kpts0, data['scores0'], data['image_size0'], pred, 0)
+        desc1 = self.encode_descriptors(desc1, kpts1, data['scores1'], data['image_size1'], pred, 1)
+        pred['encoded_descriptors1'] = desc1
 
         if not self.conf['skip_gnn']:
             desc0, desc1 = self.gnn(desc0, desc1)
@@ -343,7 +349,9 @@ class SuperGlue(BaseModel):
         scores = scores / self.conf['descriptor_dim']**.5
 
         if self.conf['output_normalization'] == 'sinkhorn':
-            scores = log_optimal_transport(scores, self.bin_score, iters=self.conf['num_sinkhorn_iterations'])
+            tol = data.get('sinkhorn_tolerance')
+            tol = self.conf['sinkhorn_tolerance'] if tol is None else tol
+            scores = log_optimal_transport(scores, self.bin_score, iters=self.conf['num_sinkhorn_iterations'], tol=tol)
         elif self.conf['output_normalization'] == 'double_softmax':
             scores = log_double_softmax(scores, self.bin_score)
         else:
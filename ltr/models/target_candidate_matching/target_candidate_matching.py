@@ -44,17 +44,24 @@ class TargetCandidateMatchingNetwork(nn.Module):
         self.matcher = matcher
 
 
-    def forward(self, img_cropped0, img_cropped1, candidate_tsm_coords0, candidate_tsm_coords1, candidate_img_coords0,
-                candidate_img_coords1, candidate_scores0, candidate_scores1, img_shape0, img_shape1, **kwargs):
-
-
-        # Extract backbone features
-        frame_feat0 = self.extract_backbone_features(img_cropped0.reshape(-1, *img_cropped0.shape[-3:]))
-        frame_feat1 = self.extract_backbone_features(img_cropped1.reshape(-1, *img_cropped1.shape[-3:]))
-
-        # Classification features
-        frame_feat_clf0 = self.get_backbone_clf_feat(frame_feat0)
-        frame_feat_clf1 = self.get_backbone_clf_feat(frame_feat1)
+    def forward(self, candidate_tsm_coords0, candidate_tsm_coords1, candidate_img_coords0, candidate_img_coords1,
+                candidate_scores0, candidate_scores1, img_shape0, img_shape1, img_cropped0=None, img_cropped1=None,
+                feat_cropped0=None, feat_cropped1=None, **kwargs):
+        """ Either the cropped search areas img_cropped0 and img_cropped1, or their precomputed classification
+        features feat_cropped0 and feat_cropped1 (see ltr.dataset.feature_store) must be given. """
+
+        if feat_cropped0 is not None:
+            # Precomputed features of the frozen backbone
+            frame_feat_clf0 = self._stored_clf_feat(feat_cropped0)
+            frame_feat_clf1 = self._stored_clf_feat(feat_cropped1)
+        else:
+            # Extract backbone features
+            frame_feat0 = self.extract_backbone_features(img_cropped0.reshape(-1, *img_cropped0.shape[-3:]))
+            frame_feat1 = self.extract_backbone_features(img_cropped1.reshape(-1, *img_cropped1.shape[-3:]))
+
+            # Classification features
+            frame_feat_clf0 = self.get_backbone_clf_feat(frame_feat0)
+            frame_feat_clf1 = self.get_backbone_clf_feat(frame_feat1)
 
         descriptors0 = self.descriptor_extractor(frame_feat_clf0, candidate_tsm_coords0[0])
         descriptors1 = self.descriptor_extractor(frame_feat_clf1, candidate_tsm_coords1[0])
@@ -79,6 +86,10 @@ class TargetCandidateMatchingNetwork(nn.Module):
             layers = self.output_layers
         return self.feature_extractor(im, layers)
 
+    def _stored_clf_feat(self, feat):
+        # The features are stored in float16
+        return feat.reshape(-1, *feat.shape[-3:]).to(self.descriptor_extractor.conv.weight.dtype)
+
     def get_backbone_clf_feat(self, backbone_feat):
         feat = OrderedDict({l: backbone_feat[l] for l in self.classification_layer})
         if len(self.classification_layer) == 1:
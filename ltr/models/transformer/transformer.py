@@ -8,17 +8,19 @@ import copy
 import torch
 import torch.nn.functional as F
 from torch import nn
+from ltr.models.layers.checkpoint import checkpoint_block, use_checkpointing
 
 
 class TransformerDecoderInstance(nn.Module):
     def __init__(self, d_model=512, nhead=8, num_decoder_layers=6, dim_feedforward=2048,
-                 dropout=0.1, activation="relu", normalize_before=False, return_intermediate_dec=False):
+                 dropout=0.1, activation="relu", normalize_before=False, return_intermediate_dec=False,
+                 use_checkpoint=False):
         super().__init__()
 
         decoder_layer = TransformerDecoderLayer(d_model, nhead, dim_feedforward, dropout, activation, normalize_before)
         decoder_norm = nn.LayerNorm(d_model)
         self.decoder = TransformerDecoder(decoder_layer, num_decoder_layers, decoder_norm,
-                                          return_intermediate=return_intermediate_dec)
+                                          return_intermediate=return_intermediate_dec, use_checkpoint=use_checkpoint)
 
         self._reset_parameters()
 
@@ -41,12 +43,12 @@ class TransformerDecoderInstance(nn.Module):
 
 class TransformerEncoderInstance(nn.Module):
     def __init__(self, d_model=512, nhead=8, num_encoder_layers=6, dim_feedforward=2048,
-                 dropout=0.1, activation="relu", normalize_before=False):
+                 dropout=0.1, activation="relu", normalize_before=False, use_checkpoint=False):
         super().__init__()
 
         encoder_layer = TransformerEncoderLayer(d_model, nhead, dim_feedforward, dropout, activation, normalize_before)
         encoder_norm = nn.LayerNorm(d_model) if normalize_before else None
-        self.encoder = TransformerEncoder(encoder_layer, num_encoder_layers, encoder_norm)
+        self.encoder = TransformerEncoder(encoder_layer, num_encoder_layers, encoder_norm, use_checkpoint=use_checkpoint)
 
         self._reset_parameters()
 
@@ -65,17 +67,18 @@ class TransformerEncoderInstance(nn.Module):
 
 class Transformer(nn.Module):
     def __init__(self, d_model=512, nhead=8, num_encoder_layers=6, num_decoder_layers=6, dim_feedforward=2048,
-                 dropout=0.1, activation="relu", normalize_before=False, return_intermediate_dec=False):
+                 dropout=0.1, activation="relu", normalize_before=False, return_intermediate_dec=False,
+                 use_checkpoint=False):
         super().__init__()
 
         encoder_layer = TransformerEncoderLayer(d_model, nhead, dim_feedforward, dropout, activation, normalize_before)
         encoder_norm = nn.LayerNorm(d_model) if normalize_before else None
-        self.encoder = TransformerEncoder(encoder_layer, num_encoder_layers, encoder_norm)
+        self.encoder = TransformerEncoder(encoder_layer, num_encoder_layers, encoder_norm, use_checkpoint=use_checkpoint)
 
         decoder_layer = TransformerDecoderLayer(d_model, nhead, dim_feedforward, dropout, activation, normalize_before)
         decoder_norm = nn.LayerNorm(d_model)
         self.decoder = TransformerDecoder(decoder_layer, num_decoder_layers, decoder_norm,
-                                          return_intermediate=return_intermediate_dec)
+                                          return_intermediate=return_intermediate_dec, use_checkpoint=use_checkpoint)
 
         self._reset_parameters()
 
@@ -97,17 +100,21 @@ class Transformer(nn.Module):
 
 
 class TransformerEncoder(nn.Module):
-    def __init__(self, encoder_layer, num_layers, norm=None):
+    def __init__(self, encoder_layer, num_layers, norm=None, use_checkpoint=False):
         super().__init__()
         self.layers = _get_clones(encoder_layer, num_layers)
         self.num_layers = num_layers
         self.norm = norm
+        self.use_checkpoint = use_checkpoint
 
     def forward(self, src, mask=None, src_key_padding_mask=None, pos=None):
         output = src
 
         for layer in self.layers:
-            output = layer(output, src_mask=mask, src_key_padding_mask=src_key_padding_mask, pos=pos)
+            if use_checkpointing(self):
+                output = checkpoint_block(layer, output, mask, src_key_padding_mask, pos)
+            else:
+                output = layer(output, src_mask=mask, src_key_padding_mask=src_key_padding_mask, pos=pos)
 
         if self.norm is not None:
             output = self.norm(output)
@@ -117,12 +124,13 @@ class TransformerEncoder(nn.Module):
 
 class TransformerDecoder(nn.Module):
 
-    def __init__(self, decoder_layer, num_layers, norm=None, return_intermediate=False):
+    def __init__(self, decoder_layer, num_layers, norm=None, return_intermediate=False, use_checkpoint=False):
         super().__init__()
         self.layers = _get_clones(decoder_layer, num_layers)
         self.num_layers = num_layers
         self.norm = norm
         self.return_intermediate = return_intermediate
+        self.use_checkpoint = use_checkpoint
 
     def forward(self, tgt, memory, tgt_mask=None, memory_mask=None, tgt_key_padding_mask=None,
                 memory_key_padding_mask=None, pos=None, query_pos=None):
@@ -131,8 +139,13 @@ class TransformerDecoder(nn.Module):
         intermediate = []
 
         for layer in self.layers:
-            output = layer(output, memory, tgt_mask=tgt_mask, memory_mask=memory_mask, pos=pos, query_pos=query_pos,
-                           tgt_key_padding_mask=tgt_key_padding_mask, memory_key_padding_mask=memory_key_padding_mask)
+            if use_checkpointing(self):
+                output = checkpoint_block(layer, output, memory, tgt_mask, memory_mask, tgt_key_padding_mask,
+                                          memory_key_padding_mask, pos, query_pos)
+            else:
+                output = layer(output, memory, tgt_mask=tgt_mask, memory_mask=memory_mask, pos=pos,
+                               query_pos=query_pos, tgt_key_padding_mask=tgt_key_padding_mask,
+                               memory_key_padding_mask=memory_key_padding_mask)
 
             if self.return_intermediate:
                 intermediate.append(self.norm(output))
@@ -0,0 +1,71 @@
+import os
+import sys
+import argparse
+import multiprocessing
+import cv2 as cv
+
+env_path = os.path.join(os.path.dirname(__file__), '..')
+if env_path not in sys.path:
+    sys.path.append(env_path)
+
+from ltr.data.benchmark import build_train_loader, profile_stages, measure_throughput, make_loader, autotune
+
+
+def _format_memory(num_bytes):
+    return 'n/a (install psutil)' if num_bytes is None else '{:.2f} GB'.format(num_bytes / 2**30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the data pipeline of a train settings module, i.e. its '
+                                                 'datasets, sampler, processing and loader, without building the '
+                                                 'network.')
+    parser.add_argument('train_settings', type=str, help='Train settings module, e.g. dimp.dimp50')
+    parser.add_argument('--num_samples', type=int, default=200,
+                        help='Number of samples used for the per-stage profile, drawn in the main process.')
+    parser.add_argument('--num_batches', type=int, default=50, help='Number of batches used for the throughput.')
+    parser.add_argument('--num_workers', type=int, default=None,
+                        help='Number of workers for the throughput. Defaults to the value of the train settings.')
+    parser.add_argument('--autotune', action='store_true',
+                        help='Measure the throughput for different numbers of workers and prefetch factors.')
+    parser.add_argument('--workers', type=int, nargs='+', default=None,
+                        help='Numbers of workers tried by the autotuning. Default is powers of two up to the number '
+                             'of cpus.')
+    parser.add_argument('--prefetch_factors', type=int, nargs='+', default=[2, 4],
+                        help='Prefetch factors tried by the autotuning.')
+
+    args = parser.parse_args()
+
+    # This is needed to avoid strange crashes related to opencv
+    cv.setNumThreads(0)
+
+    loader = build_train_loader(args.train_settings)
+    print('Loader {}: batch size {}, {} workers'.format(loader.name, loader.batch_size, loader.num_workers))
+
+    print('\nPer-stage time in the main process [ms/sample]')
+    profile = profile_stages(loader, args.num_samples)
+    collate_time = profile.pop('collate')
+    stages = ('sample', 'load', 'crop', 'transforms', 'labels', 'other')
+    print('{:<24} {:>8} {:>10} '.format('dataset', 'samples', 'samples/s') + ' '.join('{:>10}'.format(s) for s in stages))
+    for name, stats in profile.items():
+        print('{:<24} {:>8d} {:>10.1f} '.format(name, stats['samples'], stats['samples_per_sec']) +
+              ' '.join('{:>10.2f}'.format(1000 * stats[s]) for s in stages))
+    print('collate: {:.2f} ms/batch'.format(1000 * collate_time))
+
+    num_workers = loader.num_workers if args.num_workers is None else args.num_workers
+    print('\nThroughput with {} workers'.format(num_workers))
+    res = measure_throughput(make_loader(loader, num_workers), args.num_batches)
+    print('{:.1f} samples/s, {:.2f} batches/s, first batch after {:.1f} s, peak memory {}'.format(
+        res['samples_per_sec'], res['batches_per_sec'], res['startup'], _format_memory(res['peak_memory'])))
+
+    if args.autotune:
+        print('\nAutotuning')
+        results, (best_workers, best_prefetch) = autotune(loader, args.workers, args.prefetch_factors,
+                                                          args.num_batches)
+        best = [r for w, p, r in results if w == best_workers and p == best_prefetch][0]
+        print('\nRecommended: num_workers={}, prefetch_factor={} ({:.1f} samples/s, peak memory {})'.format(
+            best_workers, best_prefetch, best['samples_per_sec'], _format_memory(best['peak_memory'])))
+
+
+if __name__ == '__main__':
+    multiprocessing.set_start_method('spawn', force=True)
+    main()
@@ -0,0 +1,47 @@
+import os
+import sys
+import argparse
+
+env_path = os.path.join(os.path.dirname(__file__), '..')
+if env_path not in sys.path:
+    sys.path.append(env_path)
+
+from ltr.data.image_loader import available_decoders, benchmark_decoders, select_decoder
+from ltr.data.shard_storage import list_sequence_frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Print the decoding throughput of the available image decoder '
+                                                 'backends, see ltr.data.image_loader.')
+    parser.add_argument('path', type=str, help='Image file, or directory which is searched for images.')
+    parser.add_argument('--num_images', type=int, default=50, help='Maximum number of images used.')
+    parser.add_argument('--num_repeats', type=int, default=3, help='Number of times each image is decoded.')
+    parser.add_argument('--select', action='store_true',
+                        help='Re-run the selection of the default decoder and update the cached choice.')
+
+    args = parser.parse_args()
+
+    if os.path.isdir(args.path):
+        paths = [os.path.join(args.path, f) for _, frames in list_sequence_frames(args.path) for f in frames]
+        paths = paths[:args.num_images]
+    else:
+        paths = [args.path]
+
+    if len(paths) == 0:
+        raise RuntimeError('No images found in {}'.format(args.path))
+
+    print('Available decoders: {}'.format(', '.join(available_decoders())))
+
+    timings = benchmark_decoders(paths, num_repeats=args.num_repeats)
+    for name, t in timings.items():
+        if t is None:
+            print('{:<12} failed'.format(name))
+        else:
+            print('{:<12} {:8.2f} ms/image {:8.1f} images/s'.format(name, 1000 * t, 1 / t))
+
+    if args.select:
+        select_decoder(paths[0], refresh=True)
+
+
+if __name__ == '__main__':
+    main()
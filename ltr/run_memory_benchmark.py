@@ -0,0 +1,53 @@
+import os
+import sys
+import argparse
+import cv2 as cv
+import torch
+
+env_path = os.path.join(os.path.dirname(__file__), '..')
+if env_path not in sys.path:
+    sys.path.append(env_path)
+
+from ltr.trainers.memory_benchmark import build_actor_and_loader, compare_checkpointing
+
+
+def _format_memory(num_bytes):
+    return 'n/a' if num_bytes is None else '{:.2f} GB'.format(num_bytes / 2**30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the peak memory and the time per training iteration of a '
+                                                 'train settings module, with and without activation checkpointing '
+                                                 '(settings.activation_checkpointing). On the cpu, the peak resident '
+                                                 'memory of the process is reported.')
+    parser.add_argument('train_settings', type=str, help='Train settings module, e.g. tomp.tomp50')
+    parser.add_argument('--num_iters', type=int, default=10, help='Number of measured iterations.')
+    parser.add_argument('--device', type=str, default='cuda', help='Device on which the network is run.')
+
+    args = parser.parse_args()
+
+    # This is needed to avoid strange crashes related to opencv
+    cv.setNumThreads(0)
+
+    actor, loader, settings = build_actor_and_loader(args.train_settings)
+    device = torch.device(args.device)
+
+    results, num_modules = compare_checkpointing(actor, loader, settings, device, args.num_iters)
+    if num_modules == 0:
+        print('The network of {} has no modules supporting activation checkpointing.'.format(args.train_settings))
+
+    print('Batch size {}, {} checkpointed modules'.format(loader.batch_size, num_modules))
+    print('{:<16} {:>14} {:>14}'.format('checkpointing', 'peak memory', 'ms/iter'))
+    for checkpointing in (False, True):
+        res = results[checkpointing]
+        print('{:<16} {:>14} {:>14.1f}'.format('on' if checkpointing else 'off', _format_memory(res['peak_memory']),
+                                               1000 * res['time']))
+
+    off, on = results[False], results[True]
+    if off['peak_memory'] and on['peak_memory']:
+        print('Checkpointing saves {:.1f}% of the peak memory at {:.1f}% more time per iteration.'.format(
+            100 * (1 - on['peak_memory'] / off['peak_memory']), 100 * (on['time'] / off['time'] - 1)))
+
+
+if __name__ == '__main__':
+    main()
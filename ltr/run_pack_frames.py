@@ -0,0 +1,25 @@
+import os
+import sys
+import argparse
+
+env_path = os.path.join(os.path.dirname(__file__), '..')
+if env_path not in sys.path:
+    sys.path.append(env_path)
+
+from ltr.data.shard_storage import pack_frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pack the frames of a dataset into shard files, which can be read '
+                                                 'using ltr.data.shard_storage.ShardImageLoader.')
+    parser.add_argument('root', type=str, help='Root directory of the dataset.')
+    parser.add_argument('shard_dir', type=str, help='Output directory for the shards.')
+    parser.add_argument('--shard_size', type=float, default=1.0, help='Approximate size of each shard in GB.')
+
+    args = parser.parse_args()
+
+    pack_frames(args.root, args.shard_dir, shard_size=int(args.shard_size * 2**30))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,26 @@
+import os
+import sys
+import argparse
+
+env_path = os.path.join(os.path.dirname(__file__), '..')
+if env_path not in sys.path:
+    sys.path.append(env_path)
+
+from ltr.dataset.mask_store import convert_masks
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert the png mask annotations of a VOS dataset into a run-length '
+                                                 'encoded, memory-mapped mask store, see ltr.dataset.mask_store.')
+    parser.add_argument('anno_root', type=str, help='Annotation directory, containing one directory per sequence.')
+    parser.add_argument('out_path', type=str, help='Output directory of the mask store.')
+    parser.add_argument('--num_workers', type=int, default=None, help='Number of processes. Default is the number '
+                                                                      'of cpus.')
+
+    args = parser.parse_args()
+
+    convert_masks(args.anno_root, args.out_path, num_workers=args.num_workers)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+import os
+import sys
+import argparse
+import cv2 as cv
+
+env_path = os.path.join(os.path.dirname(__file__), '..')
+if env_path not in sys.path:
+    sys.path.append(env_path)
+
+from ltr.admin.environment import env_settings
+from ltr.dataset import LasotCandidateMatching
+from ltr.dataset.feature_store import build_feature_store
+from ltr.data import processing
+from ltr.models.target_candidate_matching import target_candidate_matching as tcm
+import ltr.data.transforms as tfm
+import ltr.admin.loading as network_loading
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Precompute the frozen backbone features of the search areas of the '
+                                                 'LaSOT candidate matching dataset, used to train KeepTrack, see '
+                                                 'ltr.dataset.feature_store.')
+    parser.add_argument('out_path', type=str, help='Output directory of the feature store.')
+    parser.add_argument('--split', type=str, default='train',
+                        help='LaSOT split. The default split contains the sequences of both train-train and train-val.')
+    parser.add_argument('--num_views', type=int, default=1,
+                        help='Number of views per frame. The views after the first one are augmented and used for '
+                             'self-supervision. With one view, the self-supervised frame pairs share their features.')
+    parser.add_argument('--weights', type=str, default=None,
+                        help='Weights of the base tracker. Default is super_dimp_simple.pth.tar in the pretrained '
+                             'networks directory.')
+    parser.add_argument('--output_sz', type=int, default=22 * 16, help='Size of the search area crops.')
+    parser.add_argument('--batch_size', type=int, default=32, help='Number of frames per batch.')
+    parser.add_argument('--num_workers', type=int, default=8, help='Number of processes loading the frames.')
+    parser.add_argument('--device', type=str, default='cuda', help='Device on which the backbone is run.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the augmentations.')
+
+    args = parser.parse_args()
+
+    # This is needed to avoid strange crashes related to opencv
+    cv.setNumThreads(0)
+
+    env = env_settings()
+    weights = args.weights
+    if weights is None:
+        weights = os.path.join(env.pretrained_networks, 'super_dimp_simple.pth.tar')
+
+    # Same transforms as in the keep_track train settings
+    normalize_mean = [0.485, 0.456, 0.406]
+    normalize_std = [0.229, 0.224, 0.225]
+    transform = tfm.Transform(tfm.ToTensor(), tfm.Normalize(mean=normalize_mean, std=normalize_std))
+    img_aug_transform = tfm.Transform(tfm.ToTensorAndJitter(normalize=True, brightness_jitter=0.5),
+                                      tfm.RandomBlur(sigma=0.5, probability=0.75),
+                                      tfm.Normalize(mean=normalize_mean, std=normalize_std))
+    data_processing = processing.TargetCandiateMatchingProcessing(output_sz=args.output_sz, train_transform=transform,
+                                                                  img_aug_transform=img_aug_transform)
+
+    dataset = LasotCandidateMatching(env.lasot_dir, env.lasot_candidate_matching_dataset_path, split=args.split)
+
+    net = tcm.target_candidate_matching_net_resnet50(backbone_pretrained=False)
+    base_net, _ = network_loading.load_network(checkpoint=weights, backbone_pretrained=False)
+    net.load_state_dict(base_net.state_dict(), strict=False)
+
+    build_feature_store(net, dataset, data_processing, args.out_path, num_views=args.num_views,
+                        batch_size=args.batch_size, num_workers=args.num_workers, device=args.device, seed=args.seed)
+
+
+if __name__ == '__main__':
+    main()
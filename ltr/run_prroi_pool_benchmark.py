@@ -0,0 +1,141 @@
+import os
+import sys
+import time
+import argparse
+import torch
+
+env_path = os.path.join(os.path.dirname(__file__), '..')
+if env_path not in sys.path:
+    sys.path.append(env_path)
+
+from ltr.models.layers.prroi_pool import prroi_pool2d_torch, _prroi_pool2d_cuda
+
+
+def _interpolate(features, y, x):
+    """ Bilinear interpolation of features (C, H, W) at the points (y, x), with zeros outside of the feature map as in
+    PrRoIPool. """
+    H, W = features.shape[-2:]
+    wy = (1 - (y.view(-1, 1) - torch.arange(H, dtype=y.dtype)).abs()).clamp(min=0)
+    wx = (1 - (x.view(-1, 1) - torch.arange(W, dtype=x.dtype)).abs()).clamp(min=0)
+    return torch.einsum('ph,chw,pw->cp', wy, features, wx)
+
+
+def prroi_pool2d_reference(features, rois, pooled_height, pooled_width, spatial_scale, num_samples=64):
+    """ Reference PrRoIPool, which integrates the interpolated feature map over each bin numerically using the midpoint
+    rule with num_samples x num_samples points. Loops over the rois and bins. """
+    out = []
+    t = (torch.arange(num_samples, dtype=features.dtype) + 0.5) / num_samples
+    for roi in rois:
+        b = int(roi[0])
+        x0, y0, x1, y1 = roi[1:] * spatial_scale
+        bin_h = (y1 - y0).clamp(min=0) / pooled_height
+        bin_w = (x1 - x0).clamp(min=0) / pooled_width
+
+        pooled = features.new_zeros(features.shape[1], pooled_height, pooled_width)
+        for i in range(pooled_height):
+            for j in range(pooled_width):
+                if bin_h <= 0 or bin_w <= 0:
+                    continue
+                ys = y0 + (i + t) * bin_h
+                xs = x0 + (j + t) * bin_w
+                yy, xx = torch.meshgrid(ys, xs, indexing='ij')
+                pooled[:, i, j] = _interpolate(features[b], yy.reshape(-1), xx.reshape(-1)).mean(dim=1)
+        out.append(pooled)
+    return torch.stack(out)
+
+
+def _random_input(batch_size, feat_dim, feat_sz, num_rois, spatial_scale, dtype=torch.float64, device='cpu'):
+    features = torch.randn(batch_size, feat_dim, feat_sz, feat_sz, dtype=dtype, device=device)
+
+    # Boxes partly outside of the image, to also test the zero padding
+    img_sz = feat_sz / spatial_scale
+    center = torch.rand(num_rois, 2, dtype=dtype) * img_sz
+    size = (0.05 + torch.rand(num_rois, 2, dtype=dtype) * 0.6) * img_sz
+    boxes = torch.cat((center - size / 2, center + size / 2), dim=1)
+    batch_index = torch.randint(batch_size, (num_rois, 1)).to(dtype)
+    rois = torch.cat((batch_index, boxes), dim=1).to(device)
+    return features, rois
+
+
+def check_correctness(pooled_sz=5, spatial_scale=1 / 16, num_samples=64):
+    """ Compares the values and the gradients w.r.t. the features and the roi coordinates of prroi_pool2d_torch with
+    the numerical integration. The midpoint rule error decreases with num_samples. """
+    features, rois = _random_input(2, 3, 9, 6, spatial_scale)
+    features.requires_grad_(True)
+    rois.requires_grad_(True)
+
+    grad_out = torch.randn(rois.shape[0], features.shape[1], pooled_sz, pooled_sz, dtype=features.dtype)
+    results = {}
+    for name, fn in (('torch', lambda f, r: prroi_pool2d_torch(f, r, pooled_sz, pooled_sz, spatial_scale)),
+                     ('reference', lambda f, r: prroi_pool2d_reference(f, r, pooled_sz, pooled_sz, spatial_scale,
+                                                                       num_samples))):
+        out = fn(features, rois)
+        grad_feat, grad_rois = torch.autograd.grad(out, (features, rois), grad_out)
+        results[name] = (out.detach(), grad_feat, grad_rois[:, 1:])
+
+    errors = {}
+    for i, name in enumerate(('output', 'grad features', 'grad rois')):
+        ref = results['reference'][i]
+        errors[name] = ((results['torch'][i] - ref).abs().max() / ref.abs().max().clamp(min=1e-12)).item()
+    return errors
+
+
+def _time(fn, num_iters, device):
+    fn()
+    if device.type == 'cuda':
+        torch.cuda.synchronize(device)
+    t0 = time.time()
+    for _ in range(num_iters):
+        fn()
+    if device.type == 'cuda':
+        torch.cuda.synchronize(device)
+    return (time.time() - t0) / num_iters
+
+
+def benchmark(device, batch_size=16, feat_dim=256, feat_sz=18, rois_per_image=16, pooled_sz=5, num_iters=20):
+    """ Time per forward and backward pass of the available implementations. """
+    spatial_scale = 1 / 16
+    features, rois = _random_input(batch_size, feat_dim, feat_sz, batch_size * rois_per_image, spatial_scale,
+                                   dtype=torch.float32, device=device)
+    features.requires_grad_(True)
+
+    impls = {'torch': prroi_pool2d_torch}
+    if _prroi_pool2d_cuda is not None and device.type == 'cuda':
+        impls['cuda extension'] = _prroi_pool2d_cuda
+
+    timings = {}
+    for name, impl in impls.items():
+        def step():
+            out = impl(features, rois, pooled_sz, pooled_sz, spatial_scale)
+            out.sum().backward()
+            features.grad = None
+        timings[name] = _time(step, num_iters, device)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the pytorch PrRoIPool2D against a numerical integration and '
+                                                 'measure its speed, see ltr.models.layers.prroi_pool.')
+    parser.add_argument('--device', type=str, default='cpu', help='Device used for the speed benchmark.')
+    parser.add_argument('--num_samples', type=int, default=64,
+                        help='Number of integration points per bin and dimension of the reference.')
+    parser.add_argument('--num_iters', type=int, default=20, help='Number of timed iterations.')
+    parser.add_argument('--tolerance', type=float, default=1e-2, help='Maximum relative error.')
+
+    args = parser.parse_args()
+    torch.manual_seed(0)
+
+    errors = check_correctness(num_samples=args.num_samples)
+    for name, err in errors.items():
+        print('{:<16} max relative error {:.2e}'.format(name, err))
+
+    timings = benchmark(torch.device(args.device), num_iters=args.num_iters)
+    for name, t in timings.items():
+        print('{:<16} {:8.2f} ms/iter (forward + backward)'.format(name, 1000 * t))
+
+    if max(errors.values()) > args.tolerance:
+        raise RuntimeError('PrRoIPool2D does not match the reference integral.')
+
+
+if __name__ == '__main__':
+    main()
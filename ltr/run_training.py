@@ -4,6 +4,7 @@ import argparse
 import importlib
 import multiprocessing
 import cv2 as cv
+import torch
 import torch.backends.cudnn
 
 env_path = os.path.join(os.path.dirname(__file__), '..')
@@ -11,14 +12,19 @@ if env_path not in sys.path:
     sys.path.append(env_path)
 
 import ltr.admin.settings as ws_settings
+from ltr.admin import distributed
 
 
-def run_training(train_module, train_name, cudnn_benchmark=True):
+def run_training(train_module, train_name, cudnn_benchmark=True, rank=None, world_size=1, backend=None):
     """Run a train scripts in train_settings.
     args:
         train_module: Name of module in the "train_settings/" folder.
         train_name: Name of the train settings file.
         cudnn_benchmark: Use cudnn benchmark or not (default is True).
+        rank: Rank of the process in distributed training. If None and world_size is 1, the training runs in a
+              single process. See ltr.admin.distributed.init_distributed.
+        world_size: Number of processes in distributed training.
+        backend: Distributed backend, 'gloo' or 'nccl'.
     """
 
     # This is needed to avoid strange crashes related to opencv
@@ -26,17 +32,61 @@ def run_training(train_module, train_name, cudnn_benchmark=True):
 
     torch.backends.cudnn.benchmark = cudnn_benchmark
 
-    print('Training:  {}  {}'.format(train_module, train_name))
-
     settings = ws_settings.Settings()
     settings.module_name = train_module
     settings.script_name = train_name
     settings.project_path = 'ltr/{}/{}'.format(train_module, train_name)
 
+    if rank is not None or world_size > 1:
+        if backend is None:
+            backend = distributed.default_backend(settings.use_gpu)
+        settings.local_rank = distributed.init_distributed(rank, world_size, backend)
+        settings.distributed = True
+        settings.rank = distributed.get_rank()
+        settings.world_size = distributed.get_world_size()
+
+        # Different random samples in each process
+        distributed.seed_process()
+    else:
+        settings.distributed = False
+        settings.rank = 0
+        settings.world_size = 1
+
+    if distributed.is_main_process():
+        print('Training:  {}  {}'.format(train_module, train_name))
+
     expr_module = importlib.import_module('ltr.train_settings.{}.{}'.format(train_module, train_name))
     expr_func = getattr(expr_module, 'run')
 
-    expr_func(settings)
+    try:
+        expr_func(settings)
+    finally:
+        distributed.cleanup_distributed()
+
+
+def _run_training_process(rank, train_module, train_name, cudnn_benchmark, world_size, backend, num_threads):
+    if num_threads is not None:
+        torch.set_num_threads(num_threads)
+    run_training(train_module, train_name, cudnn_benchmark, rank, world_size, backend)
+
+
+def launch_training(train_module, train_name, cudnn_benchmark=True, nproc=1, backend=None, master_port=29500):
+    """Runs the training in nproc processes on this machine, using distributed data parallel training. The processes
+    communicate using the given backend. With the gloo backend, the training can also run on the cpu, in which case the
+    available cpu threads are divided between the processes."""
+    if nproc <= 1:
+        run_training(train_module, train_name, cudnn_benchmark)
+        return
+
+    os.environ.setdefault('MASTER_ADDR', '127.0.0.1')
+    os.environ.setdefault('MASTER_PORT', str(master_port))
+
+    num_threads = None
+    if backend == 'gloo' or not torch.cuda.is_available():
+        num_threads = max(1, torch.get_num_threads() // nproc)
+
+    torch.multiprocessing.spawn(_run_training_process, nprocs=nproc,
+                                args=(train_module, train_name, cudnn_benchmark, nproc, backend, num_threads))
 
 
 def main():
@@ -44,10 +94,21 @@ def main():
     parser.add_argument('train_module', type=str, help='Name of module in the "train_settings/" folder.')
     parser.add_argument('train_name', type=str, help='Name of the train settings file.')
     parser.add_argument('--cudnn_benchmark', type=bool, default=True, help='Set cudnn benchmark on (1) or off (0) (default is on).')
+    parser.add_argument('--nproc', type=int, default=1, help='Number of processes for distributed training.')
+    parser.add_argument('--backend', type=str, default=None, choices=['gloo', 'nccl'],
+                        help='Distributed backend. Default is nccl if a GPU is available, otherwise gloo.')
+    parser.add_argument('--master_port', type=int, default=29500, help='Port used by the distributed processes.')
+    parser.add_argument('--env', action='store_true',
+                        help='Read the rank and world size from the environment, e.g. when launched with torchrun.')
 
     args = parser.parse_args()
 
-    run_training(args.train_module, args.train_name, args.cudnn_benchmark)
+    if args.env:
+        run_training(args.train_module, args.train_name, args.cudnn_benchmark, rank=None,
+                     world_size=int(os.environ['WORLD_SIZE']), backend=args.backend)
+    else:
+        launch_training(args.train_module, args.train_name, args.cudnn_benchmark, args.nproc, args.backend,
+                        args.master_port)
 
 
 if __name__ == '__main__':
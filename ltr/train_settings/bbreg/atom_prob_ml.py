@@ -67,7 +67,8 @@ def run(settings):
 
     # The sampler for training
     dataset_train = sampler.ATOMSampler([lasot_train, got10k_train, trackingnet_train, coco_train], [1,1,1,1],
-                                samples_per_epoch=1000*settings.batch_size, max_gap=200, processing=data_processing_train)
+                                samples_per_epoch=1000*settings.batch_size, max_gap=200, processing=data_processing_train,
+                                seed=settings.sampler_seed)
 
     # The loader for training
     loader_train = LTRLoader('train', dataset_train, training=True, batch_size=settings.batch_size, num_workers=settings.num_workers,
@@ -75,7 +76,7 @@ def run(settings):
 
     # The sampler for validation
     dataset_val = sampler.ATOMSampler([got10k_val], [1], samples_per_epoch=500*settings.batch_size, max_gap=200,
-                                      processing=data_processing_val)
+                                      processing=data_processing_val, seed=settings.sampler_seed)
 
     # The loader for validation
     loader_val = LTRLoader('val', dataset_val, training=False, batch_size=settings.batch_size, num_workers=settings.num_workers,
@@ -78,7 +78,7 @@ def run(settings):
     # Train sampler and loader
     dataset_train = sampler.DiMPSampler([lasot_train, got10k_train, trackingnet_train, coco_train], [0.25,1,1,1],
                                         samples_per_epoch=26000, max_gap=200, num_test_frames=3, num_train_frames=3,
-                                        processing=data_processing_train)
+                                        processing=data_processing_train, seed=settings.sampler_seed)
 
     loader_train = LTRLoader('train', dataset_train, training=True, batch_size=settings.batch_size, num_workers=settings.num_workers,
                              shuffle=True, drop_last=True, stack_dim=1)
@@ -86,7 +86,7 @@ def run(settings):
     # Validation samplers and loaders
     dataset_val = sampler.DiMPSampler([got10k_val], [1], samples_per_epoch=5000, max_gap=200,
                                       num_test_frames=3, num_train_frames=3,
-                                      processing=data_processing_val)
+                                      processing=data_processing_val, seed=settings.sampler_seed)
 
     loader_val = LTRLoader('val', dataset_val, training=False, batch_size=settings.batch_size, num_workers=settings.num_workers,
                            shuffle=False, drop_last=True, epoch_interval=5, stack_dim=1)
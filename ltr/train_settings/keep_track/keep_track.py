@@ -28,13 +28,20 @@ def run(settings):
     settings.scale_jitter_factor = {'train': 0.25, 'test': 0.5}
     settings.hinge_threshold = 0.05
 
+    # Precomputed features of the frozen backbone, see ltr/run_precompute_features.py. If set, only the matching module
+    # is run during training and the images are not loaded. Create the store with --num_views > 1 to keep the image
+    # augmentations of the self-supervised frames.
+    settings.feature_store_path = None
+
     # Train datasets
     lasot_dumped_train = LasotCandidateMatching(settings.env.lasot_dir,
-                                                settings.env.lasot_candidate_matching_dataset_path, split='train-train')
+                                                settings.env.lasot_candidate_matching_dataset_path, split='train-train',
+                                                feature_store=settings.feature_store_path)
 
     # Validation datasets
     lasot_dumped_val = LasotCandidateMatching(settings.env.lasot_dir,
-                                              settings.env.lasot_candidate_matching_dataset_path, split='train-val')
+                                              settings.env.lasot_candidate_matching_dataset_path, split='train-val',
+                                              feature_store=settings.feature_store_path)
 
 
     transform_train = tfm.Transform(tfm.ToTensor(),
@@ -59,25 +66,29 @@ def run(settings):
                                                                      samples_per_epoch=int(settings.batch_size*100),
                                                                      processing=processing_train, sup_modes=['self_sup','partial_sup'],
                                                                      frame_modes=['H', 'K', 'J'], p_frame_modes=[1., 0.5, 0.5],
-                                                                     subseq_modes=['HH','HK','HG'], p_subseq_modes=[1.0, 0.1, 0.1])
+                                                                     subseq_modes=['HH','HK','HG'], p_subseq_modes=[1.0, 0.1, 0.1],
+                                                                     seed=settings.sampler_seed)
 
     dataset_val = sampler.SequentialTargetCandidateMatchingSampler(lasot_dumped_val,
                                                                   samples_per_epoch=int(settings.batch_size * 10),
                                                                   processing=processing_val, sup_modes=['self_sup'],
                                                                   frame_modes=['G', 'H', 'J', 'K'],
-                                                                  p_frame_modes=[0.2, 0.4, 0.2, 0.2])
+                                                                  p_frame_modes=[0.2, 0.4, 0.2, 0.2],
+                                                                  seed=settings.sampler_seed)
 
     dataset_val_realHH = sampler.SequentialTargetCandidateMatchingSampler(lasot_dumped_val,
                                                                           samples_per_epoch=int(settings.batch_size * 5),
                                                                           processing=processing_val_real, sup_modes=['partial_sup'],
                                                                           subseq_modes=['HH'],
-                                                                          p_subseq_modes=[1.])
+                                                                          p_subseq_modes=[1.],
+                                                                          seed=settings.sampler_seed)
 
     dataset_val_realHK = sampler.SequentialTargetCandidateMatchingSampler(lasot_dumped_val,
                                                                           samples_per_epoch=int(settings.batch_size * 2),
                                                                           processing=processing_val_real, sup_modes=['partial_sup'],
                                                                           subseq_modes=['HK'],
-                                                                          p_subseq_modes=[1.])
+                                                                          p_subseq_modes=[1.],
+                                                                          seed=settings.sampler_seed)
 
     loader_train = LTRLoader('train', dataset_train, training=True, batch_size=settings.batch_size,
                              num_workers=settings.num_workers, shuffle=True, drop_last=True, stack_dim=1)
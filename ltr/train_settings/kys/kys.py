@@ -88,7 +88,7 @@ def run(settings):
                                        samples_per_epoch=settings.batch_size * 150,
                                        sequence_sample_info=sequence_sample_info,
                                        processing=data_processing_train,
-                                       sample_occluded_sequences=True)
+                                       sample_occluded_sequences=True, seed=settings.sampler_seed)
 
     loader_train = LTRLoader('train', dataset_train, training=True, batch_size=settings.batch_size,
                              num_workers=settings.num_workers,
@@ -97,7 +97,7 @@ def run(settings):
     # Validation samplers and loaders
     dataset_val = sampler.KYSSampler([got10k_val], [1], samples_per_epoch=1000,
                                      sequence_sample_info=sequence_sample_info, processing=data_processing_val,
-                                     sample_occluded_sequences=True)
+                                     sample_occluded_sequences=True, seed=settings.sampler_seed)
 
     loader_val = LTRLoader('val', dataset_val, training=False, batch_size=settings.batch_size,
                            num_workers=settings.num_workers,
@@ -71,12 +71,12 @@ def run(settings):
                                        samples_per_epoch=settings.batch_size * 1000, max_gap=100,
                                        num_test_frames=1,
                                        num_train_frames=1,
-                                       processing=data_processing_train)
+                                       processing=data_processing_train, seed=settings.sampler_seed)
     dataset_val = sampler.LWLSampler([ytvos_valid], [1],
                                      samples_per_epoch=settings.batch_size * 100, max_gap=100,
                                      num_test_frames=1,
                                      num_train_frames=1,
-                                     processing=data_processing_val)
+                                     processing=data_processing_val, seed=settings.sampler_seed)
 
     loader_train = LTRLoader('train', dataset_train, training=True, num_workers=settings.num_workers,
                              stack_dim=1, batch_size=settings.batch_size)
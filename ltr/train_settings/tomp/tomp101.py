@@ -103,7 +103,7 @@ def run(settings):
     dataset_train = sampler.DiMPSampler([lasot_train, got10k_train, trackingnet_train, coco_train], [1, 1, 1, 1],
                                         samples_per_epoch=settings.train_samples_per_epoch, max_gap=settings.max_gap,
                                         num_test_frames=settings.num_test_frames, num_train_frames=settings.num_train_frames,
-                                        processing=data_processing_train)
+                                        processing=data_processing_train, seed=settings.sampler_seed)
 
     loader_train = LTRLoader('train', dataset_train, training=True, batch_size=settings.batch_size, num_workers=settings.num_workers,
                              shuffle=True, drop_last=True, stack_dim=1)
@@ -111,7 +111,8 @@ def run(settings):
     # Validation samplers and loaders
     dataset_val = sampler.DiMPSampler([got10k_val], [1], samples_per_epoch=settings.val_samples_per_epoch,
                                       max_gap=settings.max_gap, num_test_frames=settings.num_test_frames,
-                                      num_train_frames=settings.num_train_frames, processing=data_processing_val)
+                                      num_train_frames=settings.num_train_frames, processing=data_processing_val,
+                                      seed=settings.sampler_seed)
 
     loader_val = LTRLoader('val', dataset_val, training=False, batch_size=settings.batch_size, num_workers=settings.num_workers,
                            shuffle=False, drop_last=True, epoch_interval=settings.val_epoch_interval, stack_dim=1)
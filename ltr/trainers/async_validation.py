@@ -0,0 +1,179 @@
+import copy
+import queue
+import atexit
+import traceback
+from collections import OrderedDict
+import torch
+import torch.multiprocessing as mp
+from ltr.admin import multigpu
+from ltr.admin.stats import AverageMeter
+
+
+def _loader_spec(loader, num_workers=None):
+    """ Arguments to re-create a validation loader in the validation process. The loader is re-created there, such
+    that it is not split over the processes in distributed training and can use its own number of workers. """
+    return {'name': loader.name, 'dataset': loader.dataset, 'training': False, 'batch_size': loader.batch_size,
+            'num_workers': loader.num_workers if num_workers is None else num_workers,
+            'collate_fn': loader.collate_fn, 'stack_dim': loader.stack_dim, 'pin_memory': loader.pin_memory,
+            'drop_last': loader.drop_last, 'batch_transform': getattr(loader, 'batch_transform', None)}
+
+
+def _validate(actor, loader, settings, device, epoch, use_amp, amp_dtype):
+    """ Runs one epoch of a validation loader and returns the averaged statistics. """
+    if hasattr(loader, 'set_epoch'):
+        loader.set_epoch(epoch)
+
+    stats = OrderedDict()
+    for data in loader:
+        data = data.to(device)
+
+        if loader.batch_transform is not None:
+            data = loader.batch_transform(data, stack_dim=loader.stack_dim)
+
+        data['epoch'] = epoch
+        data['settings'] = settings
+
+        with torch.autocast(device_type=torch.device(device).type, dtype=amp_dtype, enabled=use_amp):
+            _, batch_stats = actor(data)
+
+        for name, val in batch_stats.items():
+            if name not in stats:
+                stats[name] = AverageMeter()
+            stats[name].update(val, loader.batch_size)
+    return stats
+
+
+def _validation_process(actor, loader_specs, settings, device, num_threads, job_queue, result_queue):
+    """ Main function of the validation process. Loads the weights of each submitted job and runs the given loaders,
+    until None is received. """
+    from ltr.data.loader import LTRLoader
+
+    if num_threads is not None:
+        torch.set_num_threads(num_threads)
+
+    actor.to(device)
+    actor.train(False)
+    torch.set_grad_enabled(False)
+
+    loaders = {spec['name']: LTRLoader(**spec) for spec in loader_specs}
+    use_amp = getattr(settings, 'use_amp', False)
+    amp_dtype = getattr(settings, 'amp_dtype', torch.bfloat16)
+
+    parent = mp.parent_process()
+    while True:
+        try:
+            job = job_queue.get(timeout=10)
+        except queue.Empty:
+            if parent is not None and not parent.is_alive():
+                break
+            continue
+        if job is None:
+            break
+
+        epoch, state_dict, loader_names = job
+        try:
+            actor.net.load_state_dict(state_dict)
+            del state_dict
+            stats = OrderedDict((name, _validate(actor, loaders[name], settings, device, epoch, use_amp, amp_dtype))
+                                for name in loader_names)
+            result_queue.put((epoch, stats, None))
+        except Exception:
+            result_queue.put((epoch, None, traceback.format_exc()))
+
+
+class AsyncValidator:
+    """ Runs the validation loaders in a background process, such that the training continues while validating. For
+    each submitted epoch, a snapshot of the network weights is sent to the process, which evaluates the loaders using
+    its own data workers and threads. The statistics of the finished epochs are returned by poll and wait. Used by
+    LTRTrainer if settings.async_validation is True. """
+
+    def __init__(self, actor, loaders, settings, device, num_workers=None, num_threads=None, max_pending=1):
+        """
+        args:
+            actor - The actor. A copy of it, with the network on the cpu, is sent to the validation process.
+            loaders - The validation loaders.
+            settings - Training settings, passed to the actor in the data.
+            device - Device used by the validation process.
+            num_workers - Number of data workers per loader. The number of workers of the loaders is used if None.
+            num_threads - Number of torch threads of the validation process. Not changed if None.
+            max_pending - Maximum number of submitted epochs which are not finished. Submitting further epochs waits
+                          for the oldest one, which limits the memory used by the weight snapshots.
+        """
+        self.max_pending = max_pending
+        self._num_pending = 0
+        self._results = []
+
+        net = actor.net.module if multigpu.is_multi_gpu(actor.net) else actor.net
+        actor_copy = copy.copy(actor)
+        actor_copy.net = copy.deepcopy(net).to('cpu')
+
+        ctx = mp.get_context('spawn')
+        self._job_queue = ctx.Queue()
+        self._result_queue = ctx.Queue()
+        self._process = ctx.Process(target=_validation_process,
+                                    args=(actor_copy, [_loader_spec(l, num_workers) for l in loaders], settings,
+                                          str(device), num_threads, self._job_queue, self._result_queue),
+                                    daemon=False)
+        self._process.start()
+
+        # Stop the process at exit if close was not called, e.g. after a crash. Otherwise, the interpreter waits for it.
+        atexit.register(self._stop)
+
+    @property
+    def num_pending(self):
+        return self._num_pending
+
+    def submit(self, epoch, net, loader_names):
+        """ Validates the given loaders using a snapshot of the current weights of net. """
+        from ltr.trainers.base_trainer import _snapshot
+
+        while self._num_pending >= self.max_pending:
+            self._receive(block=True)
+
+        net = net.module if multigpu.is_multi_gpu(net) else net
+        self._job_queue.put((epoch, _snapshot(net.state_dict()), list(loader_names)))
+        self._num_pending += 1
+
+    def _receive(self, block):
+        try:
+            epoch, stats, error = self._result_queue.get(block=block, timeout=None if not block else 60)
+        except queue.Empty:
+            if block and not self._process.is_alive():
+                raise RuntimeError('The validation process exited unexpectedly.')
+            return False
+
+        self._num_pending -= 1
+        if error is not None:
+            raise RuntimeError('Asynchronous validation of epoch {} failed:\n{}'.format(epoch, error))
+        self._results.append((epoch, stats))
+        return True
+
+    def poll(self):
+        """ Returns the (epoch, stats) of the epochs finished since the last call, without waiting. stats maps the
+        loader names to the averaged statistics. """
+        while self._num_pending > 0 and self._receive(block=False):
+            pass
+        results, self._results = self._results, []
+        return results
+
+    def wait(self):
+        """ Waits until all submitted epochs are finished and returns their results, see poll. """
+        while self._num_pending > 0:
+            self._receive(block=True)
+        return self.poll()
+
+    def _stop(self):
+        if self._process is not None:
+            self._job_queue.put(None)
+
+    def close(self):
+        """ Waits for the submitted epochs, stops the validation process and returns the remaining results. """
+        if self._process is None:
+            return []
+        try:
+            results = self.wait()
+        finally:
+            self._job_queue.put(None)
+            self._process.join()
+            self._process = None
+        return results
@@ -1,8 +1,27 @@
 import os
+import re
+import copy
 import glob
+import time
 import torch
+import threading
 import traceback
-from ltr.admin import loading, multigpu
+from ltr.admin import loading, multigpu, distributed
+
+
+def _snapshot(obj):
+    """Copies all tensors of a (nested) state dict to cpu memory, such that the state can be written while the
+    training continues."""
+    if torch.is_tensor(obj):
+        return obj.detach().to('cpu', copy=True)
+    if isinstance(obj, dict):
+        out = type(obj)((key, _snapshot(val)) for key, val in obj.items())
+        if hasattr(obj, '_metadata'):
+            out._metadata = obj._metadata
+        return out
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_snapshot(val) for val in obj)
+    return obj
 
 
 class BaseTrainer:
@@ -29,12 +48,36 @@ class BaseTrainer:
         self.epoch = 0
         self.stats = {}
 
+        # Iteration at which the next training epoch is started, when resuming from a mid-epoch checkpoint
+        self._resume_iteration = 0
+        self._checkpoint_thread = None
+        self._last_checkpoint_time = time.time()
+
         self.device = getattr(settings, 'device', None)
-        if self.device is None:
+        if self.device is None and distributed.is_distributed() and torch.cuda.is_available() and settings.use_gpu:
+            # One device per process, selected in ltr.admin.distributed.init_distributed
+            self.device = torch.device('cuda', torch.cuda.current_device())
+        elif self.device is None:
             self.device = torch.device("cuda:0" if torch.cuda.is_available() and settings.use_gpu else "cpu")
 
         self.actor.to(self.device)
 
+        if distributed.is_distributed():
+            self._wrap_distributed()
+
+    def _wrap_distributed(self):
+        """Wraps the network in a DistributedModel, which averages the gradients over all processes."""
+        if isinstance(self.actor.net, multigpu.DistributedModel):
+            return
+        if multigpu.is_multi_gpu(self.actor.net):
+            raise ValueError('MultiGPU can not be combined with distributed training. Set settings.multi_gpu = False.')
+
+        device = torch.device(self.device)
+        self.actor.net = multigpu.DistributedModel(self.actor.net,
+                                                   device_ids=[device.index] if device.type == 'cuda' else None,
+                                                   find_unused_parameters=getattr(self.settings,
+                                                                                  'find_unused_parameters', True))
+
     def update_settings(self, settings=None):
         """Updates the trainer settings. Must be called to update internal settings."""
         if settings is not None:
@@ -43,8 +86,7 @@ class BaseTrainer:
         if self.settings.env.workspace_dir is not None:
             self.settings.env.workspace_dir = os.path.expanduser(self.settings.env.workspace_dir)
             self._checkpoint_dir = os.path.join(self.settings.env.workspace_dir, 'checkpoints')
-            if not os.path.exists(self._checkpoint_dir):
-                os.makedirs(self._checkpoint_dir)
+            os.makedirs(self._checkpoint_dir, exist_ok=True)
         else:
             self._checkpoint_dir = None
 
@@ -76,15 +118,17 @@ class BaseTrainer:
                         self.save_checkpoint()
             except:
                 print('Training crashed at epoch {}'.format(epoch))
+                self.wait_for_checkpoint()
                 if fail_safe:
                     self.epoch -= 1
                     load_latest = True
                     print('Traceback for the error!')
                     print(traceback.format_exc())
-                    print('Restarting training from last epoch ...')
+                    print('Restarting training from last checkpoint ...')
                 else:
                     raise
 
+        self.wait_for_checkpoint()
         print('Finished training!')
 
 
@@ -92,8 +136,40 @@ class BaseTrainer:
         raise NotImplementedError
 
 
-    def save_checkpoint(self):
-        """Saves a checkpoint of the network and other variables."""
+    def save_mid_epoch_checkpoint(self, iteration, last_step_iteration=None):
+        """Saves a mid-epoch checkpoint after the given training iteration, if settings.checkpoint_interval iterations
+        or settings.checkpoint_interval_minutes minutes have passed. Both are disabled by default.
+        args:
+            iteration - Training iteration after which the checkpoint is saved.
+            last_step_iteration - Iteration of the previous optimizer step. When the gradients are accumulated over
+                                  several iterations, the checkpoint is saved at the first optimizer step after each
+                                  multiple of settings.checkpoint_interval. Defaults to iteration - 1.
+        """
+        if not self._checkpoint_dir:
+            return
+
+        interval = getattr(self.settings, 'checkpoint_interval', None)
+        interval_minutes = getattr(self.settings, 'checkpoint_interval_minutes', None)
+        last_step_iteration = iteration - 1 if last_step_iteration is None else last_step_iteration
+
+        if (interval and iteration // interval > last_step_iteration // interval) or \
+                (interval_minutes and time.time() - self._last_checkpoint_time >= 60 * interval_minutes):
+            self.save_checkpoint(iteration)
+
+    def wait_for_checkpoint(self):
+        """Waits until the checkpoint being written in the background, if any, is finished."""
+        if self._checkpoint_thread is not None:
+            self._checkpoint_thread.join()
+            self._checkpoint_thread = None
+
+    def save_checkpoint(self, iteration=None):
+        """Saves a checkpoint of the network and other variables. If iteration is given, a mid-epoch checkpoint is
+        saved, from which the current epoch is resumed at the next iteration. If settings.async_checkpoint is True, a
+        snapshot of the state is taken and written to disk on a background thread. In distributed training, only the
+        main process saves checkpoints. All processes hold the same network and optimizer state."""
+
+        if not distributed.is_main_process():
+            return
 
         net = self.actor.net.module if multigpu.is_multi_gpu(self.actor.net) else self.actor.net
 
@@ -108,7 +184,8 @@ class BaseTrainer:
             'constructor': getattr(net, 'constructor', None),
             'optimizer': self.optimizer.state_dict(),
             'stats': self.stats,
-            'settings': self.settings
+            'settings': self.settings,
+            'iteration': iteration
         }
 
 
@@ -116,15 +193,51 @@ class BaseTrainer:
         if not os.path.exists(directory):
             os.makedirs(directory)
 
+        if iteration is None:
+            file_name = '{}_ep{:04d}'.format(net_type, self.epoch)
+        else:
+            file_name = '{}_partial_e{:04d}_i{:06d}'.format(net_type, self.epoch, iteration)
+
+        # Only one checkpoint is written at a time
+        self.wait_for_checkpoint()
+        self._last_checkpoint_time = time.time()
+
+        if getattr(self.settings, 'async_checkpoint', False):
+            state = _snapshot(state)
+            state['stats'] = copy.deepcopy(self.stats)
+            self._checkpoint_thread = threading.Thread(target=self._write_checkpoint,
+                                                       args=(state, directory, file_name, net_type))
+            self._checkpoint_thread.start()
+        else:
+            self._write_checkpoint(state, directory, file_name, net_type)
+
+    def _write_checkpoint(self, state, directory, file_name, net_type):
         # First save as a tmp file
-        tmp_file_path = '{}/{}_ep{:04d}.tmp'.format(directory, net_type, self.epoch)
+        tmp_file_path = '{}/{}.tmp'.format(directory, file_name)
         torch.save(state, tmp_file_path)
 
-        file_path = '{}/{}_ep{:04d}.pth.tar'.format(directory, net_type, self.epoch)
+        file_path = '{}/{}.pth.tar'.format(directory, file_name)
 
         # Now rename to actual checkpoint. os.rename seems to be atomic if files are on same filesystem. Not 100% sure
         os.rename(tmp_file_path, file_path)
 
+        # Remove the mid-epoch checkpoints which are superseded by this one
+        for path, epoch, iteration in self._list_partial_checkpoints(directory, net_type):
+            if path != file_path and (epoch < state['epoch'] or (epoch == state['epoch'] and
+                                                                 (state['iteration'] is None or
+                                                                  iteration < state['iteration']))):
+                os.remove(path)
+
+    @staticmethod
+    def _list_partial_checkpoints(directory, net_type):
+        """Returns the mid-epoch checkpoints as a sorted list of (path, epoch, iteration) tuples."""
+        checkpoints = []
+        for path in glob.glob('{}/{}_partial_e*_i*.pth.tar'.format(directory, net_type)):
+            match = re.search(r'_partial_e(\d+)_i(\d+)\.pth\.tar$', path)
+            if match is not None:
+                checkpoints.append((path, int(match.group(1)), int(match.group(2))))
+        return sorted(checkpoints, key=lambda c: (c[1], c[2]))
+
 
     def load_checkpoint(self, checkpoint = None, fields = None, ignore_fields = None, load_constructor = False):
         """Loads a network checkpoint file.
@@ -147,7 +260,14 @@ class BaseTrainer:
             # Load most recent checkpoint
             checkpoint_list = sorted(glob.glob('{}/{}/{}_ep*.pth.tar'.format(self._checkpoint_dir,
                                                                              self.settings.project_path, net_type)))
-            if checkpoint_list:
+            partial_list = self._list_partial_checkpoints('{}/{}'.format(self._checkpoint_dir,
+                                                                         self.settings.project_path), net_type)
+
+            # Use the latest mid-epoch checkpoint if its epoch is not finished
+            last_epoch = int(re.search(r'_ep(\d+)\.pth\.tar$', checkpoint_list[-1]).group(1)) if checkpoint_list else 0
+            if partial_list and partial_list[-1][1] > last_epoch:
+                checkpoint_path = partial_list[-1][0]
+            elif checkpoint_list:
                 checkpoint_path = checkpoint_list[-1]
             else:
                 print('No matching checkpoint file found')
@@ -180,7 +300,7 @@ class BaseTrainer:
             ignore_fields = ['settings']
 
             # Never load the scheduler. It exists in older checkpoints.
-        ignore_fields.extend(['lr_scheduler', 'constructor', 'net_type', 'actor_type', 'net_info'])
+        ignore_fields.extend(['lr_scheduler', 'constructor', 'net_type', 'actor_type', 'net_info', 'iteration'])
 
         # Load all fields
         for key in fields:
@@ -199,6 +319,12 @@ class BaseTrainer:
         if 'net_info' in checkpoint_dict and checkpoint_dict['net_info'] is not None:
             net.info = checkpoint_dict['net_info']
 
+        # A mid-epoch checkpoint resumes its epoch at the next iteration
+        if 'epoch' in fields and checkpoint_dict.get('iteration') is not None:
+            self.epoch -= 1
+            self._resume_iteration = checkpoint_dict['iteration']
+            print('Resuming epoch {} at iteration {}'.format(self.epoch + 1, self._resume_iteration + 1))
+
         # Update the epoch in lr scheduler
         if 'epoch' in fields:
             self.lr_scheduler.last_epoch = self.epoch
@@ -1,8 +1,13 @@
 import os
+import contextlib
 from collections import OrderedDict
 from ltr.trainers import BaseTrainer
+from ltr.admin import distributed
+from ltr.admin.multigpu import DistributedModel
 from ltr.admin.stats import AverageMeter, StatValue
 from ltr.admin.tensorboard import TensorboardWriter
+from ltr.trainers.async_validation import AsyncValidator
+from ltr.models.layers.checkpoint import set_activation_checkpointing
 import torch
 import torch.nn as nn
 import time
@@ -33,18 +38,55 @@ class LTRTrainer(BaseTrainer):
         # Initialize statistics variables
         self.stats = OrderedDict({loader.name: None for loader in self.loaders})
 
-        # Initialize tensorboard
-        tensorboard_writer_dir = os.path.join(self.settings.env.tensorboard_dir, self.settings.project_path)
-        self.tensorboard_writer = TensorboardWriter(tensorboard_writer_dir, [l.name for l in loaders])
+        # Initialize tensorboard. Only the main process writes the logs in distributed training.
+        self.tensorboard_writer = None
+        if distributed.is_main_process():
+            tensorboard_writer_dir = os.path.join(self.settings.env.tensorboard_dir, self.settings.project_path)
+            self.tensorboard_writer = TensorboardWriter(tensorboard_writer_dir, [l.name for l in loaders])
 
         self.move_data_to_gpu = getattr(settings, 'move_data_to_gpu', True)
 
         self.freeze_backbone_bn_layers = freeze_backbone_bn_layers
 
+        # Mixed precision. bfloat16 is used by default, which does not need loss scaling. Float16 autocast uses a
+        # gradient scaler on the GPU.
+        self.use_amp = getattr(settings, 'use_amp', False)
+        self.amp_dtype = getattr(settings, 'amp_dtype', torch.bfloat16)
+        self.device_type = torch.device(self.device).type
+        self.grad_scaler = torch.cuda.amp.GradScaler(enabled=self.use_amp and self.amp_dtype == torch.float16 and
+                                                     self.device_type == 'cuda')
+
+        # Recompute the activations of the Swin and transformer blocks in the backward pass instead of storing them,
+        # which allows larger batches at the cost of a second forward pass through these blocks
+        if getattr(settings, 'activation_checkpointing', False):
+            set_activation_checkpointing(self.actor.net)
+
+        # Number of batches over which the gradients are accumulated before each optimizer step
+        self.grad_accum_steps = getattr(settings, 'grad_accum_steps', 1)
+
+        # Synchronize the device before measuring the time of each stage. Otherwise, the asynchronous gpu work is
+        # attributed to the stage which happens to wait for it.
+        self.sync_timing = getattr(settings, 'sync_timing', False)
+
+        # Run the validation loaders in a background process on a snapshot of the weights, while the training
+        # continues. The statistics are merged under the epoch of the snapshot when finished. In distributed training,
+        # only the main process validates, on the complete validation sets.
+        self.async_validator = None
+        if getattr(settings, 'async_validation', False) and distributed.is_main_process():
+            val_loaders = [l for l in self.loaders if not l.training]
+            if len(val_loaders) > 0:
+                self.async_validator = AsyncValidator(
+                    self.actor, val_loaders, settings,
+                    device=getattr(settings, 'async_validation_device', self.device),
+                    num_workers=getattr(settings, 'async_validation_workers', None),
+                    num_threads=getattr(settings, 'async_validation_threads', max(1, torch.get_num_threads() // 4)),
+                    max_pending=getattr(settings, 'async_validation_max_pending', 1))
+
     def _set_default_settings(self):
         # Dict of all default values
         default = {'print_interval': 10,
                    'print_stats': None,
+                   'print_timing': False,
                    'description': ''}
 
         for param, default_value in default.items():
@@ -63,47 +105,239 @@ class LTRTrainer(BaseTrainer):
 
         self._init_timing()
 
-        for i, data in enumerate(loader, 1):
+        # Resume a partially finished training epoch, see BaseTrainer.load_checkpoint
+        start_iteration = self._resume_iteration if loader.training else 0
+        if loader.training:
+            self._resume_iteration = 0
+
+        if hasattr(loader, 'set_epoch') and loader.set_epoch(self.epoch, start_iteration):
+            # The loader skips directly to the start iteration
+            self._num_batches = start_iteration + len(loader)
+        else:
+            # Only the remaining number of iterations are run
+            self._num_batches = len(loader)
+
+        if start_iteration >= self._num_batches:
+            return
+
+        if loader.training:
+            self.optimizer.zero_grad()
+
+        loader_iter = iter(loader)
+        data_start_time = time.time()
+        last_step_iteration = start_iteration
+
+        for i, data in enumerate(loader_iter, start_iteration + 1):
+            # Time spent waiting for the batch, and the batches which are already prefetched by the workers. The wait
+            # for the first batch includes the start-up of the workers and is not recorded.
+            timing = {'data': time.time() - data_start_time} if i > start_iteration + 1 else {}
+            queue_depth = self._get_queue_depth(getattr(loader, 'iterator', loader_iter))
+            self._update_data_stats(data, queue_depth, loader)
+
             # get inputs
+            stage_time = time.time()
             if self.move_data_to_gpu:
                 data = data.to(self.device)
 
+            # batched data augmentation
+            if getattr(loader, 'batch_transform', None) is not None:
+                data = loader.batch_transform(data, stack_dim=loader.stack_dim)
+            stage_time = self._record_stage_time(timing, 'transfer', stage_time)
+
             data['epoch'] = self.epoch
             data['settings'] = self.settings
 
-            # forward pass
-            loss, stats = self.actor(data)
+            do_step = loader.training and ((i - start_iteration) % self.grad_accum_steps == 0 or
+                                           i >= self._num_batches)
 
-            # backward pass and update weights
-            if loader.training:
-                self.optimizer.zero_grad()
-                loss.backward()
+            # The gradients are only synchronized between the processes in the last accumulation step
+            sync_context = contextlib.nullcontext()
+            if loader.training and not do_step and isinstance(self.actor.net, DistributedModel):
+                sync_context = self.actor.net.no_sync()
+
+            with sync_context:
+                # forward pass
+                with torch.autocast(device_type=self.device_type, dtype=self.amp_dtype, enabled=self.use_amp):
+                    loss, stats = self.actor(data)
+                stage_time = self._record_stage_time(timing, 'forward', stage_time)
+
+                # backward pass
+                if loader.training:
+                    self.grad_scaler.scale(loss / self.grad_accum_steps).backward()
+                    stage_time = self._record_stage_time(timing, 'backward', stage_time)
+
+            # update weights
+            step_done = False
+            if do_step:
+                if isinstance(self.actor.net, DistributedModel) and not getattr(self.actor, 'calls_net_forward', True):
+                    # The gradients were not synchronized in the backward pass, since the forward was bypassed
+                    distributed.average_gradients(self.actor.net.parameters())
 
                 if hasattr(self.settings, 'grad_clip_max_norm'):
+                    self.grad_scaler.unscale_(self.optimizer)
                     torch.nn.utils.clip_grad_norm_(self.actor.net.parameters(), self.settings.grad_clip_max_norm)
 
-                self.optimizer.step()
+                self.grad_scaler.step(self.optimizer)
+                self.grad_scaler.update()
+                self.optimizer.zero_grad()
+                step_done = True
+                self._record_stage_time(timing, 'optimizer', stage_time)
 
             # update statistics
             self._update_stats(stats, loader.batch_size, loader)
+            self._update_timing_stats(timing, loader)
 
             # print statistics
             self._print_stats(i, loader, loader.batch_size)
 
+            # Mid-epoch checkpoints are only saved after an optimizer step, when no gradients are accumulated
+            if step_done:
+                self.save_mid_epoch_checkpoint(i, last_step_iteration)
+                last_step_iteration = i
+
+            if i >= self._num_batches:
+                break
+
+            data_start_time = time.time()
+
+        self._sync_stats(loader)
+
+    def _sync_stats(self, loader):
+        """Averages the statistics of the finished epoch over all processes in distributed training."""
+        if not distributed.is_distributed() or self.stats.get(loader.name) is None:
+            return
+
+        # The data loading statistics are local to each process, and the datasets sampled may differ between them
+        meters = [(name, val) for name, val in sorted(self.stats[loader.name].items())
+                  if isinstance(val, AverageMeter) and not name.startswith('Data/')]
+        sums = distributed.all_reduce_sum([val.sum for _, val in meters] + [val.count for _, val in meters])
+        for k, (name, val) in enumerate(meters):
+            val.sum, val.count = sums[k], sums[k + len(meters)]
+            val.avg = val.sum / val.count if val.count > 0 else 0
+
     def train_epoch(self):
         """Do one epoch for each loader."""
+        async_loaders = []
         for loader in self.loaders:
-            if self.epoch % loader.epoch_interval == 0:
-                self.cycle_dataset(loader)
+            if self.epoch % loader.epoch_interval != 0:
+                continue
+            if self._is_async(loader):
+                # Consecutive validation loaders are validated on the same snapshot
+                async_loaders.append(loader.name)
+                continue
+            self._submit_async_validation(async_loaders)
+            self.cycle_dataset(loader)
+        self._submit_async_validation(async_loaders)
 
         self._stats_new_epoch()
         self._write_tensorboard()
 
+        if self.async_validator is not None:
+            self._merge_async_stats(self.async_validator.poll())
+
+    def train(self, max_epochs, load_latest=False, fail_safe=True):
+        try:
+            super().train(max_epochs, load_latest, fail_safe)
+        finally:
+            if self.async_validator is not None:
+                self._merge_async_stats(self.async_validator.close())
+                self.async_validator = None
+
+    def load_checkpoint(self, *args, **kwargs):
+        # Results of epochs submitted before restarting from a checkpoint are discarded, the epochs are run again
+        if self.async_validator is not None:
+            try:
+                self.async_validator.wait()
+            except RuntimeError:
+                pass
+        return super().load_checkpoint(*args, **kwargs)
+
+    def _is_async(self, loader):
+        if self.async_validator is not None and not loader.training:
+            return True
+        # Only the main process validates in the background
+        return getattr(self.settings, 'async_validation', False) and not loader.training and \
+            distributed.is_distributed() and not distributed.is_main_process()
+
+    def _submit_async_validation(self, loader_names):
+        if loader_names and self.async_validator is not None:
+            self.async_validator.submit(self.epoch, self.actor.net, loader_names)
+        loader_names.clear()
+
+    def _merge_async_stats(self, results):
+        """Adds the statistics of the finished background validations to the stats and tensorboard, under the epoch
+        of their weight snapshot."""
+        for epoch, results_stats in results:
+            for name, new_stats in results_stats.items():
+                if self.stats.get(name) is None:
+                    self.stats[name] = OrderedDict()
+                for stat_name, val in new_stats.items():
+                    if stat_name not in self.stats[name]:
+                        self.stats[name][stat_name] = AverageMeter()
+                    meter = self.stats[name][stat_name]
+                    meter.val, meter.sum, meter.count, meter.avg = val.val, val.sum, val.count, val.avg
+                    meter.new_epoch()
+
+                print_str = '[%s: %d, async] ' % (name, epoch)
+                for stat_name, val in new_stats.items():
+                    if self.settings.print_stats is None or stat_name in self.settings.print_stats:
+                        print_str += '%s: %.5f  ,  ' % (stat_name, val.avg)
+                print(print_str[:-5])
+
+                if self.tensorboard_writer is not None:
+                    self.tensorboard_writer.write_epoch(OrderedDict({name: self.stats[name]}), epoch)
+
     def _init_timing(self):
         self.num_frames = 0
         self.start_time = time.time()
         self.prev_time = self.start_time
 
+    def _record_stage_time(self, timing, stage, start_time):
+        """Records the time since start_time for the given stage. Returns the end time, i.e. the start of the next
+        stage."""
+        if self.sync_timing and self.device_type == 'cuda':
+            torch.cuda.synchronize(self.device)
+        end_time = time.time()
+        timing[stage] = end_time - start_time
+        return end_time
+
+    @staticmethod
+    def _get_queue_depth(loader_iter):
+        """Number of batches which are loaded by the workers but not yet consumed. None if not available, e.g. when
+        loading in the main process."""
+        try:
+            ready = sum(1 for info in loader_iter._task_info.values() if len(info) == 2)
+            return loader_iter._data_queue.qsize() + ready
+        except (AttributeError, NotImplementedError):
+            return None
+
+    def _get_stat(self, loader, name):
+        if self.stats.get(loader.name) is None:
+            self.stats[loader.name] = OrderedDict()
+        if name not in self.stats[loader.name]:
+            self.stats[loader.name][name] = AverageMeter()
+        return self.stats[loader.name][name]
+
+    def _update_timing_stats(self, timing, loader):
+        """Average time per iteration of each stage, in ms."""
+        for stage, t in timing.items():
+            self._get_stat(loader, 'Time/' + stage).update(1000 * t)
+
+    def _update_data_stats(self, data, queue_depth, loader):
+        """Average worker queue depth and number of sampler retries per sample of each dataset. The retries are
+        reported by the samplers in data['sample_retries'], see SeedableSampler."""
+        if queue_depth is not None:
+            self._get_stat(loader, 'Data/queue_depth').update(queue_depth)
+
+        if not isinstance(data, dict) or 'sample_retries' not in data or 'dataset' not in data:
+            return
+
+        retries = data['sample_retries']
+        retries = retries.view(-1).tolist() if torch.is_tensor(retries) else [retries]
+        dataset_names = data['dataset'] if isinstance(data['dataset'], (list, tuple)) else [data['dataset']]
+        for name, r in zip(dataset_names, retries):
+            self._get_stat(loader, 'Data/retries/' + name).update(r)
+
     def _update_stats(self, new_stats: OrderedDict, batch_size, loader):
         # Initialize stats if not initialized yet
         if loader.name not in self.stats.keys() or self.stats[loader.name] is None:
@@ -120,14 +354,28 @@ class LTRTrainer(BaseTrainer):
         batch_fps = batch_size / (current_time - self.prev_time)
         average_fps = self.num_frames / (current_time - self.start_time)
         self.prev_time = current_time
-        if i % self.settings.print_interval == 0 or i == loader.__len__():
-            print_str = '[%s: %d, %d / %d] ' % (loader.name, self.epoch, i, loader.__len__())
+        num_batches = getattr(self, '_num_batches', loader.__len__())
+        if not distributed.is_main_process():
+            return
+        if i % self.settings.print_interval == 0 or i == num_batches:
+            print_str = '[%s: %d, %d / %d] ' % (loader.name, self.epoch, i, num_batches)
             print_str += 'FPS: %.1f (%.1f)  ,  ' % (average_fps, batch_fps)
             for name, val in self.stats[loader.name].items():
+                if self.settings.print_stats is None and name.startswith(('Time/', 'Data/')):
+                    continue
                 if (self.settings.print_stats is None or name in self.settings.print_stats) and hasattr(val, 'avg'):
                     print_str += '%s: %.5f  ,  ' % (name, val.avg)
             print(print_str[:-5])
 
+            if self.settings.print_timing:
+                timing_str = '[%s: %d, %d / %d] Time [ms]: ' % (loader.name, self.epoch, i, num_batches)
+                for name, val in self.stats[loader.name].items():
+                    if name.startswith('Time/'):
+                        timing_str += '%s: %.1f  ,  ' % (name[5:], val.avg)
+                if 'Data/queue_depth' in self.stats[loader.name]:
+                    timing_str += 'queue depth: %.1f  ,  ' % self.stats[loader.name]['Data/queue_depth'].avg
+                print(timing_str[:-5])
+
     def _stats_new_epoch(self):
         # Record learning rate
         for loader in self.loaders:
@@ -147,6 +395,9 @@ class LTRTrainer(BaseTrainer):
                     stat_value.new_epoch()
 
     def _write_tensorboard(self):
+        if self.tensorboard_writer is None:
+            return
+
         if self.epoch == 1:
             self.tensorboard_writer.write_info(self.settings.module_name, self.settings.script_name, self.settings.description)
 
@@ -0,0 +1,140 @@
+import sys
+import time
+import torch
+from ltr.trainers.base_trainer import BaseTrainer
+from ltr.admin.settings import StopSettings, run_partial_settings
+from ltr.models.layers.checkpoint import set_activation_checkpointing
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def _capture_trainer(trainer_class):
+    """ Replaces the trainer class in a train settings module. Stops the execution of the settings when the trainer is
+    created, such that the training is not started. """
+    def capture(actor, loaders, *args, **kwargs):
+        raise StopSettings((actor, loaders))
+    return capture
+
+
+def build_actor_and_loader(settings_name, settings=None):
+    """ Runs a train settings module until the trainer is created.
+    args:
+        settings_name - Name of the train settings, e.g. 'tomp.tomp50'
+        settings - ltr.admin.settings.Settings instance. A default one is created if None.
+    returns:
+        actor - the actor, containing the network
+        LTRLoader - the training loader
+        settings - the settings
+    """
+    result, settings = run_partial_settings(settings_name, BaseTrainer, _capture_trainer, settings)
+    if result is None:
+        raise RuntimeError('The train settings {} did not create a trainer.'.format(settings_name))
+    actor, loaders = result
+
+    train_loaders = [l for l in loaders if l.training]
+    if len(train_loaders) == 0:
+        raise RuntimeError('The train settings {} did not create a training loader.'.format(settings_name))
+    return actor, train_loaders[0], settings
+
+
+def _reset_peak_rss():
+    """ Resets the peak resident memory of the process, which is only supported on Linux. Returns whether it was
+    reset. """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss():
+    """ Peak resident memory of the process in bytes, since the last _reset_peak_rss on Linux. Otherwise, the peak
+    since the start of the process is returned. None if it can not be determined. """
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if resource is not None:
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return max_rss if sys.platform == 'darwin' else max_rss * 1024
+    return None
+
+
+def measure_training_step(actor, batches, settings, device, checkpointing, batch_transform=None, stack_dim=0):
+    """ Runs the forward and backward pass on the given batches, without updating the weights.
+    args:
+        checkpointing - Whether activation checkpointing is enabled, see ltr.models.layers.checkpoint.
+        batch_transform, stack_dim - Batched augmentation of the loader, applied after moving the data to the device.
+    returns:
+        dict - time per iteration (s, excluding the first one), and peak memory (bytes). On the gpu, the peak memory
+               allocated by torch is reported. On the cpu, the peak resident memory of the process is reported, see
+               _peak_rss.
+    """
+    set_activation_checkpointing(actor.net, checkpointing)
+    actor.train(True)
+    torch.set_grad_enabled(True)
+    use_cuda = torch.device(device).type == 'cuda'
+
+    use_amp = getattr(settings, 'use_amp', False)
+    amp_dtype = getattr(settings, 'amp_dtype', torch.bfloat16)
+
+    for p in actor.net.parameters():
+        p.grad = None
+    if use_cuda:
+        torch.cuda.synchronize(device)
+        torch.cuda.reset_peak_memory_stats(device)
+    else:
+        _reset_peak_rss()
+
+    times = []
+    for i, data in enumerate(batches):
+        data = data.to(device)
+        if batch_transform is not None:
+            data = batch_transform(data, stack_dim=stack_dim)
+        data['epoch'] = 1
+        data['settings'] = settings
+
+        t0 = time.time()
+        with torch.autocast(device_type=torch.device(device).type, dtype=amp_dtype, enabled=use_amp):
+            loss, _ = actor(data)
+        loss.backward()
+        if use_cuda:
+            torch.cuda.synchronize(device)
+        if i > 0:
+            times.append(time.time() - t0)
+
+        for p in actor.net.parameters():
+            p.grad = None
+
+    return {'time': sum(times) / max(len(times), 1),
+            'peak_memory': torch.cuda.max_memory_allocated(device) if use_cuda else _peak_rss()}
+
+
+def compare_checkpointing(actor, loader, settings, device, num_iters=10):
+    """ Measures the time per training iteration and the peak memory with and without activation checkpointing, on
+    the same num_iters + 1 batches of the loader. Checkpointing is measured first, such that its peak is also correct
+    if the peak resident memory can not be reset, see _peak_rss.
+    returns:
+        dict - results of measure_training_step for checkpointing False and True
+        int - number of modules with activation checkpointing support
+    """
+    num_modules = set_activation_checkpointing(actor.net, False)
+
+    batches = []
+    for data in loader:
+        batches.append(data)
+        if len(batches) > num_iters:
+            break
+
+    actor.to(device)
+    results = {c: measure_training_step(actor, batches, settings, device, c, getattr(loader, 'batch_transform', None),
+                                        loader.stack_dim)
+               for c in (True, False)}
+    return results, num_modules
@@ -1,6 +1,7 @@
 import numpy as np
 from pytracking.evaluation.environment import env_settings
 from ltr.data.image_loader import imread_indexed
+from ltr.data.shard_storage import ShardStorage, ShardFrame
 from collections import OrderedDict
 
 
@@ -19,7 +20,8 @@ class BaseDataset:
 
 
 class Sequence:
-    """Class for the sequence in an evaluation."""
+    """Class for the sequence in an evaluation. The frames are given as a list of image paths, or ShardFrame references
+    (see ltr.data.shard_storage) if the frames are read from packed shards."""
     def __init__(self, name, frames, dataset, ground_truth_rect, ground_truth_seg=None, init_data=None,
                  object_class=None, target_visible=None, object_ids=None, multiobj_mode=False):
         self.name = name
@@ -172,4 +174,17 @@ class SequenceList(list):
         return SequenceList(super(SequenceList, self).__add__(other))
 
     def copy(self):
-        return SequenceList(super(SequenceList, self).copy())
\ No newline at end of file
+        return SequenceList(super(SequenceList, self).copy())
+
+    def use_shard_storage(self, shard_dir, root=None, use_mmap=False):
+        """Read the frames from packed shards created with ltr.data.shard_storage.pack_frames. The frames contained in
+        the storage are replaced by ShardFrame references, the others are still read from their paths.
+        args:
+            shard_dir - Directory of the shard storage.
+            root - Dataset root the frame paths are relative to. Defaults to the root used when packing.
+            use_mmap - Read through memory maps instead of positioned reads.
+        """
+        storage = ShardStorage(shard_dir, root, use_mmap)
+        for seq in self:
+            seq.frames = [ShardFrame(f, storage) if f in storage else f for f in seq.frames]
+        return self
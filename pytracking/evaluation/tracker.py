@@ -11,6 +11,7 @@ import matplotlib.patches as patches
 from pytracking.utils.plotting import draw_figure, overlay_mask
 from pytracking.utils.convert_vot_anno_to_rect import convert_vot_anno_to_rect
 from ltr.data.bounding_box_utils import masks_to_bboxes
+from ltr.data.shard_storage import ShardFrame
 from pytracking.evaluation.multi_object_wrapper import MultiObjectWrapper
 from pathlib import Path
 import torch
@@ -681,6 +682,8 @@ class Tracker:
             print("Resetting target pos to gt!")
 
     def _read_image(self, image_file: str):
+        if isinstance(image_file, ShardFrame):
+            return image_file.load()
         im = cv.imread(image_file)
         return cv.cvtColor(im, cv.COLOR_BGR2RGB)
 
@@ -1,2 +1,2 @@
-from .tensorlist import TensorList
+from .tensorlist import TensorList, PackedTensorList
 from .tensordict import TensorDict
\ No newline at end of file
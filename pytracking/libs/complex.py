@@ -3,7 +3,7 @@ from pytracking.libs.tensorlist import tensor_operation
 
 
 def is_complex(a: torch.Tensor) -> bool:
-    return a.dim() >= 4 and a.shape[-1] == 2
+    return a.is_complex()
 
 
 def is_real(a: torch.Tensor) -> bool:
@@ -12,46 +12,18 @@ def is_real(a: torch.Tensor) -> bool:
 
 @tensor_operation
 def mult(a: torch.Tensor, b: torch.Tensor):
-    """Pointwise complex multiplication of complex tensors."""
+    """Pointwise complex multiplication of complex tensors. One of them may be real."""
 
-    if is_real(a):
-        if a.dim() >= b.dim():
-            raise ValueError('Incorrect dimensions.')
-        # a is real
-        return mult_real_cplx(a, b)
-    if is_real(b):
-        if b.dim() >= a.dim():
-            raise ValueError('Incorrect dimensions.')
-        # b is real
-        return mult_real_cplx(b, a)
-
-    # Both complex
-    c = mult_real_cplx(a[..., 0], b)
-    c[..., 0] -= a[..., 1] * b[..., 1]
-    c[..., 1] += a[..., 1] * b[..., 0]
-    return c
+    return a * b
 
 
 @tensor_operation
 def mult_conj(a: torch.Tensor, b: torch.Tensor):
     """Pointwise complex multiplication of complex tensors, with conjugate on b: a*conj(b)."""
 
-    if is_real(a):
-        if a.dim() >= b.dim():
-            raise ValueError('Incorrect dimensions.')
-        # a is real
-        return mult_real_cplx(a, conj(b))
     if is_real(b):
-        if b.dim() >= a.dim():
-            raise ValueError('Incorrect dimensions.')
-        # b is real
-        return mult_real_cplx(b, a)
-
-    # Both complex
-    c = mult_real_cplx(b[...,0], a)
-    c[..., 0] += a[..., 1] * b[..., 1]
-    c[..., 1] -= a[..., 0] * b[..., 1]
-    return c
+        return a * b
+    return a * b.conj()
 
 
 @tensor_operation
@@ -59,22 +31,16 @@ def mult_real_cplx(a: torch.Tensor, b: torch.Tensor):
     """Pointwise complex multiplication of real tensor a with complex tensor b."""
 
     if is_real(b):
-        raise ValueError('Last dimension must have length 2.')
+        raise ValueError('b must be complex.')
 
-    return a.unsqueeze(-1) * b
+    return a * b
 
 
 @tensor_operation
 def div(a: torch.Tensor, b: torch.Tensor):
-    """Pointwise complex division of complex tensors."""
+    """Pointwise complex division of complex tensors. b may be real."""
 
-    if is_real(b):
-        if b.dim() >= a.dim():
-            raise ValueError('Incorrect dimensions.')
-        # b is real
-        return div_cplx_real(a, b)
-
-    return div_cplx_real(mult_conj(a, b), abs_sqr(b))
+    return a / b
 
 
 @tensor_operation
@@ -82,9 +48,9 @@ def div_cplx_real(a: torch.Tensor, b: torch.Tensor):
     """Pointwise complex division of complex tensor a with real tensor b."""
 
     if is_real(a):
-        raise ValueError('Last dimension must have length 2.')
+        raise ValueError('a must be complex.')
 
-    return a / b.unsqueeze(-1)
+    return a / b
 
 
 @tensor_operation
@@ -92,9 +58,9 @@ def abs_sqr(a: torch.Tensor):
     """Squared absolute value."""
 
     if is_real(a):
-        raise ValueError('Last dimension must have length 2.')
+        raise ValueError('a must be complex.')
 
-    return torch.sum(a*a, -1)
+    return a.real * a.real + a.imag * a.imag
 
 
 @tensor_operation
@@ -102,9 +68,9 @@ def abs(a: torch.Tensor):
     """Absolute value."""
 
     if is_real(a):
-        raise ValueError('Last dimension must have length 2.')
+        raise ValueError('a must be complex.')
 
-    return torch.sqrt(abs_sqr(a))
+    return a.abs()
 
 
 @tensor_operation
@@ -112,10 +78,9 @@ def conj(a: torch.Tensor):
     """Complex conjugate."""
 
     if is_real(a):
-        raise ValueError('Last dimension must have length 2.')
+        raise ValueError('a must be complex.')
 
-    # return a * torch.Tensor([1, -1], device=a.device)
-    return complex(a[...,0], -a[...,1])
+    return torch.conj_physical(a)
 
 
 @tensor_operation
@@ -123,9 +88,9 @@ def real(a: torch.Tensor):
     """Real part."""
 
     if is_real(a):
-        raise ValueError('Last dimension must have length 2.')
+        raise ValueError('a must be complex.')
 
-    return a[..., 0]
+    return a.real
 
 
 @tensor_operation
@@ -133,9 +98,9 @@ def imag(a: torch.Tensor):
     """Imaginary part."""
 
     if is_real(a):
-        raise ValueError('Last dimension must have length 2.')
+        raise ValueError('a must be complex.')
 
-    return a[..., 1]
+    return a.imag
 
 
 @tensor_operation
@@ -147,35 +112,25 @@ def complex(a: torch.Tensor, b: torch.Tensor = None):
     elif a is None:
         a = b.new_zeros(b.shape)
 
-    return torch.cat((a.unsqueeze(-1), b.unsqueeze(-1)), -1)
+    return torch.complex(a, b)
 
 
 @tensor_operation
 def mtimes(a: torch.Tensor, b: torch.Tensor, conj_a=False, conj_b=False):
-    """Complex matrix multiplication of complex tensors.
-    The dimensions (-3, -2) are matrix multiplied. -1 is the complex dimension."""
+    """Complex matrix multiplication of complex tensors. The last two dimensions are matrix multiplied.
+    One of the tensors may be real, in which case it is promoted to complex."""
 
     if is_real(a):
-        if a.dim() >= b.dim():
-            raise ValueError('Incorrect dimensions.')
-        return mtimes_real_complex(a, b, conj_b=conj_b)
+        a = a.to(b.dtype)
     if is_real(b):
-        if b.dim() >= a.dim():
-            raise ValueError('Incorrect dimensions.')
-        return mtimes_complex_real(a, b, conj_a=conj_a)
+        b = b.to(a.dtype)
 
-    if not conj_a and not conj_b:
-        return complex(torch.matmul(a[..., 0], b[..., 0]) - torch.matmul(a[..., 1], b[..., 1]),
-                       torch.matmul(a[..., 0], b[..., 1]) + torch.matmul(a[..., 1], b[..., 0]))
-    if conj_a and not conj_b:
-        return complex(torch.matmul(a[..., 0], b[..., 0]) + torch.matmul(a[..., 1], b[..., 1]),
-                       torch.matmul(a[..., 0], b[..., 1]) - torch.matmul(a[..., 1], b[..., 0]))
-    if not conj_a and conj_b:
-        return complex(torch.matmul(a[..., 0], b[..., 0]) + torch.matmul(a[..., 1], b[..., 1]),
-                       torch.matmul(a[..., 1], b[..., 0]) - torch.matmul(a[..., 0], b[..., 1]))
-    if conj_a and conj_b:
-        return complex(torch.matmul(a[..., 0], b[..., 0]) - torch.matmul(a[..., 1], b[..., 1]),
-                       -torch.matmul(a[..., 0], b[..., 1]) - torch.matmul(a[..., 1], b[..., 0]))
+    if conj_a:
+        a = a.conj()
+    if conj_b:
+        b = b.conj()
+
+    return torch.matmul(a, b)
 
 
 @tensor_operation
@@ -183,10 +138,7 @@ def mtimes_real_complex(a: torch.Tensor, b: torch.Tensor, conj_b=False):
     if is_real(b):
         raise ValueError('Incorrect dimensions.')
 
-    if not conj_b:
-        return complex(torch.matmul(a, b[..., 0]), torch.matmul(a, b[..., 1]))
-    if conj_b:
-        return complex(torch.matmul(a, b[..., 0]), -torch.matmul(a, b[..., 1]))
+    return mtimes(a, b, conj_b=conj_b)
 
 
 @tensor_operation
@@ -194,18 +146,27 @@ def mtimes_complex_real(a: torch.Tensor, b: torch.Tensor, conj_a=False):
     if is_real(a):
         raise ValueError('Incorrect dimensions.')
 
-    if not conj_a:
-        return complex(torch.matmul(a[..., 0], b), torch.matmul(a[..., 1], b))
-    if conj_a:
-        return complex(torch.matmul(a[..., 0], b), -torch.matmul(a[..., 1], b))
+    return mtimes(a, b, conj_a=conj_a)
 
 
 @tensor_operation
 def exp_imag(a: torch.Tensor):
     """Complex exponential with imaginary input: e^(i*a)"""
 
-    a = a.unsqueeze(-1)
-    return torch.cat((torch.cos(a), torch.sin(a)), -1)
+    return torch.polar(torch.ones_like(a), a)
+
 
+@tensor_operation
+def real_to_batch(a: torch.Tensor):
+    """Reshapes the complex tensor a of dims (..., C, H, W) into a real tensor of dims (-1, 1, H, W), with the real and
+    imaginary parts of each channel next to each other. Allows applying real convolutions to complex data."""
+
+    return torch.view_as_real(a).movedim(-1, -3).reshape(-1, 1, a.shape[-2], a.shape[-1])
 
 
+@tensor_operation
+def batch_to_complex(a: torch.Tensor, shape):
+    """Inverse of real_to_batch. The output has dims (*shape[:-2], a.shape[-2], a.shape[-1])."""
+
+    a = a.reshape(*shape[:-2], 2, a.shape[-2], a.shape[-1])
+    return torch.view_as_complex(a.movedim(-3, -1).contiguous())
@@ -1,3 +1,4 @@
+import functools
 import torch
 import math
 from pytracking import fourier
@@ -72,7 +73,15 @@ def cubic_spline_fourier(f, a):
 
 
 def get_interp_fourier(sz: torch.Tensor, method='ideal', bicubic_param=0.5, centering=True, windowing=False, device='cpu'):
+    """Fourier coefficients of the interpolation kernel. The returned tensors are cached per size and settings and
+    must not be modified in-place."""
+    return _get_interp_fourier(int(sz[0]), int(sz[1]), method, bicubic_param, centering, windowing, str(device))
 
+
+@functools.lru_cache(maxsize=32)
+def _get_interp_fourier(sz0, sz1, method, bicubic_param, centering, windowing, device):
+
+    sz = torch.Tensor([sz0, sz1])
     ky, kx = fourier.get_frequency_coord(sz)
 
     if method=='ideal':
@@ -99,7 +108,7 @@ def interpolate_dft(a: torch.Tensor, interp_fs) -> torch.Tensor:
     if isinstance(interp_fs, torch.Tensor):
         return complex.mult(a, interp_fs)
     if isinstance(interp_fs, (tuple, list)):
-        return complex.mult(complex.mult(a, interp_fs[0]), interp_fs[1])
+        return complex.mult(a, complex.mult(interp_fs[0], interp_fs[1]))
     raise ValueError('"interp_fs" must be tensor or tuple of tensors.')
 
 
@@ -131,14 +140,14 @@ def get_reg_filter(sz: torch.Tensor, target_sz: torch.Tensor, params):
                   torch.abs(wcg/reg_scale[1])**params.reg_window_power) + params.reg_window_min
 
     # Compute DFT and enforce sparsity
-    reg_window_dft = torch.rfft(reg_window, 2) / sz.prod()
+    reg_window_dft = torch.fft.rfft2(reg_window) / sz.prod()
     reg_window_dft_abs = complex.abs(reg_window_dft)
-    reg_window_dft[reg_window_dft_abs < params.reg_sparsity_threshold * reg_window_dft_abs.max(), :] = 0
+    reg_window_dft[reg_window_dft_abs < params.reg_sparsity_threshold * reg_window_dft_abs.max()] = 0
 
     # Do the inverse transform to correct for the window minimum
-    reg_window_sparse = torch.irfft(reg_window_dft, 2, signal_sizes=sz.long().tolist())
-    reg_window_dft[0,0,0,0,0] += params.reg_window_min - sz.prod() * reg_window_sparse.min()
-    reg_window_dft = complex.real(fourier.rfftshift2(reg_window_dft))
+    reg_window_sparse = torch.fft.irfft2(reg_window_dft, s=sz.long().tolist())
+    reg_window_dft[0,0,0,0] += params.reg_window_min - sz.prod() * reg_window_sparse.min()
+    reg_window_dft = complex.real(fourier.rfftshift2(reg_window_dft)).contiguous()
 
     # Remove zeros
     max_inds,_ = reg_window_dft.nonzero().max(dim=0)
@@ -1,3 +1,4 @@
+import functools
 import torch
 import torch.nn.functional as F
 from pytracking import complex, TensorList
@@ -21,14 +22,14 @@ def cfft2(a):
     """Do FFT and center the low frequency component.
     Always produces odd (full) output sizes."""
 
-    return rfftshift2(torch.rfft(a, 2))
+    return rfftshift2(torch.fft.rfft2(a))
 
 
 @tensor_operation
 def cifft2(a, signal_sizes=None):
     """Do inverse FFT corresponding to cfft2."""
 
-    return torch.irfft(irfftshift2(a), 2, signal_sizes=signal_sizes)
+    return torch.fft.irfft2(irfftshift2(a), s=signal_sizes)
 
 
 @tensor_operation
@@ -56,21 +57,21 @@ def sample_fs(a: torch.Tensor, grid_sz: torch.Tensor = None, rescale = True):
     pad_right = int((tot_pad[1]+1)/2)
 
     if rescale:
-        return grid_sz.prod().item() * cifft2(F.pad(a, (0, 0, 0, pad_right, pad_top, pad_bottom)), signal_sizes=grid_sz.long().tolist())
+        return grid_sz.prod().item() * cifft2(F.pad(a, (0, pad_right, pad_top, pad_bottom)), signal_sizes=grid_sz.long().tolist())
     else:
-        return cifft2(F.pad(a, (0, 0, 0, pad_right, pad_top, pad_bottom)), signal_sizes=grid_sz.long().tolist())
+        return cifft2(F.pad(a, (0, pad_right, pad_top, pad_bottom)), signal_sizes=grid_sz.long().tolist())
 
 
-def get_frequency_coord(sz, add_complex_dim = False, device='cpu'):
-    """Frequency coordinates."""
+def get_frequency_coord(sz, device='cpu'):
+    """Frequency coordinates. The returned tensors are cached per size and device and must not be modified in-place."""
 
-    ky = torch.arange(-int((sz[0]-1)/2), int(sz[0]/2+1), dtype=torch.float32, device=device).view(1,1,-1,1)
-    kx = torch.arange(0, int(sz[1]/2+1), dtype=torch.float32, device=device).view(1,1,1,-1)
+    return _get_frequency_coord(int(sz[0]), int(sz[1]), str(device))
 
-    if add_complex_dim:
-        ky = ky.unsqueeze(-1)
-        kx = kx.unsqueeze(-1)
 
+@functools.lru_cache(maxsize=64)
+def _get_frequency_coord(sz0, sz1, device):
+    ky = torch.arange(-int((sz0-1)/2), int(sz0/2+1), dtype=torch.float32, device=device).view(1,1,-1,1)
+    kx = torch.arange(0, int(sz1/2+1), dtype=torch.float32, device=device).view(1,1,1,-1)
     return ky, kx
 
 
@@ -81,15 +82,15 @@ def shift_fs(a: torch.Tensor, shift: torch.Tensor):
         a : The fourier coefficiens of the sample.
         shift : The shift to be performed normalized to the range [-pi, pi]."""
 
-    if a.dim() != 5:
-        raise ValueError('a must be the Fourier coefficients, a 5-dimensional tensor.')
+    if a.dim() != 4 or not a.is_complex():
+        raise ValueError('a must be the Fourier coefficients, a 4-dimensional complex tensor.')
 
     if shift[0] == 0 and shift[1] == 0:
         return a
 
     ky, kx = get_frequency_coord((a.shape[2], 2*a.shape[3]-1), device=a.device)
 
-    return complex.mult(complex.mult(a, complex.exp_imag(shift[0].item()*ky)), complex.exp_imag(shift[1].item()*kx))
+    return complex.mult(a, complex.exp_imag(shift[0].item()*ky + shift[1].item()*kx))
 
 
 def sum_fs(a: TensorList) -> torch.Tensor:
@@ -98,18 +99,18 @@ def sum_fs(a: TensorList) -> torch.Tensor:
     s = None
     mid = None
 
-    for e in sorted(a, key=lambda elem: elem.shape[-3], reverse=True):
+    for e in sorted(a, key=lambda elem: elem.shape[-2], reverse=True):
         if s is None:
             s = e.clone()
-            mid = int((s.shape[-3] - 1) / 2)
+            mid = int((s.shape[-2] - 1) / 2)
         else:
             # Compute coordinates
-            top = mid - int((e.shape[-3] - 1) / 2)
-            bottom = mid + int(e.shape[-3] / 2) + 1
-            right = e.shape[-2]
+            top = mid - int((e.shape[-2] - 1) / 2)
+            bottom = mid + int(e.shape[-2] / 2) + 1
+            right = e.shape[-1]
 
             # Add the data
-            s[..., top:bottom, :right, :] += e
+            s[..., top:bottom, :right] += e
 
     return s
 
@@ -139,7 +140,9 @@ def sum_fs12(a: TensorList) -> torch.Tensor:
 @tensor_operation
 def inner_prod_fs(a: torch.Tensor, b: torch.Tensor):
     if complex.is_complex(a) and complex.is_complex(b):
-        return 2 * (a.reshape(-1) @ b.reshape(-1)) - a[:, :, :, 0, :].reshape(-1) @ b[:, :, :, 0, :].reshape(-1)
+        # Real part of the complex inner product, i.e. the inner product of the real and imaginary parts
+        return 2 * torch.vdot(b.reshape(-1), a.reshape(-1)).real - \
+               torch.vdot(b[:, :, :, 0].reshape(-1), a[:, :, :, 0].reshape(-1)).real
     elif complex.is_real(a) and complex.is_real(b):
         return 2 * (a.reshape(-1) @ b.reshape(-1)) - a[:, :, :, 0].reshape(-1) @ b[:, :, :, 0].reshape(-1)
     else:
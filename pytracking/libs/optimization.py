@@ -1,7 +1,7 @@
 import torch
 import torch.autograd
 import math
-from pytracking.libs import TensorList
+from pytracking.libs import TensorList, PackedTensorList
 from pytracking.utils.plotting import plot_graph
 from ltr.models.layers.activation import softmax_reg
 
@@ -15,10 +15,14 @@ class L2Problem:
 
     def ip_input(self, a, b):
         """Inner product of the input space."""
+        if isinstance(a, PackedTensorList):
+            return a.dot(b)
         return sum(a.view(-1) @ b.view(-1))
 
     def ip_output(self, a, b):
         """Inner product of the output space."""
+        if isinstance(a, PackedTensorList):
+            return a.dot(b)
         return sum(a.view(-1) @ b.view(-1))
 
     def M1(self, x):
@@ -37,6 +41,8 @@ class MinimizationProblem:
 
     def ip_input(self, a, b):
         """Inner product of the input space."""
+        if isinstance(a, PackedTensorList):
+            return a.dot(b)
         return sum(a.view(-1) @ b.view(-1))
 
     def M1(self, x):
@@ -47,13 +53,17 @@ class MinimizationProblem:
 
 
 class ConjugateGradientBase:
-    """Conjugate Gradient optimizer base class. Implements the CG loop."""
+    """Conjugate Gradient optimizer base class. Implements the CG loop.
+    If packed is True, the CG vectors (residual, search direction etc.) are stored as PackedTensorLists, such that the
+    vector updates and inner products are performed with a single kernel instead of one per tensor in the list."""
 
-    def __init__(self, fletcher_reeves = True, standard_alpha = True, direction_forget_factor = 0, debug = False):
+    def __init__(self, fletcher_reeves = True, standard_alpha = True, direction_forget_factor = 0, debug = False,
+                 packed = False):
         self.fletcher_reeves = fletcher_reeves
         self.standard_alpha = standard_alpha
         self.direction_forget_factor = direction_forget_factor
         self.debug = debug
+        self.packed = packed
 
         # State
         self.p = None
@@ -89,6 +99,11 @@ class ConjugateGradientBase:
         else:
             r = self.b - self.A(x)
 
+        if self.packed:
+            r = r.pack()
+            if self.p is not None and not r.same_layout(self.p):
+                self.reset_state()
+
         # Norms of residuals etc for debugging
         resvec = None
         if self.debug:
@@ -125,6 +140,8 @@ class ConjugateGradientBase:
                 self.p = z + self.p * beta
 
             q = self.A(self.p)
+            if self.packed:
+                q = q.pack()
             pq = self.ip(self.p, q)
 
             if self.standard_alpha:
@@ -169,6 +186,8 @@ class ConjugateGradientBase:
 
     def ip(self, a, b):
         # Implements the inner product
+        if isinstance(a, PackedTensorList) and a.same_layout(b):
+            return a.ip(b)
         return a.view(-1) @ b.view(-1)
 
     def residual_norm(self, r):
@@ -200,8 +219,9 @@ class ConjugateGradient(ConjugateGradientBase):
     """Conjugate Gradient optimizer, performing single linearization of the residuals in the start."""
 
     def __init__(self, problem: L2Problem, variable: TensorList, cg_eps = 0.0, fletcher_reeves = True,
-                 standard_alpha = True, direction_forget_factor = 0, debug = False, plotting = False, visdom=None):
-        super().__init__(fletcher_reeves, standard_alpha, direction_forget_factor, debug or plotting)
+                 standard_alpha = True, direction_forget_factor = 0, debug = False, plotting = False, visdom=None,
+                 packed = False):
+        super().__init__(fletcher_reeves, standard_alpha, direction_forget_factor, debug or plotting, packed)
 
         self.problem = problem
         self.x = variable
@@ -295,8 +315,8 @@ class GaussNewtonCG(ConjugateGradientBase):
 
     def __init__(self, problem: L2Problem, variable: TensorList, cg_eps = 0.0, fletcher_reeves = True,
                  standard_alpha = True, direction_forget_factor = 0, debug = False, analyze = False, plotting = False,
-                 visdom=None):
-        super().__init__(fletcher_reeves, standard_alpha, direction_forget_factor, debug or analyze or plotting)
+                 visdom=None, packed = False):
+        super().__init__(fletcher_reeves, standard_alpha, direction_forget_factor, debug or analyze or plotting, packed)
 
         self.problem = problem
         self.x = variable
@@ -524,8 +544,8 @@ class NewtonCG(ConjugateGradientBase):
 
     def __init__(self, problem: MinimizationProblem, variable: TensorList, init_hessian_reg = 0.0, hessian_reg_factor = 1.0,
                  cg_eps = 0.0, fletcher_reeves = True, standard_alpha = True, direction_forget_factor = 0,
-                 debug = False, analyze = False, plotting = False, fig_num=(10, 11, 12)):
-        super().__init__(fletcher_reeves, standard_alpha, direction_forget_factor, debug or analyze or plotting)
+                 debug = False, analyze = False, plotting = False, fig_num=(10, 11, 12), packed = False):
+        super().__init__(fletcher_reeves, standard_alpha, direction_forget_factor, debug or analyze or plotting, packed)
 
         self.problem = problem
         self.x = variable
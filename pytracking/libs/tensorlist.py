@@ -146,6 +146,17 @@ class TensorList(list):
     def concat(self, other):
         return TensorList(super(TensorList, self).__add__(other))
 
+    def pack(self):
+        """Returns a PackedTensorList with the same content if all elements are tensors with the same dtype and device.
+        Otherwise self is returned."""
+        if isinstance(self, PackedTensorList):
+            return self
+        if len(self) == 0 or not all(torch.is_tensor(e) for e in self):
+            return self
+        if any(e.dtype != self[0].dtype or e.device != self[0].device for e in self):
+            return self
+        return PackedTensorList.from_tensors(self)
+
     def copy(self):
         return TensorList(super(TensorList, self).copy())
 
@@ -184,6 +195,219 @@ class TensorList(list):
         return isinstance(a, (TensorList, list))
 
 
+class _PackedLayout:
+    """Shapes and offsets of the elements in a PackedTensorList. Shared by all lists with the same layout."""
+
+    def __init__(self, shapes):
+        self.shapes = tuple(torch.Size(sz) for sz in shapes)
+        self.numels = [sz.numel() for sz in self.shapes]
+        self.offsets = [0]
+        for n in self.numels:
+            self.offsets.append(self.offsets[-1] + n)
+        self._segment_ids = {}
+        self._numels = {}
+
+    def __len__(self):
+        return len(self.shapes)
+
+    def __eq__(self, other):
+        return isinstance(other, _PackedLayout) and self.shapes == other.shapes
+
+    def __hash__(self):
+        return hash(self.shapes)
+
+    @property
+    def is_scalar(self):
+        return all(n == 1 for n in self.numels)
+
+    def segment_ids(self, device):
+        """Element index of every buffer entry."""
+        if device not in self._segment_ids:
+            self._segment_ids[device] = torch.repeat_interleave(torch.arange(len(self), device=device),
+                                                                self.numels_tensor(device))
+        return self._segment_ids[device]
+
+    def numels_tensor(self, device):
+        if device not in self._numels:
+            self._numels[device] = torch.tensor(self.numels, dtype=torch.long, device=device)
+        return self._numels[device]
+
+
+class PackedTensorList(TensorList):
+    """TensorList where the elements are views into a single contiguous 1D buffer. Elementwise operations with scalars,
+    with per-element scalars or with another PackedTensorList of the same layout are performed on the buffer with a
+    single kernel. All other operations fall back to the element-wise TensorList implementation.
+
+    Assigning to an element copies into the buffer, such that the elements always stay views. In-place operations
+    that change the autograd state (e.g. detach_ or requires_grad_) are not supported on the elements."""
+
+    # Tensor methods that are applied element-wise and can hence be performed on the buffer directly
+    _elementwise_methods = ('abs', 'clamp', 'clamp_min', 'clamp_max', 'sqrt', 'exp', 'log', 'sign', 'neg',
+                            'reciprocal', 'clone', 'detach', 'conj', 'float', 'double', 'half', 'to', 'cpu', 'cuda')
+    _elementwise_inplace_methods = ('abs_', 'clamp_', 'clamp_min_', 'clamp_max_', 'sqrt_', 'exp_', 'log_', 'neg_',
+                                    'reciprocal_', 'zero_', 'fill_')
+
+    def __init__(self, buffer: torch.Tensor, layout):
+        if not isinstance(layout, _PackedLayout):
+            layout = _PackedLayout(layout)
+        if buffer.dim() != 1 or buffer.numel() != layout.offsets[-1]:
+            raise ValueError('Buffer size does not match the layout.')
+
+        super().__init__([buffer[start:end].view(sz) for start, end, sz in
+                          zip(layout.offsets[:-1], layout.offsets[1:], layout.shapes)])
+        self.buffer = buffer
+        self.layout = layout
+
+    @staticmethod
+    def from_tensors(tensors):
+        """Copies the given tensors into a new buffer."""
+        return PackedTensorList(torch.cat([t.reshape(-1) for t in tensors]), [t.shape for t in tensors])
+
+    def same_layout(self, other):
+        return isinstance(other, PackedTensorList) and self.layout == other.layout
+
+    def __setitem__(self, key, value):
+        if not isinstance(key, int):
+            raise TypeError('PackedTensorList only supports assignment to single elements.')
+        elem = super().__getitem__(key)
+        if value is not elem:
+            elem.copy_(value)
+
+    def __deepcopy__(self, memodict={}):
+        return PackedTensorList(copy.deepcopy(self.buffer, memodict), self.layout)
+
+    def _wrap(self, buffer):
+        return PackedTensorList(buffer, self.layout)
+
+    def _buffer_operand(self, other):
+        """Returns an operand that can be combined with the buffer, or None if the element-wise fallback is needed."""
+        if isinstance(other, PackedTensorList):
+            if self.layout == other.layout:
+                return other.buffer
+            if len(other.layout) == len(self.layout) and other.layout.is_scalar:
+                return torch.repeat_interleave(other.buffer, self.layout.numels_tensor(other.buffer.device),
+                                               output_size=self.buffer.numel())
+            return None
+        if isinstance(other, (int, float)):
+            return other
+        if torch.is_tensor(other):
+            return other.reshape(1) if other.numel() == 1 else None
+        if TensorList._iterable(other):
+            # One scalar per element
+            if len(other) != len(self) or not all(isinstance(e, (int, float)) or
+                                                  (torch.is_tensor(e) and e.numel() == 1) for e in other):
+                return None
+            scalars = torch.stack([torch.as_tensor(e, dtype=self.buffer.dtype, device=self.buffer.device).reshape(())
+                                   for e in other])
+            return torch.repeat_interleave(scalars, self.layout.numels_tensor(self.buffer.device),
+                                           output_size=self.buffer.numel())
+        return None
+
+    def _binary_op(self, other, op, fallback):
+        operand = self._buffer_operand(other)
+        if operand is None:
+            return fallback(self, other)
+        return self._wrap(op(self.buffer, operand))
+
+    def _inplace_op(self, other, op, fallback):
+        operand = self._buffer_operand(other)
+        if operand is None:
+            return fallback(self, other)
+        op(self.buffer, operand)
+        return self
+
+    def __add__(self, other):
+        return self._binary_op(other, lambda a, b: a + b, TensorList.__add__)
+
+    def __radd__(self, other):
+        return self._binary_op(other, lambda a, b: b + a, TensorList.__radd__)
+
+    def __iadd__(self, other):
+        return self._inplace_op(other, lambda a, b: a.add_(b), TensorList.__iadd__)
+
+    def __sub__(self, other):
+        return self._binary_op(other, lambda a, b: a - b, TensorList.__sub__)
+
+    def __rsub__(self, other):
+        return self._binary_op(other, lambda a, b: b - a, TensorList.__rsub__)
+
+    def __isub__(self, other):
+        return self._inplace_op(other, lambda a, b: a.sub_(b), TensorList.__isub__)
+
+    def __mul__(self, other):
+        return self._binary_op(other, lambda a, b: a * b, TensorList.__mul__)
+
+    def __rmul__(self, other):
+        return self._binary_op(other, lambda a, b: b * a, TensorList.__rmul__)
+
+    def __imul__(self, other):
+        return self._inplace_op(other, lambda a, b: a.mul_(b), TensorList.__imul__)
+
+    def __truediv__(self, other):
+        return self._binary_op(other, lambda a, b: a / b, TensorList.__truediv__)
+
+    def __rtruediv__(self, other):
+        return self._binary_op(other, lambda a, b: b / a, TensorList.__rtruediv__)
+
+    def __itruediv__(self, other):
+        return self._inplace_op(other, lambda a, b: a.div_(b), TensorList.__itruediv__)
+
+    def __le__(self, other):
+        return self._binary_op(other, lambda a, b: a <= b, TensorList.__le__)
+
+    def __ge__(self, other):
+        return self._binary_op(other, lambda a, b: a >= b, TensorList.__ge__)
+
+    def __pos__(self):
+        return self._wrap(+self.buffer)
+
+    def __neg__(self):
+        return self._wrap(-self.buffer)
+
+    def copy(self):
+        return self._wrap(self.buffer)
+
+    def axpy_(self, alpha, x):
+        """In-place self += alpha * x, where alpha is a scalar or has one scalar per element."""
+        x_operand = self._buffer_operand(x)
+        alpha_operand = self._buffer_operand(alpha)
+        if x_operand is None or alpha_operand is None or not torch.is_tensor(x_operand):
+            self += x * alpha
+        elif isinstance(alpha_operand, (int, float)):
+            self.buffer.add_(x_operand, alpha=alpha_operand)
+        else:
+            self.buffer.addcmul_(x_operand, alpha_operand)
+        return self
+
+    def dot(self, other):
+        """Inner product over all elements."""
+        if not self.same_layout(other):
+            return sum(self.view(-1) @ other.view(-1))
+        return self.buffer @ other.buffer
+
+    def ip(self, other):
+        """Inner products of the corresponding elements, as a PackedTensorList with one scalar per element."""
+        if not self.same_layout(other):
+            return self.view(-1) @ other.view(-1)
+        prod = self.buffer * other.buffer
+        ip = prod.new_zeros(len(self)).index_add_(0, self.layout.segment_ids(prod.device), prod)
+        return PackedTensorList(ip, [torch.Size()] * len(self))
+
+    def __getattr__(self, name):
+        if name in PackedTensorList._elementwise_methods:
+            def apply_buffer(*args, **kwargs):
+                return self._wrap(getattr(self.buffer, name)(*args, **kwargs))
+            return apply_buffer
+
+        if name in PackedTensorList._elementwise_inplace_methods:
+            def apply_buffer_inplace(*args, **kwargs):
+                getattr(self.buffer, name)(*args, **kwargs)
+                return self
+            return apply_buffer_inplace
+
+        return super().__getattr__(name)
+
+
 
 def tensor_operation(op):
     def islist(a):
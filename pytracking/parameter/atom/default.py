@@ -30,6 +30,7 @@ def parameters():
     params.fletcher_reeves = False      # Use the Fletcher-Reeves (true) or Polak-Ribiere (false) formula in the Conjugate Gradient
     params.standard_alpha = True        # Use the standard formula for computing the step length in Conjugate Gradient
     params.CG_forgetting_rate = None	# Forgetting rate of the last conjugate direction
+    params.packed_tensorlist = True     # Store the Conjugate Gradient vectors in a single buffer to fuse the vector operations
 
     # Learning parameters for each feature type
     deep_params.learning_rate = 0.01                # Learning rate
@@ -66,6 +66,9 @@ def parameters():
     params.use_certainty_for_weight_computation = True
     params.certainty_for_weight_computation_ths = 0.5
     params.local_max_candidate_score_th = 0.1
+    params.skip_matching_for_consistent_candidates = True
+    params.matching_skip_max_displacement = 1.0
+    params.matching_sinkhorn_tolerance = 1e-3
     params.target_candidate_matching_net = NetWrapper(net_path='keep_track.pth.tar', use_gpu=params.use_gpu)
 
     params.vot_anno_conversion_type = 'preserve_area'
@@ -166,7 +166,7 @@ class ATOM(BaseTracker):
             if optimizer == 'GaussNewtonCG':
                 self.joint_optimizer = GaussNewtonCG(self.joint_problem, joint_var, debug=(self.params.debug >= 1),
                                                      plotting=(self.params.debug >= 3), analyze=analyze_convergence,
-                                                     visdom=self.visdom)
+                                                     visdom=self.visdom, packed=self.params.get('packed_tensorlist', False))
             elif optimizer == 'GradientDescentL2':
                 self.joint_optimizer = GradientDescentL2(self.joint_problem, joint_var, self.params.optimizer_step_length, self.params.optimizer_momentum, plotting=(self.params.debug >= 3), debug=(self.params.debug >= 1),
                                                          visdom=self.visdom)
@@ -199,7 +199,8 @@ class ATOM(BaseTracker):
         if optimizer == 'GaussNewtonCG':
             self.filter_optimizer = ConjugateGradient(self.conv_problem, self.filter, fletcher_reeves=self.params.fletcher_reeves,
                                                       direction_forget_factor=self.params.direction_forget_factor, debug=(self.params.debug>=1),
-                                                      plotting=(self.params.debug>=3), visdom=self.visdom)
+                                                      plotting=(self.params.debug>=3), visdom=self.visdom,
+                                                      packed=self.params.get('packed_tensorlist', False))
         elif optimizer == 'GradientDescentL2':
             self.filter_optimizer = GradientDescentL2(self.conv_problem, self.filter, self.params.optimizer_step_length,
                                                       self.params.optimizer_momentum, debug=(self.params.debug >= 1),
@@ -1,5 +1,6 @@
 import torch
 from pytracking import optimization, TensorList, operation
+from pytracking.libs import PackedTensorList
 import math
 
 
@@ -48,6 +49,13 @@ class FactorizedConvProblem(optimization.L2Problem):
 
     def ip_input(self, a: TensorList, b: TensorList):
         num = len(a) // 2       # Number of filters
+
+        if isinstance(a, PackedTensorList) and a.same_layout(b):
+            # Inner products of all filters and projection matrices in one go
+            ip = a.ip(b)
+            ip_out = ip[:num] + ip[num:]
+            return ip_out.concat(ip_out.clone())
+
         a_filter = a[:num]
         b_filter = b[:num]
         a_P = a[num:]
@@ -96,4 +104,6 @@ class ConvProblem(optimization.L2Problem):
     def ip_input(self, a: TensorList, b: TensorList):
         # return a.reshape(-1) @ b.reshape(-1)
         # return (a * b).sum()
+        if isinstance(a, PackedTensorList) and a.same_layout(b):
+            return a.ip(b)
         return operation.conv2d(a, b).view(-1)
@@ -131,7 +131,7 @@ class ECO(BaseTracker):
         # Initialize first-frame training samples
         num_init_samples = train_xf.size(0)
         self.init_sample_weights = TensorList([xf.new_ones(1) / xf.shape[0] for xf in train_xf])
-        self.init_training_samples = train_xf.permute(2, 3, 0, 1, 4)
+        self.init_training_samples = train_xf.permute(2, 3, 0, 1)
 
 
         # Sample counters and weights
@@ -143,11 +143,11 @@ class ECO(BaseTracker):
 
         # Initialize memory
         self.training_samples = TensorList(
-            [xf.new_zeros(xf.shape[2], xf.shape[3], self.params.sample_memory_size, cdim, 2) for xf, cdim in zip(train_xf, self.compressed_dim)])
+            [xf.new_zeros(xf.shape[2], xf.shape[3], self.params.sample_memory_size, cdim) for xf, cdim in zip(train_xf, self.compressed_dim)])
 
         # Initialize filter
         self.filter = TensorList(
-            [xf.new_zeros(1, cdim, xf.shape[2], xf.shape[3], 2) for xf, cdim in zip(train_xf, self.compressed_dim)])
+            [xf.new_zeros(1, cdim, xf.shape[2], xf.shape[3]) for xf, cdim in zip(train_xf, self.compressed_dim)])
 
         # Do joint optimization
         self.joint_problem = FactorizedConvProblem(self.init_training_samples, self.yf, self.reg_filter, self.projection_matrix, self.params, self.init_sample_weights)
@@ -160,7 +160,7 @@ class ECO(BaseTracker):
         # Re-project samples with the new projection matrix
         compressed_samples = complex.mtimes(self.init_training_samples, self.projection_matrix)
         for train_samp, init_samp in zip(self.training_samples, compressed_samples):
-            train_samp[:,:,:init_samp.shape[2],:,:] = init_samp
+            train_samp[:,:,:init_samp.shape[2],:] = init_samp
 
         # Initialize optimizer
         self.filter_optimizer = FilterOptim(self.params, self.reg_energy)
@@ -340,7 +340,7 @@ class ECO(BaseTracker):
         # Update weights and get index to replace
         replace_ind = self.update_sample_weights()
         for train_samp, xf, ind in zip(self.training_samples, sample_xf, replace_ind):
-            train_samp[:,:,ind:ind+1,:,:] = xf.permute(2, 3, 0, 1, 4)
+            train_samp[:,:,ind:ind+1,:] = xf.permute(2, 3, 0, 1)
 
 
     def update_sample_weights(self):
@@ -381,5 +381,5 @@ class ECO(BaseTracker):
 
     def symmetrize_filter(self):
         for hf in self.filter:
-            hf[:,:,:,0,:] /= 2
-            hf[:,:,:,0,:] += complex.conj(hf[:,:,:,0,:].flip((2,)))
\ No newline at end of file
+            hf[:,:,:,0] /= 2
+            hf[:,:,:,0] += complex.conj(hf[:,:,:,0].flip((2,)))
\ No newline at end of file
@@ -8,7 +8,7 @@ import math
 class FactorizedConvProblem(optimization.L2Problem):
     def __init__(self, training_samples: TensorList, yf:TensorList, reg_filter: torch.Tensor, init_proj_mat: TensorList, params, sample_weights: torch.Tensor = None):
         self.training_samples = training_samples
-        self.yf = complex.complex(yf).permute(2, 3, 0, 1, 4)
+        self.yf = complex.complex(yf).permute(2, 3, 0, 1)
         self.reg_filter = reg_filter
         self.sample_weights_sqrt = None if sample_weights is None else sample_weights.sqrt()
         self.params = params
@@ -25,7 +25,6 @@ class FactorizedConvProblem(optimization.L2Problem):
         self.diag_M = (1 - self.params.precond_reg_param) * (self.params.precond_data_param * self.sample_energy +
                             (1 - self.params.precond_data_param) * self.sample_energy.mean(1, keepdim=True)) + \
                       self.params.precond_reg_param * self.reg_energy
-        self.diag_M.unsqueeze_(-1)
 
         # Projection matrix part of preconditioner
         self.diag_M.extend(self.params.precond_proj_param * (self.proj_energy + self.params.projection_reg))
@@ -41,7 +40,7 @@ class FactorizedConvProblem(optimization.L2Problem):
         P = x[len(x)//2:]
 
         compressed_samples = complex.mtimes(self.training_samples, P)
-        residuals = complex.mtimes(compressed_samples, hf.permute(2, 3, 1, 0, 4))  # (h, w, num_samp, num_filt, 2)
+        residuals = complex.mtimes(compressed_samples, hf.permute(2, 3, 1, 0))  # (h, w, num_samp, num_filt)
         residuals = residuals - self.yf
 
         if self.sample_weights_sqrt is not None:
@@ -50,23 +49,23 @@ class FactorizedConvProblem(optimization.L2Problem):
 
         # Add spatial regularization
         for hfe, reg_filter in zip(hf, self.reg_filter):
-            reg_pad1 = min(reg_filter.shape[-2] - 1, hfe.shape[-3] - 1)
-            reg_pad2 = min(reg_filter.shape[-1] - 1, hfe.shape[-2] - 1)
+            reg_pad1 = min(reg_filter.shape[-2] - 1, hfe.shape[-2] - 1)
+            reg_pad2 = min(reg_filter.shape[-1] - 1, hfe.shape[-1] - 1)
 
             # Add part needed for convolution
             if reg_pad2 > 0:
-                hfe_left_padd = complex.conj(hfe[...,1:reg_pad2+1,:].clone().detach().flip((2,3)))
-                hfe_conv = torch.cat([hfe_left_padd, hfe], -2)
+                hfe_left_padd = complex.conj(hfe[...,1:reg_pad2+1].clone().detach().flip((2,3)))
+                hfe_conv = torch.cat([hfe_left_padd, hfe], -1)
             else:
                 hfe_conv = hfe.clone()
 
-            # Shift data to batch dimension
-            hfe_conv = hfe_conv.permute(0,1,4,2,3).reshape(-1, 1, hfe_conv.shape[-3], hfe_conv.shape[-2])
+            # Shift real and imaginary parts to batch dimension
+            hfe_conv_real = complex.real_to_batch(hfe_conv)
 
             # Do first convolution
-            hfe_conv = F.conv2d(hfe_conv, reg_filter, padding=(reg_pad1, reg_pad2))
+            hfe_conv_real = F.conv2d(hfe_conv_real, reg_filter, padding=(reg_pad1, reg_pad2))
 
-            residuals.append(hfe_conv)
+            residuals.append(complex.batch_to_complex(hfe_conv_real, hfe_conv.shape))
 
         # Add regularization for projection matrix
         residuals.extend(math.sqrt(self.params.projection_reg) * P)
@@ -93,8 +92,8 @@ class FactorizedConvProblem(optimization.L2Problem):
 
     def ip_output(self, a: TensorList, b: TensorList):
         num = len(a) // 3       # Number of filters
-        a_data = a[:num].permute(2,3,0,1,4)
-        b_data = b[:num].permute(2,3,0,1,4)
+        a_data = a[:num].permute(2,3,0,1)
+        b_data = b[:num].permute(2,3,0,1)
         a_filt_reg = a[num:2*num]
         b_filt_reg = b[num:2*num]
         a_P_reg = a[2*num:]
@@ -104,10 +103,8 @@ class FactorizedConvProblem(optimization.L2Problem):
         ip_filt_reg = ip_data.new_zeros(1)
 
         for ar, br, res_data, reg_filter in zip(a_filt_reg, b_filt_reg, a_data, self.reg_filter):
-            reg_pad2 = min(reg_filter.shape[-1] - 1, res_data.shape[-2] - 1)
-            arp = ar.reshape(1, -1, 2, ar.shape[2], ar.shape[3]).permute(0, 1, 3, 4, 2)
-            brp = br.reshape(1, -1, 2, br.shape[2], br.shape[3]).permute(0, 1, 3, 4, 2)
-            ip_filt_reg += fourier.inner_prod_fs(arp[:,:,:,2*reg_pad2:,:], brp[:,:,:,2*reg_pad2:,:])
+            reg_pad2 = min(reg_filter.shape[-1] - 1, res_data.shape[-1] - 1)
+            ip_filt_reg += fourier.inner_prod_fs(ar[:,:,:,2*reg_pad2:], br[:,:,:,2*reg_pad2:])
 
         ip_P_reg = sum(a_P_reg.view(-1) @ b_P_reg.view(-1))
 
@@ -133,7 +130,7 @@ class FilterOptim(optimization.ConjugateGradientBase):
 
     def register(self, filter, training_samples, yf, sample_weights, reg_filter):
         self.filter = filter
-        self.training_samples = training_samples    # (h, w, num_samples, num_channels, 2)
+        self.training_samples = training_samples    # (h, w, num_samples, num_channels)
         self.yf = yf
         self.sample_weights = sample_weights
         self.reg_filter = reg_filter
@@ -151,7 +148,7 @@ class FilterOptim(optimization.ConjugateGradientBase):
                 self.sample_energy = (1 - self.params.precond_learning_rate) * self.sample_energy + self.params.precond_learning_rate * new_sample_energy
 
         # Compute right hand side
-        self.b = complex.mtimes(self.sample_weights.view(1,1,1,-1), self.training_samples).permute(2,3,0,1,4)
+        self.b = complex.mtimes(self.sample_weights.view(1,1,1,-1), self.training_samples).permute(2,3,0,1)
         self.b = complex.mult_conj(self.yf, self.b)
 
         self.diag_M = (1 - self.params.precond_reg_param) * (self.params.precond_data_param * self.sample_energy +
@@ -167,35 +164,35 @@ class FilterOptim(optimization.ConjugateGradientBase):
 
     def A(self, hf: TensorList):
         # Classify
-        sh = complex.mtimes(self.training_samples, hf.permute(2,3,1,0,4)) # (h, w, num_samp, num_filt, 2)
+        sh = complex.mtimes(self.training_samples, hf.permute(2,3,1,0)) # (h, w, num_samp, num_filt)
         sh = complex.mult(self.sample_weights.view(1,1,-1,1), sh)
 
         # Multiply with transpose
-        hf_out = complex.mtimes(sh.permute(0,1,3,2,4), self.training_samples, conj_b=True).permute(2,3,0,1,4)
+        hf_out = complex.mtimes(sh.permute(0,1,3,2), self.training_samples, conj_b=True).permute(2,3,0,1)
 
         # Add regularization
         for hfe, hfe_out, reg_filter in zip(hf, hf_out, self.reg_filter):
-            reg_pad1 = min(reg_filter.shape[-2] - 1, hfe.shape[-3] - 1)
-            reg_pad2 = min(reg_filter.shape[-1] - 1, 2*hfe.shape[-2]- 2)
+            reg_pad1 = min(reg_filter.shape[-2] - 1, hfe.shape[-2] - 1)
+            reg_pad2 = min(reg_filter.shape[-1] - 1, 2*hfe.shape[-1]- 2)
 
             # Add part needed for convolution
             if reg_pad2 > 0:
-                hfe_conv = torch.cat([complex.conj(hfe[...,1:reg_pad2+1,:].flip((2,3))), hfe], -2)
+                hfe_conv = torch.cat([complex.conj(hfe[...,1:reg_pad2+1].flip((2,3))), hfe], -1)
             else:
                 hfe_conv = hfe.clone()
 
-            # Shift data to batch dimension
-            hfe_conv = hfe_conv.permute(0,1,4,2,3).reshape(-1, 1, hfe_conv.shape[-3], hfe_conv.shape[-2])
+            # Shift real and imaginary parts to batch dimension
+            hfe_conv = complex.real_to_batch(hfe_conv)
 
             # Do first convolution
             hfe_conv = F.conv2d(hfe_conv, reg_filter, padding=(reg_pad1, reg_pad2))
 
             # Do second convolution
-            remove_size = min(reg_pad2, hfe.shape[-2]-1)
+            remove_size = min(reg_pad2, hfe.shape[-1]-1)
             hfe_conv = F.conv2d(hfe_conv[...,remove_size:], reg_filter)
 
             # Reshape back and add
-            hfe_out += hfe_conv.reshape(hfe.shape[0], hfe.shape[1], 2, hfe.shape[2], hfe.shape[3]).permute(0,1,3,4,2)
+            hfe_out += complex.batch_to_complex(hfe_conv, hfe.shape)
 
         return hf_out
 
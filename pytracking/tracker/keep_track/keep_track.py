@@ -264,17 +264,25 @@ class KeepTrack(BaseTracker):
             return translation_vec, scale_ind, scores, flag, max_score1, matching_visualization_data
 
         current_candidates = self.extract_descriptors_and_keypoints(backbone_feat1, score_map1, search_area_box1)
+        encoded_descriptors = None
 
         if self.previous_candidates is None or (self.frame_num - self.previous_candidates['frame_num']) > 1:
             translation_vec, scale_ind, s, flag = self.localize_target(score_map1, sample_pos, sample_scales)
             self.candidate_collection = None
 
         else:
+            consistent_matches = None
+            if self.params.get('skip_matching_for_consistent_candidates', False):
+                consistent_matches = self.match_consistent_candidates(self.previous_candidates, current_candidates)
+
             # Check if candidate matching can be skipped.
             if (self.previous_candidates['scores'].shape[0] == 1 and current_candidates['scores'].shape[0] == 1 and
                     self.previous_candidates['scores'].max() > 0.5 and current_candidates['scores'].max() > 0.5):
                 match_preds = {'matches1': torch.zeros(1).long(), 'match_scores1': torch.ones(1)}
 
+            elif consistent_matches is not None:
+                match_preds = {'matches1': consistent_matches, 'match_scores1': torch.ones(consistent_matches.shape[0])}
+
             else:
                 match_preds = self.extract_matches(descriptors0=self.previous_candidates['descriptors'],
                                                    img_coords0=self.previous_candidates['img_coords'],
@@ -282,7 +290,9 @@ class KeepTrack(BaseTracker):
                                                    descriptors1=current_candidates['descriptors'],
                                                    img_coords1=current_candidates['img_coords'],
                                                    scores1=current_candidates['scores'],
-                                                   image_shape=img_shape)
+                                                   image_shape=img_shape,
+                                                   encoded_descriptors0=self.previous_candidates['encoded_descriptors'])
+                encoded_descriptors = match_preds.get('encoded_descriptors1', None)
 
                 if self.visdom is not None:
                     matching_visualization_data = dict(match_preds=match_preds, im_patches0=self.previous_im_patches,
@@ -318,7 +328,9 @@ class KeepTrack(BaseTracker):
         self.previous_candidates = dict(frame_num=self.frame_num,
                                         descriptors=current_candidates['descriptors'],
                                         img_coords=current_candidates['img_coords'],
-                                        scores=current_candidates['scores'])
+                                        scores=current_candidates['scores'],
+                                        tsm_coords=current_candidates['tsm_coords'],
+                                        encoded_descriptors=encoded_descriptors)
 
         if self.visdom is not None:
             self.previous_im_patches = im_patches1
@@ -458,8 +470,32 @@ class KeepTrack(BaseTracker):
         candidates = dict(descriptors=descriptors, img_coords=img_coords, scores=scores, tsm_coords=tsm_coords)
         return candidates
 
+    def match_consistent_candidates(self, candidates0, candidates1):
+        """Returns the matches of candidates1 to candidates0 if they are unambiguous without running the matching
+        network. This is the case if both frames have the same number of candidates and every candidate has exactly
+        one previous candidate within the max displacement (in score map cells) and no other one within twice
+        that distance. Returns None otherwise."""
+        coords0 = candidates0['tsm_coords'].float()
+        coords1 = candidates1['tsm_coords'].float()
+
+        if coords0.shape[0] != coords1.shape[0]:
+            return None
+
+        max_disp = self.params.get('matching_skip_max_displacement', 1.0)
+        dist = torch.cdist(coords1, coords0)
+        sorted_dist, nearest = dist.sort(dim=1)
+
+        if sorted_dist[:, 0].max() > max_disp:
+            return None
+        if coords0.shape[0] > 1 and sorted_dist[:, 1].min() <= 2*max_disp:
+            return None
+        if torch.unique(nearest[:, 0]).shape[0] != coords0.shape[0]:
+            return None
+
+        return nearest[:, 0].cpu()
+
     def extract_matches(self, descriptors0, descriptors1, img_coords0, img_coords1, scores0, scores1,
-                        image_shape):
+                        image_shape, encoded_descriptors0=None):
         data = {
             'descriptors0': descriptors0,
             'descriptors1': descriptors1,
@@ -469,6 +505,8 @@ class KeepTrack(BaseTracker):
             'scores1': scores1.unsqueeze(0),
             'image_size0': image_shape[-2:],
             'image_size1': image_shape[-2:],
+            'encoded_descriptors0': encoded_descriptors0,
+            'sinkhorn_tolerance': self.params.get('matching_sinkhorn_tolerance', None),
         }
         with torch.no_grad():
             pred = self.target_candidate_matching_net.matcher(data)
@@ -3,12 +3,14 @@ import sys
 import json
 import torch
 import argparse
+import multiprocessing
 from tqdm import tqdm
 from collections import defaultdict
 
 sys.path.append('../..')
 from pytracking.evaluation import get_dataset, Tracker
 import ltr.data.processing_utils as prutils
+from ltr.dataset.sequence_records import SequenceRecordWriter
 from pytracking import dcf
 
 
@@ -22,15 +24,6 @@ def load_dump_seq_data_from_disk(path):
     return d
 
 
-def dump_seq_data_to_disk(save_path, seq_name, seq_data):
-    d = load_dump_seq_data_from_disk(save_path)
-
-    d[seq_name] = seq_data
-
-    with open(save_path, 'w') as f:
-        json.dump(d, f)
-
-
 def update_seq_data(seq_candidate_data, frame_candidate_data, frame_state, subseq_state):
     if 'frame_states' not in seq_candidate_data and frame_state is not None:
         seq_candidate_data['frame_states'] = defaultdict(list)
@@ -105,7 +98,7 @@ def extract_candidate_data(tracker, seq):
                 target_candidate_scores=target_candidate_scores, target_candidate_coords=target_candidate_coords)
 
 
-def run_sequence(seq, tracker, save_dir):
+def run_sequence(seq, tracker, show_progress=True):
     params = tracker.get_parameters()
 
     # Get init information
@@ -120,7 +113,8 @@ def run_sequence(seq, tracker, save_dir):
     seq_candidate_data = defaultdict(list)
     frame_state_of_previous_frame = None
 
-    for frame_num, frame_path in enumerate(tqdm(seq.frames[1:], leave=False), start=1):
+    frames = tqdm(seq.frames[1:], leave=False) if show_progress else seq.frames[1:]
+    for frame_num, frame_path in enumerate(frames, start=1):
         image = tracker._read_image(frame_path)
         info = seq.frame_info(frame_num)
 
@@ -135,33 +129,82 @@ def run_sequence(seq, tracker, save_dir):
 
         frame_state_of_previous_frame = frame_state
 
-    dump_seq_data_to_disk(save_dir, seq.name, seq_candidate_data)
+    return seq_candidate_data
+
+
+# Tracker and dataset of a worker process, created by _init_worker
+_worker = {}
+
+
+def _init_worker(tracker_name, parameter_file_name, dataset_name, device_queue):
+    if device_queue is not None:
+        os.environ['CUDA_VISIBLE_DEVICES'] = str(device_queue.get())
+    _worker['tracker'] = Tracker(tracker_name, parameter_file_name)
+    _worker['dataset'] = get_dataset(dataset_name)
+
+
+def _run_sequence_worker(seq_id):
+    seq = _worker['dataset'][seq_id]
+    return seq.name, run_sequence(seq, _worker['tracker'], show_progress=False)
+
+
+def run_tracker(tracker_name, parameter_file_name, dataset_name, save_dir, num_workers=1, devices=None):
+    """ Runs the tracker on all sequences of the dataset which are not yet in the record file, and appends one record
+    per sequence. Sequences of a json file written by earlier versions of this script are imported first.
+    args:
+        num_workers - Number of processes, each running its own tracker instance.
+        devices - List of gpu ids, assigned to the processes round-robin. All processes use the default device if None.
+    """
+    save_path = os.path.join(save_dir, 'target_candidates_dataset_{}_{}.jsonl'.format(tracker_name, parameter_file_name))
+    legacy_path = os.path.splitext(save_path)[0] + '.json'
 
+    with SequenceRecordWriter(save_path) as writer:
+        for seq_name, seq_data in load_dump_seq_data_from_disk(legacy_path).items():
+            if seq_name not in writer:
+                writer.append(seq_name, seq_data)
 
-def run_tracker(tracker_name, parameter_file_name, dataset_name, save_dir):
-    save_path = os.path.join(save_dir, 'target_candidates_dataset_{}_{}.json'.format(tracker_name, parameter_file_name))
+        dataset = get_dataset(dataset_name)
+        seq_ids = [i for i, seq in enumerate(dataset) if seq.name not in writer]
+        print('{} of {} sequences already done.'.format(len(dataset) - len(seq_ids), len(dataset)))
 
-    dumped_data = load_dump_seq_data_from_disk(save_path)
+        if num_workers <= 1:
+            tracker = Tracker(tracker_name, parameter_file_name)
+            for seq_id in tqdm(seq_ids):
+                seq = dataset[seq_id]
+                writer.append(seq.name, run_sequence(seq, tracker))
+            return
 
-    tracker = Tracker(tracker_name, parameter_file_name)
-    dataset = get_dataset(dataset_name)
+        ctx = multiprocessing.get_context('spawn')
+        device_queue = None
+        if devices:
+            device_queue = ctx.Queue()
+            for i in range(num_workers):
+                device_queue.put(devices[i % len(devices)])
 
-    for seq in tqdm(dataset):
-        if seq.name not in dumped_data:
-            run_sequence(seq, tracker, save_path)
+        # The records are written by the main process, in the order in which the sequences finish
+        with ctx.Pool(num_workers, initializer=_init_worker,
+                      initargs=(tracker_name, parameter_file_name, dataset_name, device_queue)) as pool:
+            for seq_name, seq_data in tqdm(pool.imap_unordered(_run_sequence_worker, seq_ids), total=len(seq_ids)):
+                writer.append(seq_name, seq_data)
 
 
 def main():
-    parser = argparse.ArgumentParser(description='Run tracker and dump tracker states to form distractor dataset.')
+    parser = argparse.ArgumentParser(description='Run tracker and dump tracker states to form distractor dataset. '
+                                                 'One record per sequence is appended to the output file, such that '
+                                                 'an interrupted run is resumed when restarted.')
     parser.add_argument('tracker_name', type=str, help='Name of tracker.')
     parser.add_argument('parameter_file_name', type=str, help='Name of parameter file in the tracker folder.')
     parser.add_argument('dataset_name', type=str, help='Name of the dataset.')
     parser.add_argument('save_dir', type=str, help='Path to storage folder')
+    parser.add_argument('--num_workers', type=int, default=1, help='Number of tracker processes.')
+    parser.add_argument('--devices', type=int, nargs='+', default=None,
+                        help='Gpu ids assigned to the tracker processes round-robin.')
 
     args = parser.parse_args()
 
-    run_tracker(args.tracker_name, args.parameter_file_name, args.dataset_name, args.save_dir)
+    run_tracker(args.tracker_name, args.parameter_file_name, args.dataset_name, args.save_dir,
+                num_workers=args.num_workers, devices=args.devices)
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()